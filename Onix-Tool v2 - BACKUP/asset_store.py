@@ -0,0 +1,224 @@
+# asset_store.py
+"""
+Content-addressed local store for the PDF/ePub/JPG assets of MasteringOrders.
+Files are hashed (SHA-256) once while they are streamed into the store and kept
+under objects/<2 hex>/<64 hex>; identical files are stored only once. Orders refer
+to assets as 'sha256:<hex>', packaging resolves these refs, and copies out of the
+store (link) are hard links or reflinks where the filesystem supports them.
+add() does not copy a source either: the object is a reflink of it (copy-on-write
+filesystems) or a hard link to it on the same volume, a plain copy only across
+volumes, so the store itself needs next to no extra disk space. A hard-linked
+object changes if its source is edited in place; packaging checks each ref's
+SHA-256 while writing the ZIP and add() drops such an object when the source is added again.
+Place this file in the project root next to main.py.
+"""
+import os
+import sys
+import json
+import stat
+import shutil
+import hashlib
+import tempfile
+import threading
+from utils import data_path
+
+REF_PREFIX = 'sha256:'
+INDEX_FILE = 'index.json'
+CHUNK_SIZE = 1024 * 1024
+
+# Linux-ioctl für Reflinks (btrfs, XFS, ...)
+FICLONE = 0x40049409
+
+# save() mehrerer Stores auf denselben Ordner (parallele Partitionen) nacheinander
+_save_lock = threading.Lock()
+
+
+def is_ref(value):
+    return isinstance(value, str) and value.startswith(REF_PREFIX)
+
+
+def default_root():
+    return os.environ.get('ONIX_ASSET_STORE') or data_path('asset_store')
+
+
+def _reflink(src, dst):
+    if not sys.platform.startswith('linux'):
+        return False
+    import fcntl
+    try:
+        with open(src, 'rb') as s, open(dst, 'wb') as d:
+            fcntl.ioctl(d.fileno(), FICLONE, s.fileno())
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
+
+
+class AssetStore:
+    def __init__(self, root=None):
+        """
+        root: store folder, default DATA_DIR/asset_store (or ONIX_ASSET_STORE).
+        The index maps source files (path, size, mtime) to their digest so a
+        file that was added before is not read again. add() and save() may be
+        called from several threads (scheduled batch jobs).
+        """
+        self.root = root or default_root()
+        self.objects = os.path.join(self.root, 'objects')
+        os.makedirs(self.objects, exist_ok=True)
+        self._index_path = os.path.join(self.root, INDEX_FILE)
+        self._index = {}
+        if os.path.exists(self._index_path):
+            with open(self._index_path, encoding='utf-8') as f:
+                self._index = json.load(f)
+        self._dirty = False
+        self._lock = threading.Lock()
+
+    def object_path(self, digest):
+        """Path of the stored object for a hex digest."""
+        return os.path.join(self.objects, digest[:2], digest)
+
+    def resolve(self, value):
+        """
+        Return a readable file path for an asset value: 'sha256:<hex>' refs are
+        mapped to the store object, plain paths are returned unchanged.
+        """
+        if is_ref(value):
+            path = self.object_path(value[len(REF_PREFIX):])
+            if not os.path.exists(path):
+                raise FileNotFoundError(f'Asset nicht im Store: {value}')
+            return path
+        return value
+
+    def add(self, path):
+        """
+        Put a file into the store and return its ref 'sha256:<hex>'.
+        The object is a reflink of the file, else a hard link to it, else a
+        copy written in the same pass as the hash; if the content is already
+        stored, the new link or copy is discarded.
+        """
+        if is_ref(path):
+            return path
+        st  = os.stat(path)
+        key = os.path.abspath(path)
+        with self._lock:
+            hit = self._index.get(key)
+        if hit and os.path.exists(self.object_path(hit[2])):
+            if hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+                return REF_PREFIX + hit[2]
+            # Quelle an Ort und Stelle geändert: das per Hardlink geteilte Objekt
+            # hat damit ebenfalls einen anderen Inhalt als sein Hash
+            if os.path.samefile(self.object_path(hit[2]), path):
+                os.remove(self.object_path(hit[2]))
+
+        fd, tmp = tempfile.mkstemp(dir=self.root, suffix='.part')
+        os.close(fd)
+        try:
+            h = hashlib.sha256()
+            shared = copied = False
+            if not _reflink(path, tmp):
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                try:
+                    os.link(path, tmp)
+                    shared = True
+                except OSError:
+                    # anderes Laufwerk: kopieren und dabei hashen
+                    with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+                        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+                            h.update(chunk)
+                            dst.write(chunk)
+                    copied = True
+            if not copied:
+                with open(tmp, 'rb') as f:
+                    for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                        h.update(chunk)
+            digest = h.hexdigest()
+            obj = self.object_path(digest)
+            if os.path.exists(obj):
+                os.remove(tmp)
+            else:
+                os.makedirs(os.path.dirname(obj), exist_ok=True)
+                # eigene Objekte schreibgeschützt, da sie per Hardlink geteilt werden;
+                # ein Hardlink auf die Quelle behält deren Rechte
+                if not shared:
+                    os.chmod(tmp, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+                try:
+                    os.replace(tmp, obj)
+                except PermissionError:
+                    # Windows: ein anderer Job hat dasselbe Objekt gerade abgelegt
+                    if not os.path.exists(obj):
+                        raise
+                    if not shared:
+                        os.chmod(tmp, stat.S_IWRITE | stat.S_IREAD)
+                    os.remove(tmp)
+        except BaseException:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+            raise
+        with self._lock:
+            self._index[key] = [st.st_size, st.st_mtime_ns, digest]
+            self._dirty = True
+        return REF_PREFIX + digest
+
+    def link(self, ref, dest):
+        """
+        Place a stored asset at dest without copying where possible:
+        hard link, then reflink, then plain copy. Objects that share a
+        writable source file (see add) are never hard-linked out.
+
+        Returns:
+            str: 'hardlink', 'reflink' or 'copy'.
+        """
+        src = self.resolve(ref)
+        if os.path.exists(dest):
+            try:
+                os.remove(dest)
+            except PermissionError:
+                # Windows löscht schreibgeschützte Hardlinks nicht; das Attribut
+                # gilt für alle Links, daher das Objekt danach wieder schützen
+                os.chmod(dest, stat.S_IWRITE | stat.S_IREAD)
+                os.remove(dest)
+                os.chmod(src, stat.S_IREAD | stat.S_IRGRP | stat.S_IROTH)
+        if not os.stat(src).st_mode & stat.S_IWRITE:
+            try:
+                os.link(src, dest)
+                return 'hardlink'
+            except OSError:
+                pass
+        if _reflink(src, dest):
+            return 'reflink'
+        shutil.copyfile(src, dest)
+        return 'copy'
+
+    def save(self):
+        """
+        Write the source-file index (call after a batch of add()). Entries
+        saved meanwhile by another store on the same folder are kept.
+        """
+        with _save_lock, self._lock:
+            if not self._dirty:
+                return
+            try:
+                with open(self._index_path, encoding='utf-8') as f:
+                    self._index = dict(json.load(f), **self._index)
+            except (OSError, ValueError):
+                pass
+            tmp = f'{self._index_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self._index, f)
+            os.replace(tmp, self._index_path)
+            self._dirty = False
+
+    def stats(self):
+        """
+        Return (number of objects, stored bytes, bytes referenced by indexed
+        source files), i.e. how much the deduplication saves.
+        """
+        count, size = 0, 0
+        for dirpath, _, files in os.walk(self.objects):
+            for name in files:
+                count += 1
+                size  += os.path.getsize(os.path.join(dirpath, name))
+        referenced = sum(v[0] for v in self._index.values())
+        return count, size, referenced
@@ -0,0 +1,377 @@
+# authority.py
+"""
+Contributor authority of the BoD MasteringOrder Generator: every person once
+entered, imported or exported is kept as one record (LastName, FirstName, ISNI,
+ORCID, ShortBio) in DATA_DIR/authority.db, so the volumes of a series take the
+same contributor instead of retyping it.
+
+Records are indexed by normalised name (lower case, without accents, ß → ss), by
+ISNI and by ORCID (unique). Typeahead looks up name words by prefix in an indexed
+word table, fuzzy lookup counts shared trigrams in an indexed gram table and ranks
+the best candidates by string similarity – both stay fast with many thousand
+records. ISNI and ORCID are checked with their ISO 7064 MOD 11-2 check character
+(valid_id), xml_export.validate_order rejects orders with a wrong one.
+Place this file in the project root next to main.py.
+"""
+import re
+import csv
+import sqlite3
+import difflib
+import unicodedata
+from datetime import datetime
+from utils import data_path
+
+DB_FILE = 'authority.db'
+FIELDS = ['LastName', 'FirstName', 'ISNI', 'ORCID', 'ShortBio']
+# Spalten der Tabelle je Feld
+_COLUMNS = {'LastName': 'last_name', 'FirstName': 'first_name', 'ISNI': 'isni',
+            'ORCID': 'orcid', 'ShortBio': 'short_bio'}
+LIMIT = 10
+# Mindestähnlichkeit der unscharfen Suche (0..1)
+MIN_SIMILARITY = 0.6
+# Kandidaten aus dem Trigramm-Index, die genau verglichen werden
+CANDIDATES = 50
+
+_URL = re.compile(r'^(https?://)?(www\.)?(orcid\.org|isni\.org/isni)/', re.I)
+_SEP = re.compile(r'[\s\-]')
+_NON_WORD = re.compile(r'[^\w ]')
+
+
+# ---------- ISNI / ORCID ----------
+def check_char(base):
+    """ISO 7064 MOD 11-2 check character of the first 15 digits."""
+    total = 0
+    for ch in base:
+        total = (total + int(ch)) * 2
+    result = (12 - total % 11) % 11
+    return 'X' if result == 10 else str(result)
+
+
+def compact_id(value):
+    """ISNI/ORCID without URL prefix, spaces and hyphens ('0000000121032683')."""
+    return _SEP.sub('', _URL.sub('', (value or '').strip())).upper()
+
+
+def valid_id(value):
+    """True if value is a 16-character ISNI/ORCID with a correct check character."""
+    c = compact_id(value)
+    return len(c) == 16 and c[:15].isdigit() and c[15] in '0123456789X' and check_char(c[:15]) == c[15]
+
+
+def format_id(key, value):
+    """Stored form: ISNI compact, ORCID in groups of four ('0000-0002-1825-0097')."""
+    c = compact_id(value)
+    if key == 'ORCID' and len(c) == 16:
+        return '-'.join(c[i:i + 4] for i in range(0, 16, 4))
+    return c
+
+
+def id_problems(contributor):
+    """Messages for invalid ISNI/ORCID of a contributor (empty list if both are fine)."""
+    return [
+        f'{key} {contributor.get(key)}: Prüfziffer oder Format ungültig (16 Stellen, ISO 7064 MOD 11-2)'
+        for key in ('ISNI', 'ORCID') if (contributor.get(key) or '').strip() and not valid_id(contributor.get(key))
+    ]
+
+
+# ---------- Namen ----------
+def normalize(text):
+    """Search form of a name: lower case, accents removed, ß → ss, single spaces."""
+    text = unicodedata.normalize('NFKD', text or '')
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch)).casefold()
+    return ' '.join(_NON_WORD.sub(' ', text).split())
+
+
+def _name_key(last, first):
+    return normalize(f'{last} {first}')
+
+
+def _grams(text):
+    # Trigramme mit Wortgrenzen, "mueller" → " mu", "mue", …
+    padded = f' {text} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+# ---------- Datenbank ----------
+def connect(path=None):
+    """
+    Open (and create if needed) the authority database.
+
+    Args:
+        path (str): Optional database path, default DATA_DIR/authority.db.
+
+    Returns:
+        sqlite3.Connection: Connection with row_factory=sqlite3.Row.
+    """
+    conn = sqlite3.connect(path or data_path(DB_FILE))
+    conn.row_factory = sqlite3.Row
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS contributors ('
+        ' id INTEGER PRIMARY KEY, last_name TEXT, first_name TEXT,'
+        " isni TEXT DEFAULT '', orcid TEXT DEFAULT '', short_bio TEXT DEFAULT '',"
+        ' name_key TEXT, used INTEGER DEFAULT 0, updated_at TEXT)'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS contributors_name ON contributors (name_key)')
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS contributors_isni ON contributors (isni) WHERE isni != ''")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS contributors_orcid ON contributors (orcid) WHERE orcid != ''")
+    # Namenswörter (Typeahead per Präfix) und Trigramme (unscharfe Suche)
+    conn.execute('CREATE TABLE IF NOT EXISTS words (word TEXT, id INTEGER)')
+    conn.execute('CREATE INDEX IF NOT EXISTS words_word ON words (word)')
+    conn.execute('CREATE INDEX IF NOT EXISTS words_id ON words (id)')
+    conn.execute('CREATE TABLE IF NOT EXISTS grams (gram TEXT, id INTEGER)')
+    conn.execute('CREATE INDEX IF NOT EXISTS grams_gram ON grams (gram)')
+    conn.execute('CREATE INDEX IF NOT EXISTS grams_id ON grams (id)')
+    conn.commit()
+    return conn
+
+
+def _with_conn(func):
+    # conn=None: eigene Verbindung öffnen und wieder schließen (wie order_index)
+    def call(*args, conn=None, **kwargs):
+        if conn is not None:
+            return func(conn, *args, **kwargs)
+        conn = connect()
+        try:
+            return func(conn, *args, **kwargs)
+        finally:
+            conn.close()
+    call.__name__, call.__doc__ = func.__name__, func.__doc__
+    return call
+
+
+def _record(row):
+    return {field: row[col] or '' for field, col in _COLUMNS.items()}
+
+
+def _index_name(conn, cid, key):
+    conn.execute('DELETE FROM words WHERE id = ?', (cid,))
+    conn.execute('DELETE FROM grams WHERE id = ?', (cid,))
+    conn.executemany('INSERT INTO words (word, id) VALUES (?,?)', [(w, cid) for w in set(key.split())])
+    conn.executemany('INSERT INTO grams (gram, id) VALUES (?,?)', [(g, cid) for g in _grams(key)])
+
+
+def _match(conn, c):
+    # gleiche Person: gleiche ISNI, sonst gleiche ORCID, sonst gleicher Name ohne abweichende Kennung
+    for key, col in (('ISNI', 'isni'), ('ORCID', 'orcid')):
+        if c[key]:
+            # "!= ''" lässt SQLite den Teilindex benutzen
+            row = conn.execute(f"SELECT * FROM contributors WHERE {col} = ? AND {col} != ''", (c[key],)).fetchone()
+            if row:
+                return row
+    for row in conn.execute('SELECT * FROM contributors WHERE name_key = ?',
+                            (_name_key(c['LastName'], c['FirstName']),)):
+        if all(not c[key] or not row[col] or c[key] == row[col] for key, col in (('ISNI', 'isni'), ('ORCID', 'orcid'))):
+            return row
+    return None
+
+
+def _clean(contributor):
+    c = {field: (contributor.get(field) or '').strip() for field in FIELDS}
+    for key in ('ISNI', 'ORCID'):
+        c[key] = format_id(key, c[key]) if c[key] else ''
+    return c
+
+
+def _upsert(conn, contributor, used=0):
+    """
+    Insert or update one contributor; returns 'added', 'updated' or None (unchanged).
+    Raises ValueError if its ISNI/ORCID is stored for a different name.
+    """
+    c = _clean(contributor)
+    if not c['LastName']:
+        return None
+    now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    row = _match(conn, c)
+    key = _name_key(c['LastName'], c['FirstName'])
+    if row is not None and row['name_key'] != key:
+        # Kennung eines anderen Namens: eher Tippfehler als Namensänderung
+        raise ValueError(f"ISNI/ORCID gehört zu {row['last_name']}, {row['first_name']}")
+    if row is None:
+        cid = conn.execute(
+            'INSERT INTO contributors (last_name, first_name, isni, orcid, short_bio, name_key, used, updated_at)'
+            ' VALUES (?,?,?,?,?,?,?,?)',
+            (c['LastName'], c['FirstName'], c['ISNI'], c['ORCID'], c['ShortBio'], key, used, now)
+        ).lastrowid
+        _index_name(conn, cid, key)
+        return 'added'
+    # angegebene Werte gewinnen, leere Felder behalten den gespeicherten Stand
+    new = {field: c[field] or value for field, value in _record(row).items()}
+    if used:
+        conn.execute('UPDATE contributors SET used = used + ? WHERE id = ?', (used, row['id']))
+    if new == _record(row):
+        return None
+    # gleicher Suchname, Schreibweise (Groß/Klein, Akzente) wie zuletzt angegeben
+    conn.execute(
+        'UPDATE contributors SET last_name=?, first_name=?, isni=?, orcid=?, short_bio=?,'
+        ' updated_at=? WHERE id = ?',
+        (new['LastName'], new['FirstName'], new['ISNI'], new['ORCID'], new['ShortBio'], now, row['id'])
+    )
+    return 'updated'
+
+
+@_with_conn
+def add_many(conn, contributors, used=0):
+    """
+    Add or update contributors in one transaction. Entries with an invalid
+    ISNI/ORCID or an identifier already held by another person are skipped.
+
+    Returns:
+        dict: {'added': n, 'updated': n, 'errors': [(position, message)]}.
+    """
+    result = {'added': 0, 'updated': 0, 'errors': []}
+    with conn:
+        for pos, c in enumerate(contributors, 1):
+            problems = id_problems(c)
+            if problems:
+                result['errors'].append((pos, '; '.join(problems)))
+                continue
+            try:
+                outcome = _upsert(conn, c, used)
+            except sqlite3.IntegrityError:
+                result['errors'].append((pos, 'ISNI/ORCID gehört bereits zu einem anderen Contributor'))
+                continue
+            except ValueError as e:
+                result['errors'].append((pos, str(e)))
+                continue
+            if outcome:
+                result[outcome] += 1
+    return result
+
+
+def remember(contributors, conn=None):
+    """Keep the contributors of an exported order (counted as used once)."""
+    return add_many(contributors, used=1, conn=conn)
+
+
+def read_csv(path):
+    """
+    Contributors of a CSV sheet (',' or ';' separated, header row with
+    LastName, FirstName, ISNI, ORCID, ShortBio; 'Name' as 'Last, First' also works).
+    """
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        sample = f.read(4096)
+        f.seek(0)
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error as e:
+            raise ValueError(f'{path}: keine CSV-Tabelle ({e})')
+        rows = []
+        for row in csv.DictReader(f, dialect=dialect):
+            r = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+            if not r.get('LastName') and r.get('Name'):
+                last, _, first = r['Name'].partition(',')
+                r['LastName'], r['FirstName'] = last.strip(), first.strip()
+            rows.append(r)
+    return rows
+
+
+def import_csv(path, conn=None):
+    """
+    Bulk import of a CSV sheet (see read_csv) in one transaction.
+
+    Returns:
+        dict: as add_many, positions are the line numbers of the sheet.
+    """
+    result = add_many(read_csv(path), conn=conn)
+    # Position 1 = erste Datenzeile = Zeile 2 der Datei
+    result['errors'] = [(pos + 1, msg) for pos, msg in result['errors']]
+    return result
+
+
+# ---------- Suche ----------
+def _rows(conn, ids):
+    if not ids:
+        return []
+    return conn.execute(
+        f'SELECT * FROM contributors WHERE id IN ({",".join("?" * len(ids))})', list(ids)
+    ).fetchall()
+
+
+@_with_conn
+def typeahead(conn, text, limit=LIMIT):
+    """
+    Contributors whose name words start with the words of text (any order,
+    "mül ha" finds "Müller, Hans"), most used first.
+
+    Returns:
+        list: contributor dicts (FIELDS).
+    """
+    words = normalize(text).split()
+    if not words:
+        return []
+    # je Wort die Treffer per Präfix im Index, Schnittmenge über alle Wörter
+    query = ' INTERSECT '.join('SELECT id FROM words WHERE word >= ? AND word < ?' for _ in words)
+    params = [v for w in words for v in (w, w + '\U0010ffff')]
+    rows = conn.execute(
+        f'SELECT * FROM contributors WHERE id IN ({query})'
+        ' ORDER BY used DESC, name_key LIMIT ?', params + [limit]
+    ).fetchall()
+    return [_record(r) for r in rows]
+
+
+@_with_conn
+def fuzzy(conn, text, limit=LIMIT):
+    """
+    Contributors with a similar name (typos, missing accents, swapped order).
+
+    Returns:
+        list: (contributor dict, similarity 0..1), best first.
+    """
+    key = normalize(text)
+    if not key:
+        return []
+    grams = _grams(key)
+    cand = conn.execute(
+        f'SELECT id, COUNT(*) AS n FROM grams WHERE gram IN ({",".join("?" * len(grams))})'
+        ' GROUP BY id ORDER BY n DESC LIMIT ?', list(grams) + [CANDIDATES]
+    ).fetchall()
+    swapped = ' '.join(reversed(key.split()))
+    hits = []
+    for row in _rows(conn, [c['id'] for c in cand]):
+        score = max(difflib.SequenceMatcher(None, k, row['name_key']).ratio() for k in (key, swapped))
+        if score >= MIN_SIMILARITY:
+            hits.append((_record(row), round(score, 3), row['used']))
+    hits.sort(key=lambda h: (-h[1], -h[2]))
+    return [(rec, score) for rec, score, _ in hits[:limit]]
+
+
+@_with_conn
+def search(conn, text, limit=LIMIT):
+    """Typeahead hits, or the fuzzy hits if no name starts with the words of text."""
+    return typeahead(text, limit, conn=conn) or [rec for rec, _ in fuzzy(text, limit, conn=conn)]
+
+
+@_with_conn
+def find(conn, contributor):
+    """The stored record of a contributor (same ISNI, ORCID or name), None if unknown."""
+    row = _match(conn, _clean(contributor))
+    return _record(row) if row else None
+
+
+@_with_conn
+def complete_orders(conn, orders):
+    """
+    Fill empty ISNI, ORCID and ShortBio of the contributors from the authority;
+    each person is looked up once per run.
+
+    Returns:
+        tuple: (orders, number of completed orders).
+    """
+    found = {}
+    result, completed = [], 0
+    for order in orders:
+        contributors, changed = [], False
+        for c in order['Contributors']:
+            key = (c['LastName'], c['FirstName'], c['ISNI'], c['ORCID'])
+            if key not in found:
+                found[key] = find(c, conn=conn)
+            rec = found[key]
+            fill = {f: rec[f] for f in ('ISNI', 'ORCID', 'ShortBio') if rec and rec[f] and not c[f]}
+            if fill:
+                c, changed = c.replace(**fill), True
+            contributors.append(c)
+        if changed:
+            order, completed = order.replace(Contributors=tuple(contributors)), completed + 1
+        result.append(order)
+    return result, completed
@@ -0,0 +1,461 @@
+# batch.py
+"""
+Batch generation of MasteringOrders from a source sheet (CSV) or order JSON files.
+Each order's inputs (metadata fields plus a content hash of the asset files) are
+fingerprinted in <outdir>/.onix_state.json. Re-runs skip unchanged orders and
+rebuild only the XML (replaced inside the existing ZIP) when just the metadata
+changed; the output bytes are the same as for a full rebuild.
+Runs can be journaled (journal.Journal) so an interrupted batch resumes after
+the last committed step of each order.
+Place this file in the project root next to main.py.
+"""
+import os
+import csv
+import json
+import hashlib
+from datetime import datetime
+from utils import load_json
+import codelists
+import xml_export
+import order_model
+import packaging
+import order_import
+import order_index
+import xhtml_blurb
+import upload
+from asset_store import is_ref, REF_PREFIX
+from journal import STATES
+from xml_export import ValidationError, HEADER_TAGS
+
+STATE_FILE = '.onix_state.json'
+
+# Product-Felder mit den Vorgaben aus dem Product-Tab
+PRODUCT_DEFAULTS = {
+    'EAN': '', 'Title': '', 'SubTitle': '', 'Series': '', 'PartNumber': '',
+    'EditionNumber': '1', 'PublicationDate': '', 'Blurb': '',
+    'Height': '', 'Width': '', 'Pages': '', 'ColouredPages': '0',
+    'ColouredPagesPosition': '', 'Quality': 'Standard', 'Paper': 'white',
+    'Binding': 'PB', 'CoverDuplex': 'No', 'Finish': 'matt'
+}
+
+# CSV-Spalten für Dateien → Schlüssel in order['Assets']
+ASSET_COLUMNS = {
+    'Manuscript': 'manuscript', 'Cover': 'cover',
+    'EBookFile': 'ebook', 'EBookCover': 'ebook_cover'
+}
+
+# Hash-Lesegröße für große PDFs
+CHUNK_SIZE = 1024 * 1024
+
+
+def _split(val):
+    return [v.strip() for v in (val or '').split('|') if v.strip()]
+
+
+def _yes(val):
+    return (val or '').strip().lower() in ('yes', 'ja', 'true', '1', 'x')
+
+
+def order_from_row(row):
+    """
+    Convert one CSV row into an order dict.
+    Lists use '|' as separator, contributors are written as
+    'Role:LastName, FirstName' (e.g. 'Author:Müller, Hans|TranslatedBy:Meier, Eva').
+    """
+    r = {k.strip(): (v or '').strip() for k, v in row.items() if k}
+    contributors = []
+    for entry in _split(r.get('Contributors')):
+        role, _, name = entry.rpartition(':')
+        last, _, first = name.partition(',')
+        contributors.append({
+            'Role': role.strip() or 'Author', 'LastName': last.strip(),
+            'FirstName': first.strip(), 'ISNI': '', 'ORCID': '', 'ShortBio': ''
+        })
+    fmt = r.get('EBookFormat') or 'ePub'
+    return {
+        'MasteringType': r.get('MasteringType') or 'Upload',
+        'Header':  {k: r[k] for k in HEADER_TAGS + ['Imprint'] if r.get(k)},
+        'Product': {k: r[k] for k in PRODUCT_DEFAULTS if r.get(k)},
+        'Contributors': contributors,
+        'Classification': {
+            'WGS': _split(r.get('WGS')), 'BISAC': _split(r.get('BISAC')),
+            'AgeWGS': r.get('AgeWGS', ''), 'AgeBISAC': r.get('AgeBISAC', ''),
+            'Language': r.get('Language', '')
+        },
+        'Price': r.get('Price', ''),
+        'International': {
+            'Enabled': _yes(r.get('InternationalDistribution')),
+            'EAN': r.get('IntlEAN', ''),
+            'Prices': {c: r.get(c, '') for c in ['USD', 'GBP', 'AUD']}
+        },
+        'EBook': {
+            'Enabled': bool(r.get('EBookEAN')),
+            'PrintedEAN': r.get('PrintedEAN', ''), 'EAN': r.get('EBookEAN', ''),
+            'EBookFormat': fmt, 'Conversion': 'No', 'EBookFileType': fmt,
+            'Price': r.get('EBookPrice', '')
+        },
+        'Assets': {key: r[col] for col, key in ASSET_COLUMNS.items() if r.get(col)},
+    }
+
+
+def normalize_order(order, base_dir='', header_defaults=None):
+    """
+    Fill defaults (header, product options) and resolve relative asset paths.
+    Returns the order_model.Order of an order dict.
+    """
+    order = dict(order)
+    order['Header'] = dict(header_defaults or {}, **order.get('Header', {}))
+    order['Product'] = dict(PRODUCT_DEFAULTS, **order.get('Product', {}))
+    # HTML aus Shop-Exporten auf die ONIX-XHTML-Teilmenge bringen
+    order['Product']['Blurb'] = xhtml_blurb.sanitize(order['Product']['Blurb'])
+    order['Assets'] = {
+        k: os.path.normpath(os.path.join(base_dir, p))
+        for k, p in order.get('Assets', {}).items() if p
+    }
+    return order_model.from_dict(order)
+
+
+def load_orders(path, header_defaults=None):
+    """
+    Load orders from a CSV sheet (',' or ';' separated), a JSON file
+    (one order or a list), an exported MasteringOrder XML or a folder of
+    JSON/XML files (XML folders are parsed in parallel, see order_import).
+    Relative asset paths are resolved against the file's folder.
+    """
+    if os.path.isdir(path):
+        orders = []
+        names = sorted(os.listdir(path))
+        for name in names:
+            if name.lower().endswith('.json'):
+                orders += load_orders(os.path.join(path, name), header_defaults)
+        xml_paths = [os.path.join(path, n) for n in names if n.lower().endswith('.xml')]
+        if xml_paths:
+            orders += _load_xml(xml_paths, header_defaults)
+        return orders
+    base_dir = os.path.dirname(os.path.abspath(path))
+    if path.lower().endswith('.xml'):
+        return _load_xml([path], header_defaults)
+    if path.lower().endswith('.csv'):
+        with open(path, encoding='utf-8-sig', newline='') as f:
+            sample = f.read(4096)
+            f.seek(0)
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+            raw = [order_from_row(row) for row in csv.DictReader(f, dialect=dialect)]
+    else:
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        raw = data if isinstance(data, list) else [data]
+    return [normalize_order(o, base_dir, header_defaults) for o in raw]
+
+
+def _load_xml(paths, header_defaults=None):
+    # exportierte Orders: neuer Zeitstempel beim erneuten Erzeugen
+    loaded, errors = order_import.load_files(paths)
+    for p, msg in errors:
+        print(f'{p}: übersprungen – {msg}')
+    orders = []
+    for p, order in loaded:
+        data = order_model.as_dict(order)
+        # nur die in der XML gesetzten Header-Felder überschreiben die Vorgaben
+        data['Header'] = {k: v for k, v in data['Header'].items()
+                          if v and k not in ('SentDate', 'SentTime')}
+        orders.append(normalize_order(data, os.path.dirname(os.path.abspath(p)), header_defaults))
+    return orders
+
+
+def fill_ages(orders, wgs_codes=None, bisac_codes=None):
+    """
+    Set missing required age groups (AgeWGS/AgeBISAC) from the default age of
+    the codes (codelists.Audience).
+
+    Returns:
+        tuple: (orders, number of filled orders).
+    """
+    wgs_codes = wgs_codes if wgs_codes is not None else load_json('warengruppe_codes.json')
+    bisac_codes = bisac_codes if bisac_codes is not None else load_json('bisac_codes.json')
+    audience = codelists.audience(wgs_codes, bisac_codes)
+    result, filled = [], 0
+    for order in orders:
+        new = audience.fill(order)
+        filled += new is not order
+        result.append(new)
+    return result, filled
+
+
+def file_digest(path, cache=None):
+    """
+    SHA-256 of a file, cached by (size, mtime) so unchanged files are not re-read.
+    cache: dict {abspath: [size, mtime_ns, hexdigest]}, updated in place.
+    """
+    st  = os.stat(path)
+    key = os.path.abspath(path)
+    if cache is not None:
+        hit = cache.get(key)
+        if hit and hit[0] == st.st_size and hit[1] == st.st_mtime_ns:
+            return hit[2]
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            h.update(chunk)
+    digest = h.hexdigest()
+    if cache is not None:
+        cache[key] = [st.st_size, st.st_mtime_ns, digest]
+    return digest
+
+
+def fingerprint(order, cache=None):
+    """
+    Return (metadata hash, {asset key: content hash}) of an order.
+    """
+    meta = order_model.as_dict(order)
+    del meta['Assets']
+    meta_hash = hashlib.sha256(
+        json.dumps(meta, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    ).hexdigest()
+    assets = {}
+    for key, path in sorted(order.get('Assets', {}).items()):
+        if is_ref(path):
+            assets[key] = path[len(REF_PREFIX):]
+        else:
+            assets[key] = file_digest(path, cache) if os.path.isfile(path) else None
+    return meta_hash, assets
+
+
+def load_state(out_dir):
+    path = os.path.join(out_dir, STATE_FILE)
+    if not os.path.exists(path):
+        return {'orders': {}, 'files': {}}
+    with open(path, encoding='utf-8') as f:
+        return json.load(f)
+
+
+def save_state(out_dir, state):
+    path = os.path.join(out_dir, STATE_FILE)
+    tmp  = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def journal_key(meta_hash, asset_hashes):
+    """Identifies the inputs an order's journal records belong to."""
+    return hashlib.sha256(
+        (meta_hash + json.dumps(asset_hashes, sort_keys=True)).encode('utf-8')
+    ).hexdigest()
+
+
+def process_order(order, out_dir, state, wgs_codes, force=False, store=None,
+                  journal=None, uploader=None, log=print):
+    """
+    Generate one order (XML and, if assets are given, ZIP) into out_dir.
+    With an AssetStore, the asset files are put into the store (hashed once)
+    and the ZIP is packed from the stored objects.
+    With a Journal, every finished step is recorded and steps already committed
+    for the same inputs (resumed run) are not repeated; with an Uploader the
+    ZIP is uploaded as last step. log receives non-fatal problems (search
+    index, contributor authority, order history).
+
+    Returns:
+        str: 'built' (XML + ZIP), 'xml' (only metadata changed) or 'skipped'.
+    Raises:
+        ValidationError: if the order or its files are invalid.
+    """
+    ean  = xml_export.order_ean(order)
+    prev = state['orders'].get(ean) or {}
+
+    source = order.get('Assets', {})
+    if store:
+        order = order.replace(Assets={
+            k: store.add(p) if os.path.isfile(p) else p for k, p in source.items()
+        })
+
+    # Journal-Schlüssel aus den Eingaben ohne Sendestempel
+    key  = journal_key(*fingerprint(order, state['files'])) if journal else None
+    rec  = journal.done(ean, key) if journal else None
+    done = journal.step(ean, key) if journal else -1
+
+    # Sendestempel einmalig festlegen, damit ein Re-Run dieselben Bytes erzeugt
+    hdr  = order['Header']
+    now  = datetime.now()
+    sent = (rec or {}).get('sent') or prev.get('sent') or [now.strftime('%Y%m%d'), now.strftime('%H:%M')]
+    hdr  = hdr.replace(SentDate=hdr.SentDate or sent[0], SentTime=hdr.SentTime or sent[1])
+    order = order.replace(Header=hdr)
+    sent = [hdr.SentDate, hdr.SentTime]
+
+    meta_hash, asset_hashes = fingerprint(order, state['files'])
+
+    xml_fn  = os.path.join(out_dir, f'{ean}_MasteringOrder.xml')
+    zip_fn  = os.path.join(out_dir, f'{ean}_MasteringOrder.zip')
+    has_zip = bool(order.get('Assets'))
+    last    = STATES.index('uploaded') if uploader and has_zip else \
+              STATES.index('zipped') if has_zip else STATES.index('xml')
+    if done >= last:
+        state['orders'][ean] = dict(prev, meta=meta_hash, assets=asset_hashes, sent=sent,
+                                    xml=xml_fn, zip=zip_fn if has_zip else None, key=key)
+        return 'skipped'
+
+    outputs_ok = os.path.exists(xml_fn) and (not has_zip or os.path.exists(zip_fn))
+    assets_changed = force or prev.get('assets') != asset_hashes or not outputs_ok
+    if done < 0 and not assets_changed and prev.get('meta') == meta_hash:
+        return 'skipped'
+
+    def mark(step, paths=(), **extra):
+        if journal:
+            journal.mark(ean, step, key, paths, sent=sent, **extra)
+
+    if done < STATES.index('validated'):
+        xml_export.validate_order(order, wgs_codes)
+        if has_zip and assets_changed:
+            packaging.validate_assets(order.replace(Assets=source), store)
+        mark('validated')
+
+    xml_data = None
+    if done < STATES.index('xml'):
+        xml_data = xml_export.order_xml(order, wgs_codes)
+        xml_export._write_xml(xml_data, xml_fn, order, log)
+        mark('xml', [xml_fn])
+
+    if has_zip and done < STATES.index('zipped'):
+        if xml_data is None:
+            with open(xml_fn, 'rb') as f:
+                xml_data = f.read()
+        # nur Metadaten geändert: XML-Eintrag im bestehenden ZIP ersetzen;
+        # nach einem Abbruch mitten im Packen immer komplett neu schreiben
+        packaging.write_zip(zip_fn, order, xml_data,
+                            update=not assets_changed and done < 0, store=store, log=log)
+        mark('zipped', [zip_fn, packaging.manifest_path(zip_fn)])
+
+    if uploader and has_zip:
+        try:
+            uploader.upload_file(zip_fn)
+        except upload.RETRY_ERRORS as e:
+            # bleibt 'zipped': ein Resume lädt nur noch hoch
+            mark('zipped', error=f'Upload: {e}')
+            raise
+        mark('uploaded')
+
+    state['orders'][ean] = {
+        'meta': meta_hash, 'assets': asset_hashes, 'sent': sent,
+        'xml': xml_fn, 'zip': zip_fn if has_zip else None, 'key': key
+    }
+    return 'built' if assets_changed else 'xml'
+
+
+def _run_scheduled(orders, out_dir, state, counts, force, wgs_codes, log, store,
+                   journal, uploader, scheduler):
+    # Jobs arbeiten auf einem eigenen Ausschnitt des States; zusammengeführt
+    # wird nur im Scheduler-Thread, der auch die Journal-Commits macht
+    def generate(order, local):
+        # Worker-Threads: eine Verbindung je Job statt je Index-/Historieneintrag
+        with order_index.session():
+            return process_order(order, out_dir, local, wgs_codes, force=force,
+                                 store=store, journal=journal, log=log)
+
+    def upload_zip(ean, entry):
+        try:
+            uploader.upload_file(entry['zip'])
+        except upload.RETRY_ERRORS as e:
+            if journal:
+                journal.mark(ean, 'zipped', entry.get('key'), sent=entry.get('sent'),
+                             error=f'Upload: {e}')
+            raise
+        if journal:
+            journal.mark(ean, 'uploaded', entry.get('key'), sent=entry.get('sent'))
+        return 'uploaded'
+
+    def failed(job):
+        counts['failed'] += 1
+        log(f'{job.label}: FEHLER {getattr(job.error, "message", job.error)}')
+
+    def uploaded(job):
+        if job.error:
+            failed(job)
+        else:
+            log(f'{job.label}: uploaded')
+        if journal:
+            journal.maybe_commit()
+
+    def generated(job):
+        ean, (order, local) = job.label, job.args
+        if job.error:
+            failed(job)
+        else:
+            state['orders'].update(local['orders'])
+            state['files'].update(local['files'])
+            counts[job.result] += 1
+            if job.result != 'skipped':
+                log(f'{ean}: {job.result}')
+            entry = state['orders'].get(ean) or {}
+            resumed = journal and journal.step(ean, entry.get('key')) == STATES.index('zipped')
+            if uploader and entry.get('zip') and (job.result != 'skipped' or resumed):
+                scheduler.submit(upload_zip, ean, entry, order=order, kind='upload',
+                                 label=ean, on_done=uploaded)
+        if journal:
+            journal.maybe_commit()
+
+    for order in orders:
+        ean  = xml_export.order_ean(order) or '?'
+        prev = state['orders'].get(ean)
+        paths = [os.path.abspath(p) for p in order.get('Assets', {}).values()]
+        local = {
+            'orders': {ean: prev} if prev else {},
+            'files': {p: state['files'][p] for p in paths if p in state['files']}
+        }
+        scheduler.submit(generate, order, local, order=order, label=ean, on_done=generated)
+    scheduler.run()
+
+
+def run_batch(orders, out_dir, force=False, wgs_codes=None, log=print, store=None,
+              journal=None, uploader=None, scheduler=None):
+    """
+    Process all orders into out_dir, skipping orders whose inputs are unchanged.
+    store: optional AssetStore for deduplicated, hash-referenced assets.
+    journal: optional Journal (crash-safe, resumable run); the batch state is
+        then saved at the journal's grouped commits instead of after every order.
+    uploader: optional upload.Uploader for the finished ZIPs; a failed upload
+        counts the order as failed, the journal keeps it at 'zipped' with the error.
+    scheduler: optional scheduler.Scheduler; orders then run in parallel by
+        PublicationDate priority with per-account limits, uploads as follow-up jobs.
+
+    Returns:
+        dict: Counts per result ('built', 'xml', 'skipped', 'failed').
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    wgs_codes = wgs_codes if wgs_codes is not None else load_json('warengruppe_codes.json')
+    state  = load_state(out_dir)
+    counts = {'built': 0, 'xml': 0, 'skipped': 0, 'failed': 0}
+    if journal:
+        journal.on_commit = lambda: save_state(out_dir, state)
+    # Suchindex und Historie über eine Verbindung für den ganzen Lauf
+    with order_index.session():
+        if scheduler:
+            _run_scheduled(orders, out_dir, state, counts, force, wgs_codes, log, store,
+                           journal, uploader, scheduler)
+            orders = []
+        for order in orders:
+            ean = xml_export.order_ean(order) or '?'
+            try:
+                result = process_order(order, out_dir, state, wgs_codes, force=force,
+                                       store=store, journal=journal, uploader=uploader, log=log)
+            except Exception as e:
+                # ein Auftrag (auch ein abgebrochener Upload) beendet nie den Lauf
+                counts['failed'] += 1
+                log(f'{ean}: FEHLER {getattr(e, "message", e)}')
+                continue
+            finally:
+                if journal:
+                    journal.maybe_commit()
+            counts[result] += 1
+            if result != 'skipped':
+                log(f'{ean}: {result}')
+                if not journal:
+                    save_state(out_dir, state)
+    if store:
+        store.save()
+    if journal:
+        journal.finish()
+    else:
+        save_state(out_dir, state)
+    return counts
@@ -0,0 +1,597 @@
+# codelists.py
+"""
+Code lists of the BoD MasteringOrder Generator (warengruppe_codes.json,
+bisac_codes.json, onix_codelists.json). onix_codelists.json is generated from the
+CodeLists XSD by onix_codelists and read as onix_codelists.CodeLists
+({list name: {code: label}} plus notes and deprecated codes).
+
+Store: the lists are compiled once into a compact binary file in DATA_DIR (sorted
+keys and values with offset tables); every process maps that file with mmap and
+looks codes up by binary search, so a worker starts without parsing JSON or
+building dicts and the operating system shares the pages between all processes of
+a pool, whatever its size. The file name carries a hash of the JSON sources: a
+changed list gives a new store file, an existing one is never rewritten while a
+worker has it mapped.
+
+Registry: hot reload for the GUI and long-running services. Lists placed in the
+override folder (DATA_DIR/codelists or $ONIX_CODELISTS_DIR) replace the bundled
+ones, a new ONIX_BookProduct_CodeLists.xsd there is turned into its
+onix_codelists.json first; a background thread watches both, reloads only the changed files, updates
+the search index entry by entry and swaps the new CodeSet in with one assignment,
+so readers always see a complete set and the search box never waits for a reload.
+
+CodeTree: WGS and BISAC as a hierarchy of their description paths
+("HC/Belletristik/…", "Juvenile Fiction / Animals / …", grouped like the BISAC
+prefixes), precomputed with each CodeSet for the browse tree of ClassificationTab.
+
+Audience: per code the audience flags (children's book, young adult, age group
+required) and a default age, computed once per state of the lists (CodeSet.audience,
+audience() for the plain tables of batch and workers), so validation, the XML
+tables and the ClassificationTab look a code up instead of scanning its text.
+Place this file in the project root next to main.py.
+"""
+import os
+import sys
+import glob
+import json
+import mmap
+import struct
+import bisect
+import hashlib
+import threading
+from array import array
+from collections.abc import Mapping
+from utils import BASE_DIR, DATA_DIR, data_path
+import onix_codelists
+
+# Tabellenname → JSON-Datei; onix_codelists.json enthält je Liste eine eigene Tabelle 'onix/<Liste>'
+SOURCES = {
+    'wgs':   'warengruppe_codes.json',
+    'bisac': 'bisac_codes.json',
+    'onix':  'onix_codelists.json',
+}
+NESTED = {'onix'}
+# Trenner der Beschreibungspfade für CodeTree
+TREE_SEP = {'wgs': '/', 'bisac': ' / '}
+
+# Zielgruppen-Flags je Code (Audience)
+CHILDREN    = 1
+YOUNG_ADULT = 2
+# Altersgruppe Pflicht, wird als AudienceRangeFrom ausgegeben
+AGE_GROUP   = 4
+# BISAC: Zielgruppe steht im Präfix des Codes
+BISAC_AUDIENCE = {
+    'JUV': CHILDREN | AGE_GROUP, 'JNF': CHILDREN,
+    'YAF': YOUNG_ADULT | AGE_GROUP, 'YAN': YOUNG_ADULT,
+}
+# Vorgabealter (Werte der Altersauswahl im ClassificationTab) nach Begriffen der Beschreibung, erster Treffer gilt
+AGE_HINTS = {
+    'wgs': (('Pappbilderbücher', '0'), ('Badebücher', '0'), ('Bilderbücher', '3'),
+            ('Vorlesebücher', '3'), ('Erstlesealter', '5'), ('bis 11 Jahre', '8'),
+            ('ab 12 Jahre', '12'), ('Young Adult', '12')),
+    'bisac': (('Readers / Beginner', '5'), ('Early Readers', '5'), ('Readers / Intermediate', '8'),
+              ('Readers / Chapter Books', '8'), ('Young Adult', '12')),
+}
+
+MAGIC = b'ONIXCL1\0'
+STORE_PREFIX = 'codelists-'
+
+# Ordner mit aktualisierten Listen (gleiche Dateinamen wie SOURCES)
+OVERRIDE_DIR = os.environ.get('ONIX_CODELISTS_DIR') or os.path.join(DATA_DIR, 'codelists')
+
+_MISSING = object()
+
+
+def fingerprint(paths):
+    """Hash of the contents of {table name: path} (names the cache files)."""
+    h = hashlib.sha256(MAGIC + sys.byteorder.encode('ascii'))
+    for name in sorted(paths):
+        h.update(name.encode('utf-8') + b'\0')
+        with open(paths[name], 'rb') as f:
+            h.update(hashlib.sha256(f.read()).digest())
+    return h.hexdigest()[:16]
+
+
+def _read(name, path):
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    # generierte ONIX-Listen (oder altes Format {Liste: {Code: Text}})
+    return onix_codelists.CodeLists(data) if name == 'onix' else data
+
+
+def _tables(paths):
+    # alle Tabellen als {Name: {Code: Text}}
+    tables = {}
+    for name, path in paths.items():
+        data = _read(name, path)
+        if name in NESTED:
+            for sub, codes in data.items():
+                tables[f'{name}/{sub}'] = codes
+        else:
+            tables[name] = data
+    return tables
+
+
+def _pack(tables):
+    # je Tabelle (4-Byte-ausgerichtet): Offsets der Schlüssel (count+1), Offsets der
+    # Werte (count+1), Schlüssel-Bytes, Wert-Bytes; Offsets absolut in der Datei.
+    # Am Ende: Verzeichnis (JSON), seine Länge und MAGIC
+    out = bytearray(MAGIC)
+    directory = {}
+    for name in sorted(tables):
+        items = sorted((str(k).encode('utf-8'), str(v).encode('utf-8'))
+                       for k, v in tables[name].items())
+        out += bytes(-len(out) % 4)
+        base, count = len(out), len(items)
+        keys, vals = array('I'), array('I')
+        at = base + 8 * (count + 1)
+        for k, _ in items:
+            keys.append(at)
+            at += len(k)
+        keys.append(at)
+        for _, v in items:
+            vals.append(at)
+            at += len(v)
+        vals.append(at)
+        out += keys.tobytes() + vals.tobytes()
+        out += b''.join(k for k, _ in items) + b''.join(v for _, v in items)
+        directory[name] = [base, count]
+    head = json.dumps(directory, separators=(',', ':')).encode('utf-8')
+    out += head + struct.pack('<I', len(head)) + MAGIC
+    return bytes(out)
+
+
+def build_store(sources=None):
+    """
+    Compile the code lists into the store file (once per content) and return
+    its path. sources: {table name: JSON path}, default source_paths().
+    """
+    paths = dict(sources) if sources is not None else source_paths()
+    path = data_path(f'{STORE_PREFIX}{fingerprint(paths)}.bin')
+    if os.path.exists(path):
+        return path
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(_pack(_tables(paths)))
+    os.replace(tmp, path)
+    # ältere Stände aufräumen; noch gemappte Dateien (Windows) bleiben liegen
+    for old in glob.glob(data_path(f'{STORE_PREFIX}*.bin')):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return path
+
+
+class CodeList(Mapping):
+    """
+    Read-only {code: text} view of one table of a CodeStore. Lookups are a binary
+    search in the mapped file; results are kept per process, so repeated codes
+    cost one dict lookup.
+    """
+    def __init__(self, mm, base, count):
+        self._mm = mm
+        self._count = count
+        index = memoryview(mm)[base:base + 8 * (count + 1)].cast('I')
+        self._keys = index[:count + 1]
+        self._vals = index[count + 1:]
+        self._cache = {}
+
+    def _find(self, key):
+        if not isinstance(key, str):
+            return -1
+        raw = key.encode('utf-8')
+        mm, offs = self._mm, self._keys
+        lo, hi = 0, self._count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if mm[offs[mid]:offs[mid + 1]] < raw:
+                lo = mid + 1
+            else:
+                hi = mid
+        if lo < self._count and mm[offs[lo]:offs[lo + 1]] == raw:
+            return lo
+        return -1
+
+    def get(self, key, default=None):
+        val = self._cache.get(key, _MISSING)
+        if val is _MISSING:
+            i = self._find(key)
+            val = self._mm[self._vals[i]:self._vals[i + 1]].decode('utf-8') if i >= 0 else None
+            self._cache[key] = val
+        return default if val is None else val
+
+    def __getitem__(self, key):
+        val = self.get(key)
+        if val is None:
+            raise KeyError(key)
+        return val
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __iter__(self):
+        mm, offs = self._mm, self._keys
+        for i in range(self._count):
+            yield mm[offs[i]:offs[i + 1]].decode('utf-8')
+
+    def __len__(self):
+        return self._count
+
+    def _release(self):
+        self._keys.release()
+        self._vals.release()
+
+
+class CodeStore:
+    """
+    Mapped store file: .wgs, .bisac (CodeList) and .onix ({list name: CodeList}).
+    Opening only maps the file and reads its directory.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        mm = self._mm
+        tail = len(mm) - len(MAGIC) - 4
+        if mm[:len(MAGIC)] != MAGIC or mm[tail + 4:] != MAGIC:
+            mm.close()
+            raise ValueError(f'Keine Codelisten-Datei: {path}')
+        size, = struct.unpack('<I', mm[tail:tail + 4])
+        directory = json.loads(mm[tail - size:tail])
+        self.tables = {name: CodeList(mm, base, count) for name, (base, count) in directory.items()}
+        self.wgs   = self.tables.get('wgs', {})
+        self.bisac = self.tables.get('bisac', {})
+        self.onix  = {name[5:]: t for name, t in self.tables.items() if name.startswith('onix/')}
+
+    def close(self):
+        for table in self.tables.values():
+            table._release()
+        self.tables = {}
+        self._mm.close()
+
+
+def open_store(path=None, sources=None):
+    """
+    Map the store file; path as returned by build_store (workers get it from the
+    parent process), otherwise it is built or reused for the current sources.
+    """
+    return CodeStore(path or build_store(sources))
+
+
+# ---------- Hot Reload ----------
+def source_paths(override_dir=None):
+    """{table name: JSON path}, files in override_dir take precedence over BASE_DIR."""
+    override_dir = override_dir or OVERRIDE_DIR
+    paths = {}
+    for name, fn in SOURCES.items():
+        own = os.path.join(override_dir, fn)
+        paths[name] = own if os.path.isfile(own) else os.path.join(BASE_DIR, fn)
+    return paths
+
+
+def _signature(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return path, st.st_size, st.st_mtime_ns
+
+
+def search_index(codes, previous=None):
+    """
+    Search entries (code, text, 'code | text', lower-case line) of a code list
+    in list order; entries of previous whose text is unchanged are reused.
+    """
+    old = {e[0]: e for e in previous or ()}
+    index = []
+    for code, desc in codes.items():
+        entry = old.get(code)
+        if entry is None or entry[1] != desc:
+            line = f'{code} | {desc}'
+            entry = (code, desc, line, line.lower())
+        index.append(entry)
+    return index
+
+
+def search(index, term):
+    """Display lines of the index entries containing term (case-insensitive)."""
+    term = term.lower()
+    if not term:
+        return [e[2] for e in index]
+    return [e[2] for e in index if term in e[3]]
+
+
+class CodeTree:
+    """
+    Hierarchy of a code list built from its description paths: a code whose
+    description is 'HC/Belletristik/Anthologien' is the node 'Anthologien' below
+    'HC' → 'Belletristik'. Nodes are numbered in preorder and each one knows the
+    range of its subtree in the preorder code list, so codes(node) is a slice
+    (O(subtree)); under('JUV') answers code prefixes by bisection in the sorted codes.
+    Node 0 is the root.
+    """
+    def __init__(self, codes, sep='/'):
+        # verschachtelt aufbauen: Pfad-Teil → [Code, Kinder]; Reihenfolge wie in der Liste
+        root = [None, {}]
+        for code, desc in codes.items():
+            node = root
+            for part in desc.split(sep):
+                node = node[1].setdefault(part, [None, {}])
+            if node[0] is None:
+                node[0] = code
+            else:
+                # gleicher Pfad für zwei Codes: eigener Knoten
+                node[1][f'{part} ({code})'] = [code, {}]
+        self.label, self.code, self.parent, self.children = [], [], [], []
+        self.order, self.start, self.end = [], [], []
+        self._flatten('', root, -1)
+        self.node = {code: n for n, code in enumerate(self.code) if code is not None}
+        self._sorted = sorted(self.node)
+
+    def _flatten(self, label, entry, parent):
+        n = len(self.label)
+        self.label.append(label)
+        self.code.append(entry[0])
+        self.parent.append(parent)
+        self.children.append(())
+        self.start.append(len(self.order))
+        self.end.append(0)
+        if entry[0] is not None:
+            self.order.append(entry[0])
+        self.children[n] = tuple(self._flatten(part, child, n) for part, child in entry[1].items())
+        self.end[n] = len(self.order)
+        return n
+
+    def codes(self, node=0):
+        """All codes of the subtree of node (the node's own code first)."""
+        return self.order[self.start[node]:self.end[node]]
+
+    def under(self, prefix):
+        """All codes starting with prefix, e.g. under('JUV'), in code order."""
+        keys = self._sorted
+        lo = bisect.bisect_left(keys, prefix)
+        hi = bisect.bisect_left(keys, prefix + '\uffff', lo)
+        return keys[lo:hi]
+
+    def path(self, node):
+        """Node ids from the top level down to node (to open the tree at a code)."""
+        nodes = []
+        while node > 0:
+            nodes.append(node)
+            node = self.parent[node]
+        return nodes[::-1]
+
+
+def code_trees(tables, old=None):
+    """{'wgs', 'bisac': CodeTree}; trees of unchanged tables are taken from the CodeSet old."""
+    return {
+        name: old.trees[name] if old and old.tables[name] is tables[name] else CodeTree(tables[name], sep)
+        for name, sep in TREE_SEP.items()
+    }
+
+
+def _age_hint(name, desc):
+    return next((age for term, age in AGE_HINTS[name] if term in desc), '')
+
+
+class Audience:
+    """
+    Audience flags (CHILDREN, YOUNG_ADULT, AGE_GROUP) and default age of the WGS
+    and BISAC codes, computed once from the descriptions; only codes with an
+    audience are kept, a lookup is one dict access.
+    """
+    def __init__(self, wgs=None, bisac=None):
+        self._flags = {}
+        self._ages = {'WGS': {}, 'BISAC': {}}
+        for code, desc in (wgs or {}).items():
+            # Altersgruppe wie bisher bei 'Kinder' in der Beschreibung
+            flags = AGE_GROUP if 'Kinder' in desc else 0
+            if 'Young Adult' in desc or 'ab 12 Jahre' in desc:
+                flags |= YOUNG_ADULT
+            elif 'Kinder- und Jugendbücher' in desc:
+                flags |= CHILDREN
+            if flags:
+                self._flags[code] = flags
+                age = _age_hint('wgs', desc)
+                if age:
+                    self._ages['WGS'][code] = age
+        for code, desc in (bisac or {}).items():
+            if code[:3] in BISAC_AUDIENCE:
+                age = _age_hint('bisac', desc)
+                if age:
+                    self._ages['BISAC'][code] = age
+
+    def flags(self, scheme, code):
+        if scheme == 'BISAC':
+            return BISAC_AUDIENCE.get(code[:3], 0)
+        return self._flags.get(code, 0)
+
+    def needs_age(self, scheme, code):
+        """True if an age group is required (and written) for the code."""
+        return bool(self.flags(scheme, code) & AGE_GROUP)
+
+    def default_age(self, scheme, code):
+        """Age code ('0', '3', '5', '8', '12') suggested by the code, '' if none."""
+        return self._ages[scheme].get(code, '')
+
+    def fill(self, order):
+        """
+        The order with missing required age groups taken from its codes;
+        unchanged orders are returned as they are.
+        """
+        cls = order['Classification']
+        ages = {}
+        for scheme in ('WGS', 'BISAC'):
+            if cls['Age' + scheme]:
+                continue
+            age = next((self.default_age(scheme, code) for code in cls[scheme]
+                        if self.needs_age(scheme, code) and self.default_age(scheme, code)), '')
+            if age:
+                ages['Age' + scheme] = age
+        return order.replace(Classification=cls.replace(**ages)) if ages else order
+
+
+# zuletzt benutzte Audience je Tabelle: (wgs, bisac, Audience), neueste zuerst
+_audiences = []
+
+
+def audience(wgs, bisac=None):
+    """
+    Audience of the tables; computed on first use per table object (e.g. the
+    store.wgs of a worker) and reused, a CodeSet registers its own.
+    bisac=None takes any Audience of wgs.
+    """
+    for w, b, found in _audiences:
+        if w is wgs and (bisac is None or b is bisac):
+            return found
+    found = Audience(wgs, bisac)
+    _remember(wgs, bisac, found)
+    return found
+
+
+def _remember(wgs, bisac, found):
+    _audiences.insert(0, (wgs, bisac, found))
+    del _audiences[4:]
+
+
+class CodeSet:
+    """
+    One consistent state of the code lists (read-only once published):
+    .wgs, .bisac dicts, .onix (onix_codelists.CodeLists), .index {'wgs', 'bisac': search entries},
+    .trees {'wgs', 'bisac': CodeTree}, .audience (Audience),
+    .version (counts reloads), .changes {table: (added, removed, changed)}.
+    """
+    def __init__(self, tables, index, trees, audience, signatures, version, changes):
+        self.tables     = tables
+        self.wgs        = tables['wgs']
+        self.bisac      = tables['bisac']
+        self.onix       = tables['onix']
+        self.index      = index
+        self.trees      = trees
+        self.audience   = audience
+        self.signatures = signatures
+        self.version    = version
+        self.changes    = changes
+
+
+def _diff(old, new):
+    added   = sum(1 for k in new if k not in old)
+    removed = sum(1 for k in old if k not in new)
+    changed = sum(1 for k, v in new.items() if k in old and old[k] != v)
+    return added, removed, changed
+
+
+class Registry:
+    def __init__(self, override_dir=None, interval=2.0, store=False, log=print):
+        """
+        override_dir: folder with updated lists (default OVERRIDE_DIR).
+        interval: seconds between checks of the watcher thread.
+        store: also compile the mmap store for worker processes (store_path).
+        """
+        self.override_dir = override_dir or OVERRIDE_DIR
+        self.interval = interval
+        self.log = log
+        self.error = None
+        self._failed = None
+        self._store = store
+        self.store_path = None
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+        self._current = None
+        self.reload()
+
+    @property
+    def current(self):
+        """The CodeSet in use; take it once per operation for consistent lookups."""
+        return self._current
+
+    @property
+    def version(self):
+        return self._current.version
+
+    def reload(self):
+        """
+        Check the sources now and swap in a new CodeSet if a file changed.
+        A list that does not parse keeps the previous state (see self.error).
+
+        Returns:
+            bool: True if a new CodeSet was published.
+        """
+        with self._lock:
+            old = self._current
+            try:
+                onix_codelists.refresh(self.override_dir)
+            except (OSError, ValueError) as e:
+                # fehlerhafte XSD: bisherige onix_codelists.json bleibt in Gebrauch
+                self.log(f'ONIX-Codelisten-XSD nicht übernommen – {e}')
+            paths = source_paths(self.override_dir)
+            sigs = {name: _signature(p) for name, p in paths.items()}
+            if old and sigs == old.signatures:
+                # z.B. fehlerhafte Override-Datei wieder entfernt
+                self.error = self._failed = None
+                return False
+            if sigs == self._failed:
+                return False
+            tables, index, changes = {}, {}, {}
+            try:
+                for name, path in paths.items():
+                    if old and old.signatures.get(name) == sigs[name]:
+                        tables[name] = old.tables[name]
+                        continue
+                    try:
+                        data = _read(name, path)
+                    except ValueError as e:
+                        raise ValueError(f'{os.path.basename(path)}: {e}')
+                    if not isinstance(data, Mapping):
+                        raise ValueError(f'{os.path.basename(path)}: Objekt {{Code: Text}} erwartet')
+                    tables[name] = data
+                    if old:
+                        changes[name] = _diff(old.tables[name], data)
+                for name in ('wgs', 'bisac'):
+                    prev = old.index[name] if old else None
+                    index[name] = prev if prev is not None and tables[name] is old.tables[name] \
+                        else search_index(tables[name], prev)
+                trees = code_trees(tables, old)
+                same = old and all(tables[n] is old.tables[n] for n in ('wgs', 'bisac'))
+                aud = old.audience if same else Audience(tables['wgs'], tables['bisac'])
+                store_path = build_store(paths) if self._store else None
+            except (OSError, ValueError) as e:
+                # halb geschriebene oder fehlerhafte Datei: alten Stand behalten
+                self.error = str(e)
+                self._failed = sigs
+                if old is None:
+                    raise
+                self.log(f'Codelisten nicht neu geladen – {self.error}')
+                return False
+            self.error = self._failed = None
+            self.store_path = store_path
+            # ein Zuweisungsschritt: Leser sehen alten oder neuen Stand, nie einen halben
+            _remember(tables['wgs'], tables['bisac'], aud)
+            self._current = CodeSet(tables, index, trees, aud, sigs, old.version + 1 if old else 1, changes)
+        if old:
+            summary = ', '.join(f'{n}: +{a} -{r} ~{c}' for n, (a, r, c) in changes.items())
+            self.log(f'Codelisten neu geladen ({summary})')
+        return True
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.reload()
+            except Exception as e:
+                self.log(f'Codelisten: {e}')
+
+    def start(self):
+        """Start the background watcher (daemon thread)."""
+        if not self._thread:
+            self._thread = threading.Thread(target=self._watch, name='codelists', daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
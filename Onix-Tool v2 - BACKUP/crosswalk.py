@@ -0,0 +1,238 @@
+# crosswalk.py
+"""
+WGS ↔ BISAC crosswalk of the BoD MasteringOrder Generator: for a WGS code the
+BISAC codes that fit it and vice versa, so a title is classified once and the
+other list is proposed (ClassificationTab) or filled in (batch --fill-subjects).
+
+Two sources are combined per code pair:
+- history: how often the pair was given together in exported titles
+  (order_index.subject_pairs; 'cli.py reindex' feeds the backlist),
+  as share of the titles with that code;
+- text: similarity of the descriptions in the TF-IDF matrix of subject_suggest;
+  German WGS texts get English search words from GLOSSARY. The text links are
+  computed once per content of the code lists and cached as
+  crosswalk-<hash>.json in DATA_DIR.
+Both directions are kept as {code: [(other code, score)]}, so a lookup is a dict
+access; load() rebuilds the tables only when the history changed.
+Place this file in the project root next to main.py.
+"""
+import os
+import glob
+import json
+from collections import defaultdict
+from utils import data_path
+import codelists
+import order_index
+import order_model
+import subject_suggest
+
+try:
+    import numpy as np
+except ImportError:
+    # nur zum Berechnen der Textverknüpfungen nötig (subject_suggest meldet das)
+    np = None
+
+CACHE_PREFIX = 'crosswalk-'
+# Version der Textverknüpfungen; bei Änderungen am GLOSSARY erhöhen
+FORMAT = 1
+TOP = 5
+# beste Textverknüpfungen je Warengruppe und je BISAC-Code
+TEXT_LINKS = 10
+# Gewicht des Textvergleichs gegenüber der Historie (Anteil 0..1)
+TEXT_WEIGHT = 0.5
+# Mindestwert, ab dem der Batch fehlende Codes einträgt
+MIN_SCORE = 0.2
+WGS_PREFIX = subject_suggest.WGS_PREFIX
+
+# deutsche Begriffe der Warengruppen → englische Wörter der BISAC-Texte
+GLOSSARY = {
+    'Kinder': 'juvenile children', 'Jugendbücher': 'young adult', 'Bilderbücher': 'picture books',
+    'Belletristik': 'fiction', 'Romane': 'fiction novels', 'Erzählungen': 'fiction stories',
+    'Krimis': 'mystery crime detective', 'Thriller': 'thrillers suspense', 'Spionage': 'espionage',
+    'Fantasy': 'fantasy', 'Science': 'science', 'Horror': 'horror', 'Liebesromane': 'romance',
+    'Historische': 'historical', 'Märchen': 'fairy tales folklore', 'Sagen': 'legends mythology',
+    'Legenden': 'legends', 'Anthologien': 'anthologies', 'Lyrik': 'poetry', 'Dramatik': 'drama',
+    'Biografien': 'biography autobiography', 'Briefe': 'letters', 'Tagebücher': 'diaries',
+    'Humor': 'humor', 'Comics': 'comics graphic novels', 'Cartoons': 'cartoons', 'Manga': 'manga',
+    'Abenteuer': 'action adventure', 'Tiere': 'animals', 'Tiergeschichten': 'animals',
+    'Reiseführer': 'travel guides', 'Reiseberichte': 'travel essays', 'Karten': 'maps',
+    'Geschichte': 'history', 'Philosophie': 'philosophy', 'Psychologie': 'psychology',
+    'Religion': 'religion', 'Theologie': 'religion theology', 'Christentum': 'christianity',
+    'Bibel': 'bibles', 'Esoterik': 'body mind spirit', 'Kunst': 'art', 'Musik': 'music',
+    'Fotografie': 'photography', 'Architektur': 'architecture', 'Film': 'performing arts film',
+    'Theater': 'performing arts theater', 'Sport': 'sports recreation', 'Kochen': 'cooking',
+    'Backen': 'baking', 'Getränke': 'beverages', 'Garten': 'gardening', 'Gesundheit': 'health fitness',
+    'Ernährung': 'diet nutrition', 'Medizin': 'medical', 'Recht': 'law', 'Wirtschaft': 'business economics',
+    'Politik': 'political science', 'Soziologie': 'social science', 'Pädagogik': 'education',
+    'Schule': 'education study', 'Lernen': 'study aids', 'Sprachwissenschaft': 'language arts linguistics',
+    'Wörterbücher': 'dictionaries', 'Lexika': 'reference encyclopedias', 'Mathematik': 'mathematics',
+    'Physik': 'physics science', 'Chemie': 'chemistry science', 'Biologie': 'biology life sciences',
+    'Technik': 'technology engineering', 'Informatik': 'computers', 'Computer': 'computers',
+    'Natur': 'nature', 'Haustiere': 'pets', 'Familie': 'family relationships', 'Partnerschaft': 'relationships',
+    'Ratgeber': 'self-help', 'Hobby': 'crafts hobbies', 'Handarbeit': 'crafts needlework',
+    'Spiele': 'games activities', 'Erotik': 'erotica', 'Western': 'westerns',
+    'Essen': 'cooking food', 'Trinken': 'beverages', 'Reisen': 'travel', 'Astronomie': 'astronomy',
+    'Fahrzeuge': 'transportation', 'Finanzen': 'finance', 'Steuern': 'taxation', 'Geld': 'money finance',
+    'Spiritualität': 'spirituality', 'Lebenshilfe': 'self-help', 'Geowissenschaften': 'earth sciences',
+    'Bildbände': 'photography pictorial', 'Satire': 'satire', 'Mittelalter': 'medieval',
+    'Spannung': 'thrillers suspense', 'Aphorismen': 'quotations', 'Ethnologie': 'anthropology',
+    'Literaturwissenschaft': 'literary criticism',
+    'Nachschlagewerke': 'reference', 'Lernhilfen': 'study aids', 'Medien': 'media communication',
+}
+
+_glossary = {stem: words for term, words in GLOSSARY.items() for stem in subject_suggest.tokens(term)}
+_cache = {}
+
+
+def _with_glossary(text):
+    words = [_glossary[t] for t in subject_suggest.tokens(text) if t in _glossary]
+    return ' '.join([text] + words)
+
+
+def text_links(wgs_codes, suggester=None):
+    """
+    {wgs code: [(bisac code, similarity)]} from the code descriptions: the
+    TEXT_LINKS best BISAC codes of every WGS and the TEXT_LINKS best WGS of every
+    BISAC code. The product forms of a WGS (HC/…, TB/…) share the subject part of
+    the path, it is compared once.
+    """
+    suggester = suggester or subject_suggest.load()
+    subjects = defaultdict(list)
+    for code, desc in wgs_codes.items():
+        subjects[desc.partition('/')[2] or desc].append(code)
+    texts = list(subjects)
+    bisac = suggester.codes[suggester.n_wgs:]
+    # Ähnlichkeit Warengruppe × BISAC in einem Produkt
+    sim = (suggester.vectors([_with_glossary(t) for t in texts]) @
+           suggester.matrix[suggester.n_wgs:].T).toarray()
+    k_rows, k_cols = min(TEXT_LINKS, sim.shape[1] - 1), min(TEXT_LINKS, sim.shape[0] - 1)
+    best = set(zip(np.repeat(np.arange(sim.shape[0]), k_rows),
+                   np.argpartition(-sim, k_rows, axis=1)[:, :k_rows].ravel()))
+    best |= set(zip(np.argpartition(-sim, k_cols, axis=0)[:k_cols].ravel(),
+                    np.tile(np.arange(sim.shape[1]), k_cols)))
+    found = defaultdict(list)
+    for i, j in best:
+        if sim[i, j] > 0:
+            found[i].append((str(bisac[j]), round(float(sim[i, j]), 4)))
+    links = {}
+    for i, text in enumerate(texts):
+        for code in subjects[text]:
+            links[code] = sorted(found[i], key=lambda x: -x[1])
+    return links
+
+
+def _load_text_links(paths=None):
+    paths = paths or codelists.source_paths()
+    sources = {name: paths[name] for name in ('wgs', 'bisac')}
+    path = data_path(f'{CACHE_PREFIX}{FORMAT}-{codelists.fingerprint(sources)}.json')
+    try:
+        with open(path, encoding='utf-8') as f:
+            return {code: [tuple(link) for link in links] for code, links in json.load(f).items()}
+    except (OSError, ValueError):
+        pass
+    with open(sources['wgs'], encoding='utf-8') as f:
+        links = text_links(json.load(f), subject_suggest.load(paths))
+    tmp = f'{path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(links, f, separators=(',', ':'))
+    os.replace(tmp, path)
+    for old in glob.glob(data_path(f'{CACHE_PREFIX}*.json')):
+        if old != path:
+            try:
+                os.remove(old)
+            except OSError:
+                pass
+    return links
+
+
+class Crosswalk:
+    def __init__(self, links, pairs=()):
+        """
+        links: {wgs: [(bisac, similarity)]} (text_links).
+        pairs: (wgs, bisac, count) of historical orders (order_index.subject_pairs).
+        """
+        to_bisac, to_wgs = defaultdict(dict), defaultdict(dict)
+        for w, found in links.items():
+            for b, sim in found:
+                to_bisac[w][b] = to_wgs[b][w] = TEXT_WEIGHT * sim
+        total_w, total_b = defaultdict(int), defaultdict(int)
+        for w, b, n in pairs:
+            total_w[w] += n
+            total_b[b] += n
+        for w, b, n in pairs:
+            # Anteil der Titel mit diesem Code, die auch den anderen hatten
+            to_bisac[w][b] = to_bisac[w].get(b, 0) + n / total_w[w]
+            to_wgs[b][w] = to_wgs[b].get(w, 0) + n / total_b[b]
+        self.history = len(pairs)
+        self._to = {
+            'WGS': {code: sorted(found.items(), key=lambda x: -x[1]) for code, found in to_bisac.items()},
+            'BISAC': {code: sorted(found.items(), key=lambda x: -x[1]) for code, found in to_wgs.items()},
+        }
+
+    def propose(self, scheme, codes, n=TOP, wgs_prefix=WGS_PREFIX):
+        """
+        Codes of the other list for the codes of scheme ('WGS' or 'BISAC'),
+        scores of several codes added up.
+
+        Returns:
+            list: [(code, score)], best first.
+        """
+        table = self._to[scheme]
+        total = defaultdict(float)
+        for code in codes:
+            for other, score in table.get(code, ()):
+                if scheme == 'BISAC' and wgs_prefix and not other.startswith(wgs_prefix):
+                    continue
+                total[other] += score
+        best = sorted(total.items(), key=lambda x: -x[1])[:n]
+        return [(code, round(score, 4)) for code, score in best]
+
+    def fill(self, order, min_score=MIN_SCORE):
+        """
+        The order with its empty WGS or BISAC side filled from the other one
+        (best code if it reaches min_score); unchanged orders are returned as they are.
+        """
+        cls = order['Classification']
+        for have, missing in (('WGS', 'BISAC'), ('BISAC', 'WGS')):
+            if cls[have] and not cls[missing]:
+                best = self.propose(have, cls[have], 1)
+                if best and best[0][1] >= min_score:
+                    data = dict(order_model.as_dict(cls), **{missing: [best[0][0]]})
+                    return order.replace(Classification=order_model.Classification.from_dict(data))
+        return order
+
+
+def load(paths=None):
+    """
+    Crosswalk of the current code lists and order history; reused while neither
+    changed, so callers may ask for it on every selection.
+    """
+    paths = paths or codelists.source_paths()
+    conn = order_index.connect()
+    try:
+        key = (codelists.fingerprint({name: paths[name] for name in ('wgs', 'bisac')}),
+               order_index.subject_state(conn))
+        cw = _cache.get(key)
+        if cw is None:
+            cw = Crosswalk(_load_text_links(paths), order_index.subject_pairs(conn))
+            _cache.clear()
+            _cache[key] = cw
+    finally:
+        conn.close()
+    return cw
+
+
+def fill_orders(orders, cw=None):
+    """
+    Fill the missing side of all Upload orders in one pass.
+
+    Returns:
+        tuple: (orders, number of filled orders).
+    """
+    cw = cw or load()
+    result, filled = [], 0
+    for order in orders:
+        new = cw.fill(order) if order['MasteringType'] == 'Upload' else order
+        filled += new is not order
+        result.append(new)
+    return result, filled
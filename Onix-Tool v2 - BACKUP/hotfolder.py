@@ -0,0 +1,274 @@
+# hotfolder.py
+"""
+Hot-folder watcher for the BoD MasteringOrder Generator.
+Production drops {EAN}_Bookblock.pdf, {EAN}_Cover.pdf and the metadata {EAN}.json
+into an inbox; as soon as a set is complete and its files have stopped changing,
+it is validated, exported and packed on a bounded worker pool (same code path as
+batch.process_order). Results are moved atomically into the outbox, failed sets go
+to the error folder together with a FEHLER.txt stating the reason.
+Uses inotify on Linux to wake up on changes and falls back to polling elsewhere.
+Place this file in the project root next to main.py.
+"""
+import os
+import re
+import sys
+import time
+import shutil
+import select
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+import codelists
+import batch
+import xml_export
+import order_index
+from xml_export import ValidationError
+
+# {EAN}_Bookblock.pdf / {EAN}_Cover.pdf / {EAN}.json
+SET_FILE = re.compile(r'^(\d{13})(_Bookblock\.pdf|_Cover\.pdf|\.json)$', re.IGNORECASE)
+SET_PARTS = {'_bookblock.pdf': 'manuscript', '_cover.pdf': 'cover', '.json': 'json'}
+
+REASON_FILE = 'FEHLER.txt'
+STAGING_DIR = '.staging'
+
+# inotify-Masken (linux/inotify.h)
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO    = 0x00000080
+IN_CREATE      = 0x00000100
+IN_NONBLOCK    = 0o4000
+IN_CLOEXEC     = 0o2000000
+
+
+class _Inotify:
+    """Minimal inotify wrapper (ctypes); only used to wake the scan loop."""
+
+    def __init__(self, path):
+        import ctypes
+        libc = ctypes.CDLL(None, use_errno=True)
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1')
+        # kein IN_MODIFY: beim Kopieren großer PDFs käme sonst ein Event je Block
+        mask = IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+        if libc.inotify_add_watch(self.fd, os.fsencode(path), mask) < 0:
+            err = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(err, 'inotify_add_watch')
+
+    def wait(self, timeout):
+        """Block until something changed in the folder or timeout expired."""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if ready:
+            try:
+                while os.read(self.fd, 65536):
+                    pass
+            except BlockingIOError:
+                pass
+        return bool(ready)
+
+    def close(self):
+        os.close(self.fd)
+
+
+class HotFolder:
+    def __init__(self, inbox, outbox, error_dir=None, done_dir=None,
+                 header_defaults=None, workers=2, settle=5.0, poll=2.0,
+                 rescan=30.0, wgs_codes=None, log=print):
+        """
+        inbox/outbox: folders to watch and to deliver to.
+        error_dir: failed sets with FEHLER.txt (default <inbox>/Fehler).
+        done_dir: processed source files (default <inbox>/Erledigt).
+        workers: maximum number of orders built at the same time.
+        settle: seconds a file's size and mtime must stay unchanged before
+            it counts as completely copied.
+        poll: scan interval without inotify or while files are still settling.
+        rescan: safety rescan interval when inotify reports nothing.
+        """
+        self.inbox  = os.path.abspath(inbox)
+        self.outbox = os.path.abspath(outbox)
+        self.error_dir = error_dir or os.path.join(self.inbox, 'Fehler')
+        self.done_dir  = done_dir or os.path.join(self.inbox, 'Erledigt')
+        self.header_defaults = header_defaults or {}
+        self.workers = max(1, workers)
+        self.settle  = settle
+        self.poll    = poll
+        self.rescan  = rescan
+        # ohne feste Liste: aktuelle Codelisten (Updates im Override-Ordner ohne Neustart)
+        self.codes = None if wgs_codes is not None else codelists.Registry(log=log).start()
+        self._wgs_codes = wgs_codes
+        self.log = log
+        for d in (self.outbox, self.error_dir, self.done_dir):
+            os.makedirs(d, exist_ok=True)
+        # Pfad → ((Größe, mtime), seit wann unverändert)
+        self._seen = {}
+        self._active = {}
+        self.counts = {'built': 0, 'failed': 0}
+
+    @property
+    def wgs_codes(self):
+        return self._wgs_codes if self._wgs_codes is not None else self.codes.current.wgs
+
+    # ---------- Erkennen vollständiger Sets ----------
+    def _stable(self, path, now):
+        try:
+            st = os.stat(path)
+        except FileNotFoundError:
+            self._seen.pop(path, None)
+            return False
+        sig = (st.st_size, st.st_mtime_ns)
+        prev = self._seen.get(path)
+        if not prev or prev[0] != sig:
+            self._seen[path] = (sig, now)
+            return False
+        if now - prev[1] < self.settle:
+            return False
+        # Windows sperrt Dateien, die noch kopiert werden
+        try:
+            with open(path, 'rb'):
+                pass
+        except OSError:
+            return False
+        return True
+
+    def scan(self):
+        """
+        Return {EAN: {'manuscript','cover','json': path}} for all complete sets
+        whose files are stable and not already being processed.
+        """
+        now  = time.monotonic()
+        sets = {}
+        with os.scandir(self.inbox) as it:
+            for entry in it:
+                m = SET_FILE.match(entry.name)
+                if not m or not entry.is_file():
+                    continue
+                sets.setdefault(m.group(1), {})[SET_PARTS[m.group(2).lower()]] = entry.path
+        present = {p for parts in sets.values() for p in parts.values()}
+        self._seen = {p: v for p, v in self._seen.items() if p in present}
+        ready = {}
+        for ean, parts in sets.items():
+            if ean in self._active or len(parts) < len(SET_PARTS):
+                continue
+            # alle Dateien prüfen, damit jede ihren Zeitstempel bekommt
+            stable = [self._stable(p, now) for p in parts.values()]
+            if all(stable):
+                ready[ean] = parts
+        return ready
+
+    # ---------- Verarbeitung ----------
+    def process(self, ean, parts):
+        """
+        Build one set in a staging folder of the outbox and move the results
+        into the outbox; on failure move the set into the error folder.
+        """
+        staging = os.path.join(self.outbox, STAGING_DIR, ean)
+        shutil.rmtree(staging, ignore_errors=True)
+        os.makedirs(staging)
+        try:
+            orders = batch.load_orders(parts['json'], self.header_defaults)
+            if len(orders) != 1:
+                raise ValidationError('Fehler', f'{ean}.json muss genau eine Order enthalten.')
+            order = orders[0]
+            order = order.replace(Assets=dict(
+                order['Assets'], manuscript=parts['manuscript'], cover=parts['cover']
+            ))
+            if xml_export.order_ean(order) != ean:
+                raise ValidationError(
+                    'Fehler', f'EAN in {ean}.json passt nicht zum Dateinamen.'
+                )
+            state = {'orders': {}, 'files': {}}
+            batch.process_order(order, staging, state, self.wgs_codes, force=True, log=self.log)
+            delivered = self._deliver(staging)
+        except Exception as e:
+            reason = getattr(e, 'message', None) or f'{type(e).__name__}: {e}'
+            if not isinstance(e, (ValidationError, OSError, ValueError)):
+                reason += '\n\n' + traceback.format_exc()
+            self._fail(ean, parts, reason)
+            return False
+        finally:
+            shutil.rmtree(staging, ignore_errors=True)
+
+        self._move_set(parts, os.path.join(self.done_dir, ean))
+        try:
+            zip_fn = next((p for p in delivered if p.endswith('.zip')), delivered[0])
+            order_index.set_path(ean, zip_fn)
+            order_index.record_history(ean, 'hotfolder', zip_fn)
+        except Exception as e:
+            self.log(f'Historie nicht aktualisiert: {e}')
+        return True
+
+    def _deliver(self, staging):
+        # gleiches Dateisystem → os.replace ist atomar, Abnehmer sehen nie Teildateien
+        delivered = []
+        names = sorted(os.listdir(staging), key=lambda n: n.endswith('.zip'))
+        for name in names:
+            dest = os.path.join(self.outbox, name)
+            os.replace(os.path.join(staging, name), dest)
+            delivered.append(dest)
+        return delivered
+
+    def _move_set(self, parts, target):
+        os.makedirs(target, exist_ok=True)
+        for path in parts.values():
+            if os.path.exists(path):
+                os.replace(path, os.path.join(target, os.path.basename(path)))
+
+    def _fail(self, ean, parts, reason):
+        target = os.path.join(self.error_dir, ean)
+        try:
+            self._move_set(parts, target)
+            tmp = os.path.join(target, REASON_FILE + '.tmp')
+            with open(tmp, 'w', encoding='utf-8') as f:
+                f.write(reason.rstrip() + '\n')
+            os.replace(tmp, os.path.join(target, REASON_FILE))
+        except OSError as e:
+            self.log(f'{ean}: Fehlerordner nicht beschreibbar: {e}')
+
+    # ---------- Schleife ----------
+    def _finished(self, ean, future):
+        self._active.pop(ean, None)
+        ok = not future.exception() and future.result()
+        self.counts['built' if ok else 'failed'] += 1
+        self.log(f'{ean}: ' + ('erzeugt' if ok else 'FEHLER, siehe Fehlerordner'))
+
+    def _unsettled(self):
+        now = time.monotonic()
+        return any(now - since < self.settle for _, since in self._seen.values())
+
+    def run(self, once=False, stop=None):
+        """
+        Watch the inbox until interrupted (or stop() returns True).
+        once: process the sets complete now, wait for them and return.
+
+        Returns:
+            dict: Counts ('built', 'failed').
+        """
+        watcher = None
+        if sys.platform.startswith('linux') and not once:
+            try:
+                watcher = _Inotify(self.inbox)
+            except (OSError, AttributeError) as e:
+                self.log(f'inotify nicht verfügbar ({e}), Polling alle {self.poll}s')
+        pool = ThreadPoolExecutor(max_workers=self.workers)
+        try:
+            while True:
+                backlog = False
+                for ean, parts in self.scan().items():
+                    # begrenzte Warteschlange: Rest beim nächsten Scan
+                    if len(self._active) >= self.workers * 2:
+                        backlog = True
+                        break
+                    fut = pool.submit(self.process, ean, parts)
+                    self._active[ean] = fut
+                    fut.add_done_callback(lambda f, ean=ean: self._finished(ean, f))
+                busy = backlog or self._unsettled()
+                if (once and not busy) or (stop and stop()):
+                    break
+                if watcher and not busy:
+                    watcher.wait(self.rescan)
+                else:
+                    time.sleep(self.poll)
+        finally:
+            pool.shutdown(wait=True)
+            if watcher:
+                watcher.close()
+        return self.counts
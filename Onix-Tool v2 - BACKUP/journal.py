@@ -0,0 +1,171 @@
+# journal.py
+"""
+Write-ahead journal for batch runs of the BoD MasteringOrder Generator.
+Each order step (validated, xml, zipped, uploaded) is appended to
+<outdir>/.onix_journal.jsonl once the files it produced are on disk. Records are
+committed in groups: the output files of all pending records are fsynced first,
+then the records are appended and the journal is fsynced once. After a crash,
+'cli.py resume <outdir>' repeats the run with the same parameters and continues
+each order after its last committed step.
+Place this file in the project root next to main.py.
+"""
+import os
+import json
+import time
+import threading
+
+JOURNAL_FILE = '.onix_journal.jsonl'
+STATES = ['validated', 'xml', 'zipped', 'uploaded']
+
+
+class JournalError(Exception):
+    pass
+
+
+def fsync_paths(paths):
+    """fsync files and their folders (folders only where the OS allows it)."""
+    dirs = set()
+    for path in paths:
+        if not os.path.exists(path):
+            continue
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+        dirs.add(os.path.dirname(os.path.abspath(path)))
+    for d in dirs:
+        try:
+            fd = os.open(d, os.O_RDONLY)
+        except OSError:
+            # Windows: Ordner lassen sich nicht öffnen, os.replace ist dort ausreichend
+            continue
+        try:
+            os.fsync(fd)
+        except OSError:
+            pass
+        finally:
+            os.close(fd)
+
+
+def is_unfinished(out_dir):
+    """True if out_dir holds the journal of a run that did not finish."""
+    if not os.path.exists(os.path.join(out_dir, JOURNAL_FILE)):
+        return False
+    old = Journal.open(out_dir)
+    old.close()
+    return not old.finished
+
+
+class Journal:
+    def __init__(self, out_dir, group=50, interval=2.0, on_commit=None):
+        """
+        group/interval: commit after this many records or seconds.
+        on_commit: callback run after each commit (e.g. saving the batch state).
+        Use Journal.start() for a new run and Journal.open() to resume.
+        """
+        self.path = os.path.join(out_dir, JOURNAL_FILE)
+        self.group = group
+        self.interval = interval
+        self.on_commit = on_commit
+        self.params = {}
+        self.finished = False
+        self._last = {}
+        self._pending = []
+        self._files = []
+        self._committed_at = time.monotonic()
+        self._fh = None
+        # mark() kann aus Worker-Threads kommen (Scheduler)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def start(cls, out_dir, params, restart=False, **kwargs):
+        """
+        Begin a new journal with the run parameters (source, header, options).
+        Refuses to overwrite an unfinished run unless restart is set.
+        """
+        journal = cls(out_dir, **kwargs)
+        if not restart and is_unfinished(out_dir):
+            raise JournalError(
+                f'Vorheriger Lauf in {out_dir} ist nicht abgeschlossen – '
+                f'mit "resume" fortsetzen oder mit --restart verwerfen.'
+            )
+        journal.params = params
+        journal._fh = open(journal.path, 'w', encoding='utf-8')
+        journal._append([{'run': params, 'started': time.strftime('%Y-%m-%d %H:%M:%S')}])
+        fsync_paths([journal.path])
+        return journal
+
+    @classmethod
+    def open(cls, out_dir, **kwargs):
+        """Load an existing journal for resuming; its records are kept."""
+        journal = cls(out_dir, **kwargs)
+        if not os.path.exists(journal.path):
+            raise JournalError(f'Kein Journal in {out_dir}')
+        with open(journal.path, encoding='utf-8') as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except ValueError:
+                    # beim Absturz abgeschnittene letzte Zeile
+                    break
+                if 'run' in rec:
+                    journal.params = rec['run']
+                elif rec.get('finished'):
+                    journal.finished = True
+                else:
+                    journal._last[rec['ean']] = rec
+        journal._fh = open(journal.path, 'a', encoding='utf-8')
+        return journal
+
+    def done(self, ean, key):
+        """Last committed record of an order if it belongs to the same inputs."""
+        rec = self._last.get(ean)
+        return rec if rec and rec.get('key') == key else None
+
+    def step(self, ean, key):
+        """Index in STATES of the last committed step, -1 if none."""
+        rec = self.done(ean, key)
+        return STATES.index(rec['state']) if rec else -1
+
+    def mark(self, ean, state, key, paths=(), **extra):
+        """Queue a record; it becomes durable with the next commit."""
+        rec = dict(extra, ean=ean, state=state, key=key)
+        with self._lock:
+            self._pending.append(rec)
+            self._files.extend(paths)
+
+    def maybe_commit(self):
+        if len(self._pending) >= self.group or \
+           time.monotonic() - self._committed_at >= self.interval:
+            self.commit()
+
+    def commit(self):
+        """fsync the pending output files, then append and fsync their records."""
+        with self._lock:
+            pending, files = self._pending, self._files
+            self._pending, self._files = [], []
+        if pending:
+            fsync_paths(files)
+            self._append(pending)
+            for rec in pending:
+                self._last[rec['ean']] = rec
+        self._committed_at = time.monotonic()
+        if self.on_commit:
+            self.on_commit()
+
+    def finish(self):
+        """Commit everything and mark the run as complete."""
+        self.commit()
+        self._append([{'finished': time.strftime('%Y-%m-%d %H:%M:%S')}])
+        self.finished = True
+
+    def _append(self, records):
+        self._fh.write(''.join(json.dumps(r, ensure_ascii=False) + '\n' for r in records))
+        self._fh.flush()
+        os.fsync(self._fh.fileno())
+
+    def close(self):
+        if self._fh:
+            self._fh.close()
+            self._fh = None
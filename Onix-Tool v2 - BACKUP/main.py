@@ -3,8 +3,9 @@
 
 import tkinter as tk
 from tkinter import ttk
-from utils import load_json
+import codelists
 import xml_export
+import order_import
 
 from tabs.header_tab          import HeaderTab
 from tabs.product_tab         import ProductTab
@@ -14,11 +15,14 @@ from tabs.pricing_tab         import PricingTab
 from tabs.international_tab   import InternationalTab
 from tabs.ebook_tab           import EBookTab
 from tabs.upload_tab          import UploadTab
+from tabs.search_tab          import SearchTab
 
 def main():
-    # JSON-Codes laden
-    wgs_codes   = load_json('warengruppe_codes.json')
-    bisac_codes = load_json('bisac_codes.json')
+    # JSON-Codes laden (Override-Ordner wird im Hintergrund überwacht)
+    registry    = codelists.Registry().start()
+    codes       = registry.current
+    wgs_codes   = codes.wgs
+    bisac_codes = codes.bisac
 
     # Hauptfenster
     root = tk.Tk()
@@ -37,6 +41,8 @@ def main():
         state='readonly', width=24
     )
     master_type_cb.pack(side='left', padx=(0,10))
+    import_btn = ttk.Button(bar, text='XML laden')
+    import_btn.pack(side='left')
 
     # die drei Widgets (noch nicht packen)
     export_btn   = ttk.Button(bar, text='Nur XML erstellen')
@@ -56,12 +62,17 @@ def main():
     frame_intl    = ttk.Frame(nb)
     frame_ebook   = ttk.Frame(nb)
     frame_upload  = ttk.Frame(nb)
+    frame_search  = ttk.Frame(nb)
 
     # instantiate tabs
     header_tab         = HeaderTab(frame_header)
     product_tab        = ProductTab(frame_product)
     contributor_tab    = ContributorTab(frame_contrib)
-    classification_tab = ClassificationTab(frame_class, wgs_codes, bisac_codes)
+    classification_tab = ClassificationTab(
+        frame_class, wgs_codes, bisac_codes, codes.index, codes.trees,
+        text_source=lambda: (product_tab.widgets['Title'].get(),
+                             product_tab.widgets['Blurb'].get('1.0', 'end-1c'))
+    )
     pricing_tab        = PricingTab(frame_pricing, on_price_update=None)
     international_tab  = InternationalTab(frame_intl)
     ebook_tab          = EBookTab(frame_ebook, product_tab.widgets['EAN'])
@@ -71,6 +82,7 @@ def main():
         header_tab, contributor_tab, classification_tab,
         pricing_tab, international_tab
     )
+    search_tab         = SearchTab(frame_search)
 
     # add tabs
     nb.add(frame_header,  text='Header')
@@ -81,6 +93,7 @@ def main():
     nb.add(frame_intl,    text='International')
     nb.add(frame_ebook,   text='EBook')
     nb.add(frame_upload,  text='Upload')
+    nb.add(frame_search,  text='Suche')
 
     # Pricing→International callback für Upload
     pricing_tab.on_price_update = international_tab.update_suggestions
@@ -99,6 +112,18 @@ def main():
         )
     )
     zip_btn.config(command=lambda: upload_tab.make_full_zip(master_type_var.get()))
+    import_btn.config(command=lambda:
+        order_import.import_xml(
+            master_type_var.set,
+            header_tab,
+            product_tab,
+            contributor_tab,
+            classification_tab,
+            pricing_tab,
+            international_tab,
+            ebook_tab
+        )
+    )
 
     def on_master_change(*_):
         mode = master_type_var.get()
@@ -214,6 +239,14 @@ def main():
     master_type_var.trace_add('write', on_master_change)
     on_master_change()
 
+    # neue Codelisten ohne Neustart übernehmen (Tk nur aus dem Hauptthread)
+    def poll_codes(shown=codes.version):
+        current = registry.current
+        if current.version != shown:
+            classification_tab.set_codes(current.wgs, current.bisac, current.index, current.trees)
+        root.after(2000, poll_codes, current.version)
+    root.after(2000, poll_codes)
+
     root.mainloop()
 
 if __name__ == '__main__':
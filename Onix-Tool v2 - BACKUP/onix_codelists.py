@@ -0,0 +1,219 @@
+# onix_codelists.py
+"""
+ONIX code lists of the BoD MasteringOrder Generator, generated from the EDItEUR
+schema module ONIX_BookProduct_CodeLists.xsd instead of being maintained by hand.
+
+build() streams the XSD with iterparse (each <xs:simpleType name="ListN"> is
+dropped once read) and writes onix_codelists.json: issue, release date and
+SHA-256 of the XSD, and per list 'onix-codelist-N' its title, {code: label},
+the notes and the deprecated codes. ensure() rebuilds only if the hash of the XSD
+differs from the one recorded in the JSON; 'cli.py codelists' runs it as the build
+step, and the codelists Registry runs it for an XSD dropped into the override
+folder. At runtime CodeLists reads the prebuilt JSON only – label(), notes() and
+deprecated() are dict lookups, the XSD is never parsed at startup.
+Place this file in the project root next to main.py.
+"""
+import os
+import re
+import json
+import hashlib
+from collections.abc import Mapping
+from lxml import etree
+from utils import BASE_DIR
+
+XSD_FILE = 'ONIX_BookProduct_CodeLists.xsd'
+OUTPUT = 'onix_codelists.json'
+FORMAT = 1
+PREFIX = 'onix-codelist-'
+
+_XS = '{http://www.w3.org/2001/XMLSchema}'
+_LIST = re.compile(r'List(\d+)$')
+# "Deprecated", "now Deprecated in ONIX for Books", "Do not use. Deprecated, …"
+_DEPRECATED = re.compile(r'\bDeprecated\b')
+
+# zuletzt geprüfte Override-XSD je Pfad (Größe, mtime) für refresh()
+_seen = {}
+
+
+def _text(el):
+    # Zeilenumbrüche/Einrückung der XSD zu einfachen Leerzeichen
+    return ' '.join((el.text or '').split()) if el is not None else ''
+
+
+def file_hash(path):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 20), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def parse_xsd(path):
+    """
+    Read the code lists from the XSD in one streaming pass.
+
+    Returns:
+        dict: the artifact (format, issue, released, source, sha256, lists).
+    Raises ValueError if the file is not a readable XSD.
+    """
+    issue = released = None
+    lists = {}
+    try:
+        for event, el in etree.iterparse(path, events=('end', 'comment'),
+                                         resolve_entities=False, no_network=True):
+            if event == 'comment':
+                # Kopfkommentar: "ISSUE: 69", "Release date: 2025-03-20"
+                if issue is None:
+                    m = re.search(r'ISSUE:\s*(\d+)', el.text or '')
+                    issue = m and m.group(1)
+                    m = re.search(r'Release date:\s*([\d-]+)', el.text or '')
+                    released = m and m.group(1)
+                continue
+            if el.tag != _XS + 'simpleType':
+                continue
+            m = _LIST.match(el.get('name') or '')
+            if m:
+                codes, notes, deprecated = {}, {}, []
+                for enum in el.iter(_XS + 'enumeration'):
+                    code = enum.get('value')
+                    label, note = (enum.findall(f'{_XS}annotation/{_XS}documentation') + [None, None])[:2]
+                    codes[code] = _text(label)
+                    if _text(note):
+                        notes[code] = _text(note)
+                    if _DEPRECATED.search(codes[code]) or _DEPRECATED.search(notes.get(code, '')):
+                        deprecated.append(code)
+                entry = {'title': _text(el.find(f'{_XS}annotation/{_XS}documentation')), 'codes': codes}
+                if notes:
+                    entry['notes'] = notes
+                if deprecated:
+                    entry['deprecated'] = deprecated
+                lists[PREFIX + m.group(1)] = entry
+            # gelesene Typen freigeben, der Baum bleibt klein
+            el.clear()
+            while el.getprevious() is not None:
+                del el.getparent()[0]
+    except etree.XMLSyntaxError as e:
+        raise ValueError(f'{os.path.basename(path)}: {e}')
+    if not lists:
+        raise ValueError(f'{os.path.basename(path)}: keine ONIX-Codelisten (ListN) gefunden')
+    lists = dict(sorted(lists.items(), key=lambda item: int(item[0][len(PREFIX):])))
+    return {'format': FORMAT, 'issue': issue, 'released': released,
+            'source': os.path.basename(path), 'sha256': file_hash(path), 'lists': lists}
+
+
+def recorded_hash(out_path):
+    """SHA-256 of the XSD the JSON was generated from (None for hand-made or missing files)."""
+    try:
+        with open(out_path, encoding='utf-8') as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return data.get('sha256') if isinstance(data, dict) else None
+
+
+def build(xsd_path, out_path):
+    """Generate out_path from the XSD (written atomically); returns the artifact."""
+    data = parse_xsd(xsd_path)
+    tmp = f'{out_path}.{os.getpid()}.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False, separators=(',', ':'))
+    os.replace(tmp, out_path)
+    return data
+
+
+def ensure(xsd_path=None, out_path=None, force=False):
+    """
+    Build step: regenerate the JSON only if the XSD hash changed.
+    Defaults: the bundled XSD, the JSON next to the XSD.
+
+    Returns:
+        tuple: (out_path, artifact dict or None if it was up to date).
+    """
+    xsd_path = xsd_path or os.path.join(BASE_DIR, XSD_FILE)
+    out_path = out_path or os.path.join(os.path.dirname(os.path.abspath(xsd_path)), OUTPUT)
+    if not force and recorded_hash(out_path) == file_hash(xsd_path):
+        return out_path, None
+    return out_path, build(xsd_path, out_path)
+
+
+def refresh(folder):
+    """
+    Regenerate folder/onix_codelists.json if folder holds a changed CodeLists XSD.
+    Checks size and mtime first, so polling costs one stat() per call; a broken
+    XSD raises ValueError once and is retried only after it changes again.
+
+    Returns:
+        bool: True if the JSON was rewritten.
+    """
+    xsd_path = os.path.join(folder, XSD_FILE)
+    try:
+        st = os.stat(xsd_path)
+    except OSError:
+        return False
+    sig = (st.st_size, st.st_mtime_ns)
+    if _seen.get(xsd_path) == sig:
+        return False
+    _seen[xsd_path] = sig
+    return ensure(xsd_path)[1] is not None
+
+
+def _key(list_id):
+    # 5, '5' oder 'onix-codelist-5'
+    if isinstance(list_id, int) or str(list_id).isdigit():
+        return f'{PREFIX}{int(list_id)}'
+    return list_id
+
+
+class CodeLists(Mapping):
+    """
+    The generated code lists: {list name: {code: label}} plus notes, titles,
+    deprecated codes and the issue of the source XSD. Also accepts the older
+    hand-made layout {list name: {code: label}} (without notes and deprecation).
+    """
+    def __init__(self, data):
+        if not isinstance(data, dict):
+            raise ValueError('Objekt {Liste: {Code: Text}} erwartet')
+        lists = data.get('lists') if 'format' in data else {
+            name: {'codes': codes} for name, codes in data.items()
+        }
+        if not isinstance(lists, dict) or \
+           not all(isinstance(l, dict) and isinstance(l.get('codes'), dict) for l in lists.values()):
+            raise ValueError('Codelisten unvollständig (je Liste "codes" erwartet)')
+        self.issue    = data.get('issue')
+        self.released = data.get('released')
+        self.sha256   = data.get('sha256')
+        self._codes      = {name: l['codes'] for name, l in lists.items()}
+        self._titles     = {name: l.get('title', '') for name, l in lists.items()}
+        self._notes      = {name: l.get('notes', {}) for name, l in lists.items()}
+        self._deprecated = {name: frozenset(l.get('deprecated', ())) for name, l in lists.items()}
+
+    def __getitem__(self, list_id):
+        return self._codes[_key(list_id)]
+
+    def __iter__(self):
+        return iter(self._codes)
+
+    def __len__(self):
+        return len(self._codes)
+
+    def title(self, list_id):
+        return self._titles.get(_key(list_id), '')
+
+    def label(self, list_id, code, default=None):
+        return self._codes.get(_key(list_id), {}).get(code, default)
+
+    def notes(self, list_id, code):
+        return self._notes.get(_key(list_id), {}).get(code, '')
+
+    def deprecated(self, list_id, code):
+        """True if EDItEUR marks the code as deprecated."""
+        return code in self._deprecated.get(_key(list_id), ())
+
+    def deprecated_codes(self, list_id):
+        return self._deprecated.get(_key(list_id), frozenset())
+
+
+def load(path=None):
+    """CodeLists from the generated JSON (default: the bundled onix_codelists.json)."""
+    with open(path or os.path.join(BASE_DIR, OUTPUT), encoding='utf-8') as f:
+        return CodeLists(json.load(f))
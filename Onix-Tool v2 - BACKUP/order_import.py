@@ -0,0 +1,160 @@
+# order_import.py
+"""
+Import of exported MasteringOrder XML files back into orders (order_model.Order,
+as built by collect_order and the batch loader), so an existing title can be corrected in the
+GUI or re-run in batch mode instead of being retyped. Upload, AddIntlDistribution
+and AddEBook orders are supported; the element tables of order_schema drive the
+import as well as the export, so both stay in step. Folders with many files are
+parsed in a process pool.
+Place this file in the project root next to main.py.
+"""
+import os
+from concurrent.futures import ProcessPoolExecutor
+from tkinter import filedialog, messagebox
+from lxml import etree
+import packaging
+import order_schema
+import order_model
+from order_schema import INTL_CURRENCIES
+from xml_export import order_ean
+
+# ab dieser Anzahl Dateien parallel in Prozessen
+PARALLEL_MIN = 32
+CHUNK = 64
+
+_parser = etree.XMLParser(remove_blank_text=True, resolve_entities=False, no_network=True)
+
+
+class OrderImportError(Exception):
+    pass
+
+
+def _skeleton(mode):
+    return {
+        'MasteringType': mode,
+        'Header': {},
+        'Product': {},
+        'Contributors': [],
+        'Classification': {'WGS': [], 'BISAC': [], 'AgeWGS': '', 'AgeBISAC': '', 'Language': ''},
+        'Price': '',
+        'International': {'Enabled': False, 'EAN': '', 'Prices': {c: '' for c in INTL_CURRENCIES}},
+        'EBook': {'Enabled': False, 'PrintedEAN': '', 'EAN': '', 'EBookFormat': 'ePub',
+                  'Conversion': 'No', 'EBookFileType': 'ePub', 'Price': ''},
+    }
+
+
+def order_from_tree(root):
+    """
+    Convert a <BoD> tree (as written by xml_export) into an order_model.Order,
+    following the table of its MasteringType in order_schema.
+    Raises OrderImportError if it is not a MasteringOrder.
+    """
+    prod = root.find('MasteringOrder/Product')
+    if root.tag != 'BoD' or prod is None:
+        raise OrderImportError('Keine BoD-MasteringOrder (BoD/MasteringOrder/Product fehlt).')
+    mode = (prod.findtext('MasteringType') or '').strip() or 'Upload'
+    if mode not in order_schema.SCHEMAS:
+        raise OrderImportError(f'Unbekannter MasteringType: {mode}')
+    order = order_schema.load_order(root, _skeleton(mode), mode)
+    eb = order['EBook']
+    eb['EBookFormat'] = eb['EBookFileType'] or 'ePub'
+    if mode == 'AddIntlDistribution':
+        order['International']['Enabled'] = True
+    return order_model.from_dict(order)
+
+
+def parse_order(source):
+    """
+    Parse a MasteringOrder XML file (path) or XML bytes into an order.
+    Raises OrderImportError with a readable message on broken or foreign files.
+    """
+    try:
+        if isinstance(source, bytes):
+            root = etree.fromstring(source, _parser)
+        else:
+            root = etree.parse(source, _parser).getroot()
+    except (etree.XMLSyntaxError, OSError) as e:
+        raise OrderImportError(f'XML nicht lesbar: {e}')
+    return order_from_tree(root)
+
+
+def attach_assets(order, folder):
+    """
+    Add the files of an unpacked order ZIP lying next to the XML
+    ({EAN}_Bookblock.pdf, {EAN}_Cover.pdf, E-Book-…) to the order's Assets.
+    Returns the new order.
+    """
+    assets = dict(order['Assets'])
+    for source, arcname in packaging.zip_layout(order):
+        path = os.path.join(folder, arcname)
+        if source != 'xml' and source not in assets and os.path.exists(path):
+            assets[source] = path
+    return order.replace(Assets=assets)
+
+
+def _load(path):
+    # im Worker-Prozess: nur einfache Daten über die Prozessgrenze
+    try:
+        return path, attach_assets(parse_order(path), os.path.dirname(os.path.abspath(path))), None
+    except OrderImportError as e:
+        return path, None, str(e)
+
+
+def load_files(paths, workers=None):
+    """
+    Parse many XML files; from PARALLEL_MIN files on in a process pool.
+
+    Returns:
+        tuple: ([(path, order)], [(path, error message)]) in the order of paths.
+    """
+    paths = list(paths)
+    if len(paths) < PARALLEL_MIN:
+        results = [_load(p) for p in paths]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_load, paths, chunksize=CHUNK))
+    orders = [(path, order) for path, order, err in results if order is not None]
+    errors = [(path, err) for path, order, err in results if order is None]
+    return orders, errors
+
+
+# ---------- GUI ----------
+def fill_tabs(order, header_tab, product_tab, contributor_tab, classification_tab,
+              pricing_tab, international_tab, ebook_tab):
+    """
+    Put an order into the tabs (counterpart of xml_export.collect_order).
+    SentDate/SentTime are left at the current time, a correction is a new order.
+    """
+    order = order_model.as_dict(order)
+    hdr = {k: v for k, v in order.get('Header', {}).items() if k not in ('SentDate', 'SentTime')}
+    header_tab.set_data(hdr)
+    mode = order.get('MasteringType', 'Upload')
+    if mode == 'Upload':
+        product_tab.set_data(order.get('Product', {}))
+        contributor_tab.set_data(order.get('Contributors', []))
+        classification_tab.set_selected(order.get('Classification', {}))
+        pricing_tab.set_price_eur(order.get('Price', ''))
+    international_tab.set_data(order.get('International', {}))
+    ebook_tab.set_data(order.get('EBook', {}))
+
+
+def import_xml(set_mode, *tabs, filename=None):
+    """
+    Ask for a MasteringOrder XML, switch the MasteringType via set_mode(mode)
+    and fill the tabs (same order as export_xml). Returns the order or None.
+    """
+    fn = filename or filedialog.askopenfilename(
+        title='MasteringOrder-XML laden', filetypes=[('XML', '*.xml')]
+    )
+    if not fn:
+        return None
+    try:
+        order = parse_order(fn)
+    except OrderImportError as e:
+        messagebox.showerror('Import fehlgeschlagen', f'{os.path.basename(fn)}:\n{e}')
+        return None
+    # erst Modus setzen (setzt u.a. die E-Book-Checkbox zurück), dann füllen
+    set_mode(order['MasteringType'])
+    fill_tabs(order, *tabs)
+    messagebox.showinfo('Order geladen', f'{order_ean(order)} aus {os.path.basename(fn)} übernommen.')
+    return order
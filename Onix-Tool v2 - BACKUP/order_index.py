@@ -0,0 +1,439 @@
+# order_index.py
+"""
+Full-text index over exported MasteringOrders for the BoD MasteringOrder Generator.
+Feeds Title, SubTitle, Blurb and contributor names from the XML written by
+export_xml into SQLite FTS5 and answers free-text queries for the Suche-Tab and the CLI.
+The same database keeps the order history (ZIPs written, checksum manifests) and
+the WGS/BISAC codes of every indexed title, from which the crosswalk learns.
+Place this file in the project root next to main.py.
+"""
+import os
+import re
+import json
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from lxml import etree
+from utils import data_path
+import xhtml_blurb
+
+DB_FILE = 'order_index.db'
+
+# Spalten, die durchsucht werden (Reihenfolge = Spalten der FTS-Tabelle)
+SEARCH_FIELDS = ['title', 'subtitle', 'contributors', 'blurb']
+
+# Datenbanken, deren Schema in diesem Prozess schon angelegt wurde
+_ready = set()
+# Verbindung einer laufenden session() je Thread
+_local = threading.local()
+
+
+def connect(path=None):
+    """
+    Open (and create if needed) the order index database. The schema is set up
+    once per database file and process, later calls only open the connection.
+
+    Args:
+        path (str): Optional database path, default DATA_DIR/order_index.db.
+
+    Returns:
+        sqlite3.Connection: Connection with row_factory=sqlite3.Row.
+    """
+    path = path or data_path(DB_FILE)
+    # gelöschte Datei oder :memory: → Schema neu anlegen
+    fresh = path not in _ready or not os.path.exists(path)
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    if fresh:
+        _create(conn)
+        _ready.add(path)
+    return conn
+
+
+@contextmanager
+def session(path=None):
+    """
+    Keep one connection open for the with-block: index and history calls of
+    this thread without an explicit conn use it instead of opening their own
+    (batch runs). Nested sessions reuse the outer connection.
+    """
+    if getattr(_local, 'conn', None) is not None:
+        yield _local.conn
+        return
+    _local.conn = connect(path)
+    try:
+        yield _local.conn
+    finally:
+        _local.conn.close()
+        _local.conn = None
+
+
+def _open(conn):
+    # (Verbindung, selbst geöffnet?) – übergebene, dann Session-Verbindung, sonst neue
+    if conn is not None:
+        return conn, False
+    shared = getattr(_local, 'conn', None)
+    if shared is not None:
+        return shared, False
+    return connect(), True
+
+
+def _create(conn):
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS orders ('
+        ' id INTEGER PRIMARY KEY, ean TEXT UNIQUE, mastering_type TEXT, imprint TEXT,'
+        ' title TEXT, subtitle TEXT, contributors TEXT, blurb TEXT,'
+        ' path TEXT, exported_at TEXT)'
+    )
+    conn.execute(
+        'CREATE TABLE IF NOT EXISTS history ('
+        ' id INTEGER PRIMARY KEY, ean TEXT, event TEXT, path TEXT,'
+        ' manifest TEXT, created_at TEXT)'
+    )
+    conn.execute('CREATE INDEX IF NOT EXISTS history_ean ON history (ean)')
+    conn.execute('CREATE TABLE IF NOT EXISTS subjects (ean TEXT, scheme TEXT, code TEXT)')
+    conn.execute('CREATE INDEX IF NOT EXISTS subjects_ean ON subjects (ean)')
+    if _has_fts5(conn):
+        # FTS5-Tabelle mit rowid = orders.id, Umlaute/Akzente werden beim Suchen ignoriert
+        conn.execute(
+            'CREATE VIRTUAL TABLE IF NOT EXISTS orders_fts USING fts5('
+            ' title, subtitle, contributors, blurb,'
+            " tokenize='unicode61 remove_diacritics 2')"
+        )
+    conn.commit()
+
+
+def _has_fts5(conn):
+    # manche SQLite-Builds (ältere Python-Installationen) haben kein FTS5
+    try:
+        conn.execute('CREATE VIRTUAL TABLE IF NOT EXISTS temp._fts5_probe USING fts5(x)')
+        conn.execute('DROP TABLE temp._fts5_probe')
+        return True
+    except sqlite3.OperationalError:
+        return False
+
+
+def _text(el, path):
+    val = el.findtext(path)
+    return val.strip() if val else ''
+
+
+def record_from_tree(root):
+    """
+    Extract the indexed fields from a BoD XML tree.
+
+    Args:
+        root (etree._Element): <BoD> root element as built by export_xml.
+
+    Returns:
+        dict or None: Index record, None if the order carries no title
+        (AddIntlDistribution / AddEBook).
+    """
+    prod = root.find('MasteringOrder/Product')
+    if prod is None or not _text(prod, 'Title'):
+        return None
+    names = [n.text.strip() for n in prod.findall('Contributor/ContributorName') if n.text]
+    subjects = [(s.get('Scheme'), s.text.strip()) for s in prod.findall('Subject') if s.text]
+    return {
+        'ean':            _text(prod, 'EAN'),
+        'mastering_type': _text(prod, 'MasteringType'),
+        'imprint':        _text(prod, 'Imprint'),
+        'title':          _text(prod, 'Title'),
+        'subtitle':       _text(prod, 'SubTitle'),
+        'contributors':   '; '.join(names),
+        'blurb':          xhtml_blurb.plain_text(_text(prod, 'Blurb')),
+        'subjects':       subjects,
+    }
+
+
+def record_from_order(order):
+    """
+    Same record as record_from_tree, taken directly from the order
+    (the export writes the XML text without building a tree).
+    """
+    prod = order.get('Product', {})
+    strip = lambda val: (val or '').strip()
+    if order.get('MasteringType', 'Upload') != 'Upload' or not strip(prod.get('Title')):
+        return None
+    names = [f"{c['LastName']}, {c['FirstName']}".strip() for c in order.get('Contributors', [])]
+    cls = order.get('Classification', {})
+    subjects = [(scheme, code) for scheme in ('WGS', 'BISAC') for code in cls.get(scheme) or ()]
+    return {
+        'ean':            strip(prod.get('EAN')),
+        'mastering_type': 'Upload',
+        'imprint':        strip(order.get('Header', {}).get('Imprint')),
+        'title':          strip(prod.get('Title')),
+        'subtitle':       strip(prod.get('SubTitle')),
+        'contributors':   '; '.join(n for n in names if n),
+        'blurb':          xhtml_blurb.plain_text(strip(prod.get('Blurb'))),
+        'subjects':       subjects,
+    }
+
+
+def index_tree(root, path=None, conn=None):
+    """
+    Add or replace one exported order in the index.
+
+    Args:
+        root (etree._Element): <BoD> root element.
+        path (str): File the order was written to.
+        conn (sqlite3.Connection): Optional open connection.
+
+    Returns:
+        str or None: Indexed EAN, None if nothing was indexed.
+    """
+    return index_record(record_from_tree(root), path, conn)
+
+
+def index_order(order, path=None, conn=None):
+    """index_tree for an order (see record_from_order)."""
+    return index_record(record_from_order(order), path, conn)
+
+
+def index_record(rec, path=None, conn=None):
+    """Upsert an index record; returns its EAN or None if rec is empty."""
+    if not rec:
+        return None
+    conn, own = _open(conn)
+    try:
+        with conn:
+            _upsert(conn, rec, path)
+    finally:
+        if own:
+            conn.close()
+    return rec['ean']
+
+
+def _upsert(conn, rec, path):
+    vals = (rec['mastering_type'], rec['imprint'], rec['title'], rec['subtitle'],
+            rec['contributors'], rec['blurb'], path,
+            datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+    row = conn.execute('SELECT id FROM orders WHERE ean = ?', (rec['ean'],)).fetchone()
+    if row:
+        oid = row['id']
+        conn.execute(
+            'UPDATE orders SET mastering_type=?, imprint=?, title=?, subtitle=?,'
+            ' contributors=?, blurb=?, path=?, exported_at=? WHERE id = ?',
+            vals + (oid,)
+        )
+    else:
+        oid = conn.execute(
+            'INSERT INTO orders (mastering_type, imprint, title, subtitle, contributors,'
+            ' blurb, path, exported_at, ean) VALUES (?,?,?,?,?,?,?,?,?)',
+            vals + (rec['ean'],)
+        ).lastrowid
+    if _has_fts_table(conn):
+        # Löschen per rowid ist indiziert, dadurch bleibt jedes Update O(log n)
+        conn.execute('DELETE FROM orders_fts WHERE rowid = ?', (oid,))
+        conn.execute(
+            'INSERT INTO orders_fts (rowid, title, subtitle, contributors, blurb) VALUES (?,?,?,?,?)',
+            (oid, rec['title'], rec['subtitle'], rec['contributors'], rec['blurb'])
+        )
+    conn.execute('DELETE FROM subjects WHERE ean = ?', (rec['ean'],))
+    conn.executemany(
+        'INSERT INTO subjects (ean, scheme, code) VALUES (?,?,?)',
+        [(rec['ean'], scheme, code) for scheme, code in rec.get('subjects', ())]
+    )
+
+
+def _has_fts_table(conn):
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='orders_fts'"
+    ).fetchone()
+    return row is not None
+
+
+def set_path(ean, path, conn=None):
+    """Update the stored file path of an indexed order (e.g. XML → ZIP)."""
+    conn, own = _open(conn)
+    try:
+        with conn:
+            conn.execute('UPDATE orders SET path = ? WHERE ean = ?', (path, ean))
+    finally:
+        if own:
+            conn.close()
+
+
+def record_history(ean, event, path, manifest=None, conn=None):
+    """
+    Append an entry to the order history.
+
+    Args:
+        ean (str): Order EAN.
+        event (str): What happened, e.g. 'zip'.
+        path (str): Affected file.
+        manifest (dict): Optional checksum manifest stored with the entry.
+    """
+    conn, own = _open(conn)
+    try:
+        with conn:
+            conn.execute(
+                'INSERT INTO history (ean, event, path, manifest, created_at) VALUES (?,?,?,?,?)',
+                (ean, event, path,
+                 json.dumps(manifest, ensure_ascii=False) if manifest else None,
+                 datetime.now().strftime('%Y-%m-%d %H:%M:%S'))
+            )
+    finally:
+        if own:
+            conn.close()
+
+
+def subject_pairs(conn=None):
+    """
+    How often WGS and BISAC codes were given together.
+
+    Returns:
+        list: (wgs, bisac, count) tuples.
+    """
+    conn, own = _open(conn)
+    try:
+        pairs = conn.execute(
+            "SELECT w.code, b.code, COUNT(*) FROM subjects w"
+            " JOIN subjects b ON b.ean = w.ean AND b.scheme = 'BISAC'"
+            " WHERE w.scheme = 'WGS' GROUP BY w.code, b.code"
+        ).fetchall()
+    finally:
+        if own:
+            conn.close()
+    return [tuple(p) for p in pairs]
+
+
+def subject_state(conn=None):
+    """(row count, last rowid) of the subjects table; changes with every re-indexed title."""
+    conn, own = _open(conn)
+    try:
+        return tuple(conn.execute('SELECT COUNT(*), MAX(rowid) FROM subjects').fetchone())
+    finally:
+        if own:
+            conn.close()
+
+
+def history(ean, conn=None):
+    """
+    Return the history entries of an EAN, oldest first; 'manifest' is decoded.
+    """
+    conn, own = _open(conn)
+    try:
+        rows = conn.execute(
+            'SELECT ean, event, path, manifest, created_at FROM history'
+            ' WHERE ean = ? ORDER BY id', (ean,)
+        ).fetchall()
+    finally:
+        if own:
+            conn.close()
+    result = []
+    for r in rows:
+        entry = dict(r)
+        entry['manifest'] = json.loads(r['manifest']) if r['manifest'] else None
+        result.append(entry)
+    return result
+
+
+def index_files(paths, conn=None):
+    """
+    Bulk-(re)index existing *_MasteringOrder.xml files, e.g. the whole backlist.
+
+    Args:
+        paths (list): XML files or folders (searched recursively).
+
+    Returns:
+        int: Number of indexed orders.
+    """
+    conn, own = _open(conn)
+    count = 0
+    try:
+        with conn:
+            for fn in _iter_xml(paths):
+                try:
+                    root = etree.parse(fn).getroot()
+                except (OSError, etree.XMLSyntaxError):
+                    continue
+                rec = record_from_tree(root)
+                if rec:
+                    _upsert(conn, rec, fn)
+                    count += 1
+    finally:
+        if own:
+            conn.close()
+    return count
+
+
+def _iter_xml(paths):
+    for p in paths:
+        if os.path.isdir(p):
+            for dirpath, _, files in os.walk(p):
+                for name in sorted(files):
+                    if name.endswith('_MasteringOrder.xml'):
+                        yield os.path.join(dirpath, name)
+        else:
+            yield p
+
+
+def _fts_query(text, field=None, prefix=False):
+    # jedes Wort als Phrase quoten, damit Sonderzeichen (- : ") keine FTS-Syntax sind
+    words = re.findall(r'\w+', text)
+    if not words:
+        return ''
+    terms = [f'"{w}"' for w in words]
+    if prefix:
+        terms[-1] += '*'
+    query = ' '.join(terms)
+    if field:
+        query = f'{field} : ({query})'
+    return query
+
+
+def search(text, field=None, limit=50, prefix=False, conn=None):
+    """
+    Search the index with free text (all words must match).
+
+    Args:
+        text (str): Free text, e.g. 'Camino de Santiago'.
+        field (str): Restrict to one of SEARCH_FIELDS, None = all fields.
+        limit (int): Maximum number of hits.
+        prefix (bool): Treat the last word as prefix (typeahead in the search box).
+
+    Returns:
+        list: Dicts with ean, title, subtitle, contributors, imprint, path, exported_at,
+        best match first.
+    """
+    if field and field not in SEARCH_FIELDS:
+        raise ValueError(f'Unbekanntes Suchfeld: {field}')
+    conn, own = _open(conn)
+    try:
+        if _has_fts_table(conn):
+            query = _fts_query(text, field, prefix)
+            if not query:
+                return []
+            rows = conn.execute(
+                'SELECT o.ean, o.title, o.subtitle, o.contributors, o.imprint,'
+                ' o.path, o.exported_at'
+                ' FROM orders_fts f JOIN orders o ON o.id = f.rowid'
+                ' WHERE orders_fts MATCH ? ORDER BY bm25(orders_fts) LIMIT ?',
+                (query, limit)
+            ).fetchall()
+        else:
+            rows = _search_like(conn, text, field, limit)
+        return [dict(r) for r in rows]
+    finally:
+        if own:
+            conn.close()
+
+
+def _search_like(conn, text, field, limit):
+    # Fallback ohne FTS5: jedes Wort muss in einem der Felder vorkommen
+    words = re.findall(r'\w+', text)
+    if not words:
+        return []
+    cols = [field] if field else SEARCH_FIELDS
+    where, args = [], []
+    for w in words:
+        where.append('(' + ' OR '.join(f'{c} LIKE ?' for c in cols) + ')')
+        args += [f'%{w}%'] * len(cols)
+    return conn.execute(
+        'SELECT ean, title, subtitle, contributors, imprint, path, exported_at'
+        f' FROM orders WHERE {" AND ".join(where)} ORDER BY title LIMIT ?',
+        args + [limit]
+    ).fetchall()
@@ -0,0 +1,273 @@
+# order_model.py
+"""
+Immutable order model of the BoD MasteringOrder Generator. An order is an Order of
+frozen slotted records (Header, Product, Contributor, Subject, Classification,
+Price, International, EBook) instead of nested dicts; repeated strings (imprint,
+company, role, currency, subject codes, product options) are interned, so a batch
+of 100 000 orders holds each of them once. Records answer get(key, default) and
+record[key] like the former dicts, so validation (xml_export.validate_order), the
+XML tables (order_schema), packaging and the order index read them unchanged.
+Changes create a new order: order.replace(Header=..., Assets=...) or
+order.Header.replace(SentDate=...). from_dict/as_dict convert from and to the
+dict layout of the batch JSON (Product.Series only, no 'Serie' duplicate).
+Place this file in the project root next to main.py.
+"""
+import sys
+from dataclasses import dataclass, fields, replace as _replace
+from types import MappingProxyType
+
+def _intern(value):
+    return sys.intern(value) if type(value) is str else value
+
+
+class _Record:
+    """Dict-style read access for the frozen records."""
+    __slots__ = ()
+    # Felder mit oft wiederholten Werten (werden interniert)
+    _INTERN = frozenset()
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def replace(self, **changes):
+        """Copy with changed fields (interned like from_dict)."""
+        intern = self._INTERN
+        return _replace(self, **{k: _intern(v) if k in intern else v for k, v in changes.items()})
+
+    @classmethod
+    def from_dict(cls, data):
+        """Record from a dict; missing keys get the field default, others are ignored."""
+        if isinstance(data, cls):
+            return data
+        data = data or {}
+        intern = cls._INTERN
+        return cls(**{
+            name: _intern(data[name]) if name in intern else data[name]
+            for name in cls._NAMES if name in data
+        })
+
+
+def _record(cls):
+    # Feldnamen einmal ablegen (für from_dict/as_dict)
+    cls._NAMES = tuple(f.name for f in fields(cls))
+    return cls
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class Header(_Record):
+    FromCompany:       str = ''
+    FromCompanyNumber: str = ''
+    SentDate:          str = ''
+    SentTime:          str = ''
+    FromPerson:        str = ''
+    FromEmail:         str = ''
+    Imprint:           str = ''
+
+    _INTERN = frozenset({'FromCompany', 'FromCompanyNumber', 'SentDate', 'SentTime',
+                         'FromPerson', 'FromEmail', 'Imprint'})
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class Product(_Record):
+    EAN:                   str = ''
+    Title:                 str = ''
+    SubTitle:              str = ''
+    Series:                str = ''
+    PartNumber:            str = ''
+    EditionNumber:         str = ''
+    PublicationDate:       str = ''
+    Blurb:                 str = ''
+    Height:                str = ''
+    Width:                 str = ''
+    Pages:                 str = ''
+    ColouredPages:         str = ''
+    ColouredPagesPosition: str = ''
+    Quality:               str = ''
+    Paper:                 str = ''
+    Binding:               str = ''
+    CoverDuplex:           str = ''
+    Finish:                str = ''
+
+    _INTERN = frozenset({'Series', 'PartNumber', 'EditionNumber', 'PublicationDate',
+                         'Height', 'Width', 'Pages', 'ColouredPages', 'Quality', 'Paper',
+                         'Binding', 'CoverDuplex', 'Finish'})
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class Contributor(_Record):
+    Role:      str = 'Author'
+    LastName:  str = ''
+    FirstName: str = ''
+    ISNI:      str = ''
+    ORCID:     str = ''
+    ShortBio:  str = ''
+
+    _INTERN = frozenset({'Role', 'LastName', 'FirstName'})
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class Subject(_Record):
+    Scheme: str
+    Code:   str
+
+    _INTERN = frozenset({'Scheme', 'Code'})
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class Classification(_Record):
+    Subjects: tuple = ()
+    AgeWGS:   str = ''
+    AgeBISAC: str = ''
+    Language: str = ''
+
+    _INTERN = frozenset({'AgeWGS', 'AgeBISAC', 'Language'})
+
+    @property
+    def WGS(self):
+        return tuple(s.Code for s in self.Subjects if s.Scheme == 'WGS')
+
+    @property
+    def BISAC(self):
+        return tuple(s.Code for s in self.Subjects if s.Scheme == 'BISAC')
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        data = data or {}
+        subjects = tuple(
+            Subject(scheme, _intern(code))
+            for scheme in ('WGS', 'BISAC') for code in data.get(scheme) or ()
+        )
+        return cls(subjects, **{
+            k: _intern(data[k]) for k in ('AgeWGS', 'AgeBISAC', 'Language') if k in data
+        })
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class Price(_Record):
+    Value:    str
+    Currency: str = 'EUR'
+
+    _INTERN = frozenset({'Value', 'Currency'})
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class International(_Record):
+    Enabled:   bool = False
+    EAN:       str = ''
+    PrevPrice: str = ''
+    PriceList: tuple = ()
+
+    _INTERN = frozenset({'PrevPrice'})
+
+    @property
+    def Prices(self):
+        """{currency: value} like the former International['Prices']."""
+        return {p.Currency: p.Value for p in self.PriceList}
+
+    @classmethod
+    def from_dict(cls, data):
+        if isinstance(data, cls):
+            return data
+        data = data or {}
+        prices = tuple(
+            Price(_intern(value), _intern(cur)) for cur, value in (data.get('Prices') or {}).items()
+        )
+        return cls(bool(data.get('Enabled')), data.get('EAN', ''),
+                   _intern(data.get('PrevPrice', '')), prices)
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class EBook(_Record):
+    Enabled:       bool = False
+    PrintedEAN:    str = ''
+    EAN:           str = ''
+    EBookFormat:   str = 'ePub'
+    Conversion:    str = 'No'
+    EBookFileType: str = 'ePub'
+    Price:         str = ''
+
+    _INTERN = frozenset({'EBookFormat', 'Conversion', 'EBookFileType', 'Price'})
+
+
+# Bereiche der Order → Record-Typ (Dicts werden beim Anlegen umgewandelt)
+_PARTS = {
+    'Header': Header, 'Product': Product, 'Classification': Classification,
+    'International': International, 'EBook': EBook,
+}
+
+
+@_record
+@dataclass(slots=True, frozen=True)
+class Order(_Record):
+    MasteringType:  str = 'Upload'
+    Header:         Header = Header()
+    Product:        Product = Product()
+    Contributors:   tuple = ()
+    Classification: Classification = Classification()
+    Price:          str = ''
+    International:  International = International()
+    EBook:          EBook = EBook()
+    Assets:         MappingProxyType = None
+
+    _INTERN = frozenset({'MasteringType', 'Price'})
+
+    def __post_init__(self):
+        # Dicts/Listen (batch JSON, Tabs) in Records umwandeln
+        for name, kind in _PARTS.items():
+            value = getattr(self, name)
+            if not isinstance(value, kind):
+                object.__setattr__(self, name, kind.from_dict(value))
+        contributors = self.Contributors
+        if type(contributors) is not tuple or \
+           not all(type(c) is Contributor for c in contributors):
+            object.__setattr__(self, 'Contributors',
+                               tuple(Contributor.from_dict(c) for c in contributors or ()))
+        if type(self.Assets) is not MappingProxyType:
+            object.__setattr__(self, 'Assets', MappingProxyType(dict(self.Assets or {})))
+
+    def __reduce__(self):
+        # MappingProxyType lässt sich nicht picklen (Prozess-Pool im Service)
+        values = [getattr(self, name) for name in self._NAMES]
+        values[-1] = dict(self.Assets)
+        return Order, tuple(values)
+
+
+def from_dict(order):
+    """Order from an order dict (batch JSON / collect_order layout); Orders pass through."""
+    return Order.from_dict(order)
+
+
+def as_dict(record):
+    """
+    Plain dict/list form of an Order or record, in the layout of the batch JSON
+    (e.g. for JSON fingerprints or the tab setters).
+    """
+    if isinstance(record, Classification):
+        return {'WGS': list(record.WGS), 'BISAC': list(record.BISAC), 'AgeWGS': record.AgeWGS,
+                'AgeBISAC': record.AgeBISAC, 'Language': record.Language}
+    if isinstance(record, International):
+        return {'Enabled': record.Enabled, 'EAN': record.EAN, 'PrevPrice': record.PrevPrice,
+                'Prices': record.Prices}
+    if isinstance(record, _Record):
+        return {name: as_dict(getattr(record, name)) for name in record._NAMES}
+    if isinstance(record, tuple):
+        return [as_dict(item) for item in record]
+    if isinstance(record, MappingProxyType):
+        return dict(record)
+    return record
@@ -0,0 +1,542 @@
+# order_schema.py
+"""
+Declarative element order of the BoD MasteringOrder XML, one table per
+MasteringType (Upload, AddIntlDistribution, AddEBook). Each table is compiled once
+at import into three functions: an lxml tree builder (build_tree), a text emitter
+that writes the pretty-printed XML directly without building a tree (render /
+write_xml, byte-identical to xml_export.xml_bytes(build_tree(...))) and a loader
+that maps an existing XML back onto an order dict (load_order).
+The tables read orders only through get()/[] and so take order_model records
+as well as plain dicts. Element order is
+therefore the same for export, streaming and import in every mode.
+Place this file in the project root next to main.py.
+"""
+import re
+from lxml import etree
+import codelists
+
+HEADER_TAGS = ['FromCompany','FromCompanyNumber','SentDate','SentTime','FromPerson','FromEmail']
+
+# Einfache Textfelder im <Product> (Upload) in Schema-Reihenfolge:
+# (XML-Tag, Bereich der Order, Schlüssel)
+UPLOAD_FIELDS = [
+    ('Title',                 'Product',        'Title'),
+    ('SubTitle',              'Product',        'SubTitle'),
+    ('Series',                'Product',        'Series'),
+    ('PartNumber',            'Product',        'PartNumber'),
+    ('Imprint',               'Header',         'Imprint'),
+    ('EditionNumber',         'Product',        'EditionNumber'),
+    ('PublicationDate',       'Product',        'PublicationDate'),
+    ('Blurb',                 'Product',        'Blurb'),
+    ('Height',                'Product',        'Height'),
+    ('Width',                 'Product',        'Width'),
+    ('Pages',                 'Product',        'Pages'),
+    ('ColouredPages',         'Product',        'ColouredPages'),
+    ('ColouredPagesPosition', 'Product',        'ColouredPagesPosition'),
+    ('Quality',               'Product',        'Quality'),
+    ('Paper',                 'Product',        'Paper'),
+    ('Binding',               'Product',        'Binding'),
+    ('CoverDuplex',           'Product',        'CoverDuplex'),
+    ('Finish',                'Product',        'Finish'),
+    ('Language',              'Classification', 'Language'),
+]
+# auch leer geschrieben (Imprint immer aus Header-Tab, Language aus Classification-Tab)
+ALWAYS_WRITTEN = {'Imprint', 'Language'}
+
+INTL_CURRENCIES = ['USD','GBP','AUD']
+
+CONTRIBUTOR_ROLES = [
+    'Author','Editor','Illustrator','Photographer','Drawer','VolumeEditor',
+    'SeriesEditor','FoundedBy','PrefaceBy','ForewordBy','IntroductionBy',
+    'AfterwordBy','NotesBy','CommentariesBy','ContributionsBy','RevisedBy',
+    'AdaptedBy','TranslatedBy','CompiledBy','SelectedBy'
+]
+_ROLES = {role.lower(): role for role in CONTRIBUTOR_ROLES}
+
+XML_DECLARATION = "<?xml version='1.0' encoding='UTF-8'?>\n"
+INDENT = '  '
+
+# wie lxml: Steuerzeichen sind in XML nicht erlaubt
+_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+_TEXT_ESC = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '\r': '&#13;'})
+_ATTR_ESC = str.maketrans({'&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;',
+                           '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+
+
+# nur Werte mit Sonderzeichen werden geprüft und ersetzt (schneller Weg für den Rest)
+_TEXT_SPECIAL = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f&<>\r]').search
+_ATTR_SPECIAL = re.compile('[\x00-\x1f&<>"]').search
+
+
+def _escape(val, table):
+    if _INVALID.search(val):
+        raise ValueError('All strings must be XML compatible: Unicode or ASCII, '
+                         'no NULL bytes or control characters')
+    return val.translate(table)
+
+
+def _getter(path):
+    # 'Product.Title' → scope['Product']['Title'] ('' wenn nicht vorhanden)
+    keys = path.split('.')
+    if len(keys) == 1:
+        key = keys[0]
+        return lambda scope, order, ctx: scope.get(key, '')
+    first, key = keys
+    return lambda scope, order, ctx: scope.get(first, {}).get(key, '')
+
+
+def _setter(path):
+    keys = path.split('.')
+    def put(scope, value):
+        for k in keys[:-1]:
+            scope = scope.setdefault(k, {})
+        scope[keys[-1]] = value
+    return put
+
+
+def _text(el, raw=False):
+    text = el.text or ''
+    return text if raw else text.strip()
+
+
+# ---------- Knoten der Tabellen ----------
+class Const:
+    """Element with fixed text, e.g. <MasteringType>Upload</MasteringType>."""
+    def __init__(self, tag, value, when=None, load=None):
+        self.tag, self.value, self.when, self.load = tag, value, when, load
+
+
+class Field:
+    """
+    Text element. path ('Section.Key', relative to the current scope) or
+    get(scope, order, ctx) supply the value; optional fields are skipped when
+    empty; attrs(scope, order, ctx) returns the attributes; load(el, scope)
+    replaces the default import (setting path).
+    """
+    def __init__(self, tag, path=None, get=None, optional=True, strip=False,
+                 attrs=None, when=None, load=None, raw=False):
+        self.tag = tag
+        self.path = path
+        self.get = get or _getter(path)
+        self.optional = optional
+        self.strip = strip
+        self.attrs = attrs
+        self.when = when
+        self.load = load
+        self.raw = raw
+
+
+class Group:
+    """Container element; children share the scope of the group."""
+    def __init__(self, tag, children, when=None, match=None, load=None):
+        self.tag, self.children, self.when, self.match, self.load = tag, children, when, match, load
+
+
+class Each:
+    """
+    Repeats node for every item of the list at path (or returned by
+    get(scope, order, ctx)); inside, the item is the scope. On import, new(el,
+    scope) creates the item a group is loaded into, load(el, scope) replaces
+    the default (appending the text to the list at path).
+    """
+    def __init__(self, node, path=None, get=None, match=None, new=None, load=None):
+        self.node = node
+        self.path = path
+        self.get = get or _getter(path)
+        self.tag = node.tag
+        self.match = match
+        self.new = new
+        self.load = load
+
+
+def _enabled(path):
+    get = _getter(path)
+    return lambda scope: bool(get(scope, None, None))
+
+
+# ---------- Tabellen ----------
+def _contributor_name(c, order, ctx):
+    return f"{c['LastName']}, {c['FirstName']}"
+
+
+def _load_name(el, c):
+    last, _, first = _text(el).partition(',')
+    c['LastName'], c['FirstName'] = last.strip(), first.strip()
+
+
+def _load_role(el, c):
+    role = _text(el)
+    c['Role'] = _ROLES.get(role.lower(), role)
+
+
+def _new_contributor(el, order):
+    c = {'Role': 'Author', 'LastName': '', 'FirstName': '', 'ISNI': '', 'ORCID': '', 'ShortBio': ''}
+    order['Contributors'].append(c)
+    return c
+
+
+def _subject_attrs(scheme):
+    def attrs(code, order, wgs_codes):
+        sel = order.get('Classification', {})
+        out = {'Scheme': scheme}
+        if sel.get('Age' + scheme, '') and codelists.audience(wgs_codes).needs_age(scheme, code):
+            out['AudienceRangeFrom'] = sel['Age' + scheme]
+        return out
+    return attrs
+
+
+def _load_subject(el, order):
+    scheme = el.get('Scheme', '')
+    sel = order['Classification']
+    sel[scheme].append(_text(el))
+    if el.get('AudienceRangeFrom'):
+        sel['Age' + scheme] = el.get('AudienceRangeFrom')
+
+
+def _price_currency(codes):
+    def match(el):
+        cur = el.find('PriceCurrency')
+        return cur is not None and _text(cur) in codes
+    return match
+
+
+def _load_intl_price(el, order):
+    order['International']['Prices'][_text(el.find('PriceCurrency'))] = _text(el.find('PriceValue'))
+
+
+def _intl_prices(all_currencies):
+    def get(order, _, ctx):
+        intl = order.get('International', {})
+        prices = intl.get('Prices', {})
+        if all_currencies:
+            return [(cur, prices[cur]) for cur in INTL_CURRENCIES]
+        if not intl.get('Enabled'):
+            return []
+        return [(cur, prices[cur]) for cur in INTL_CURRENCIES if prices.get(cur)]
+    return get
+
+
+# Price-Block der Auslandspreise; Scope ist (Währung, Wert)
+_INTL_PRICE = Group('Price', [
+    Field('PriceValue',    get=lambda item, o, x: item[1], optional=False),
+    Field('PriceCurrency', get=lambda item, o, x: item[0], optional=False),
+])
+
+
+def _ebook_block(when=None, strip=True):
+    # AddEBook übernimmt EAN und Preis ungekürzt (wie der bisherige Export)
+    return Group('EBook', [
+        Field('EAN', 'EBook.EAN', optional=False, strip=strip,
+              attrs=lambda order, o, x: {'EBookFileType': order.get('EBook', {}).get('EBookFileType', '')}),
+        Field('Conversion',    'EBook.Conversion',    optional=False),
+        Field('EBookFileType', 'EBook.EBookFileType', optional=False),
+        Group('Price', [
+            Field('PriceValue', 'EBook.Price', optional=False, strip=strip),
+            Const('PriceCurrency', 'EUR'),
+        ]),
+    ], when=when, load=lambda el, order: order['EBook'].update(Enabled=True) or order)
+
+
+def _document(mode, product):
+    return Group('BoD', [
+        Group('Header', [Field(tag, 'Header.' + tag) for tag in HEADER_TAGS]),
+        Group('MasteringOrder', [Group('Product', [Const('MasteringType', mode)] + product)]),
+    ])
+
+
+SCHEMAS = {
+    'Upload': _document('Upload', [
+        Field('EAN', 'Product.EAN', optional=False, strip=True),
+        Each(Group('Contributor', [
+            Field('ContributorRole', get=lambda c, o, x: c['Role'].lower(), optional=False, load=_load_role),
+            Field('ContributorName', get=_contributor_name, optional=False, load=_load_name),
+            Field('ContributorShortBio', 'ShortBio'),
+        ]), path='Contributors', new=_new_contributor),
+    ] + [
+        Field(tag, f'{section}.{key}', optional=tag not in ALWAYS_WRITTEN, raw=tag == 'Blurb')
+        for tag, section, key in UPLOAD_FIELDS
+    ] + [
+        Each(Field('Subject', get=lambda code, o, x: code, attrs=_subject_attrs(scheme), optional=False),
+             path=f'Classification.{scheme}',
+             match=lambda el, s=scheme: el.get('Scheme') == s, load=_load_subject)
+        for scheme in ('WGS', 'BISAC')
+    ] + [
+        Group('Price', [
+            Field('PriceValue', 'Price', optional=False),
+            Const('PriceCurrency', 'EUR'),
+        ], match=_price_currency(['EUR'])),
+        Const('InternationalDistribution', 'Yes', when=_enabled('International.Enabled'),
+              load=lambda el, order: order['International'].update(Enabled=_text(el) == 'Yes')),
+        Each(_INTL_PRICE, get=_intl_prices(False),
+             match=_price_currency(INTL_CURRENCIES), load=_load_intl_price),
+        _ebook_block(when=_enabled('EBook.Enabled')),
+    ]),
+    'AddIntlDistribution': _document('AddIntlDistribution', [
+        Field('EAN', 'International.EAN', optional=False, strip=True),
+        Each(_INTL_PRICE, get=_intl_prices(True),
+             match=_price_currency(INTL_CURRENCIES), load=_load_intl_price),
+    ]),
+    'AddEBook': _document('AddEBook', [
+        Field('EAN', 'EBook.PrintedEAN', optional=False),
+        _ebook_block(strip=False),
+    ]),
+}
+
+
+# ---------- Compiler: Text ----------
+def _plain(node):
+    # Konstanten und Felder ohne Sonderlogik werden zu einer Schleife zusammengefasst
+    if isinstance(node, Const):
+        return node.when is None
+    return isinstance(node, Field) and node.path and node.when is None and node.attrs is None
+
+
+def _compile_run(nodes, pad):
+    specs = []
+    for node in nodes:
+        tag = node.tag
+        if isinstance(node, Const):
+            specs.append((None, None, False, False, f'{pad}<{tag}>{node.value}</{tag}>\n', '', ''))
+            continue
+        keys = node.path.split('.')
+        first, key = keys if len(keys) == 2 else (None, keys[0])
+        specs.append((first, key, node.optional, node.strip,
+                      f'{pad}<{tag}>', f'</{tag}>\n', f'{pad}<{tag}/>\n'))
+    specs = tuple(specs)
+
+    def emit(scope, order, ctx, out):
+        append = out.append
+        for first, key, optional, strip, start, end, empty in specs:
+            if key is None:
+                append(start)
+                continue
+            val = scope.get(first, {}).get(key, '') if first else scope.get(key, '')
+            if strip and val:
+                val = val.strip()
+            if not val:
+                if optional:
+                    continue
+                if val is None:
+                    append(empty)
+                    continue
+            if _TEXT_SPECIAL(val):      # TypeError wie lxml, wenn kein str
+                val = _escape(val, _TEXT_ESC)
+            append(start + val + end)
+    return emit
+
+
+def _compile_children(children, depth):
+    compiled, run = [], []
+    for child in children:
+        if _plain(child):
+            run.append(child)
+            continue
+        if run:
+            compiled.append(_compile_run(run, INDENT * depth))
+            run = []
+        compiled.append(_compile_text(child, depth))
+    if run:
+        compiled.append(_compile_run(run, INDENT * depth))
+    return compiled
+
+
+def _compile_text(node, depth):
+    pad = INDENT * depth
+    tag = node.tag
+    when = node.when if not isinstance(node, Each) else None
+
+    if _plain(node):
+        return _compile_run([node], pad)
+
+    if isinstance(node, Const):
+        line = f'{pad}<{tag}>{node.value}</{tag}>\n'
+        def emit(scope, order, ctx, out):
+            if when(scope):
+                out.append(line)
+        return emit
+
+    if isinstance(node, Field):
+        get, optional, strip, attrs = node.get, node.optional, node.strip, node.attrs
+        start = f'{pad}<{tag}'
+        end = f'</{tag}>\n'
+        def emit(scope, order, ctx, out):
+            if when is not None and not when(scope):
+                return
+            val = get(scope, order, ctx)
+            if strip and val:
+                val = val.strip()
+            if optional and not val:
+                return
+            head = start
+            if attrs:
+                head += ''.join(f' {k}="{_escape(v, _ATTR_ESC) if _ATTR_SPECIAL(v) else v}"'
+                                for k, v in attrs(scope, order, ctx).items())
+            if val is None:
+                out.append(head + '/>\n')
+            else:
+                if _TEXT_SPECIAL(val):
+                    val = _escape(val, _TEXT_ESC)
+                out.append(f'{head}>{val}{end}')
+        return emit
+
+    if isinstance(node, Group):
+        children = _compile_children(node.children, depth + 1)
+        open_, close, empty = f'{pad}<{tag}>\n', f'{pad}</{tag}>\n', f'{pad}<{tag}/>\n'
+        def emit(scope, order, ctx, out):
+            if when is not None and not when(scope):
+                return
+            idx = len(out)
+            out.append(open_)
+            for child in children:
+                child(scope, order, ctx, out)
+            if len(out) == idx + 1:
+                out[idx] = empty
+            else:
+                out.append(close)
+        return emit
+
+    # Each
+    get, inner = node.get, _compile_text(node.node, depth)
+    def emit(scope, order, ctx, out):
+        for item in get(scope, order, ctx) or ():
+            inner(item, order, ctx, out)
+    return emit
+
+
+# ---------- Compiler: lxml-Baum ----------
+def _compile_tree(node):
+    tag = node.tag
+    when = node.when if not isinstance(node, Each) else None
+
+    if isinstance(node, Const):
+        value = node.value
+        def emit(scope, order, ctx, parent):
+            if when is None or when(scope):
+                etree.SubElement(parent, tag).text = value
+        return emit
+
+    if isinstance(node, Field):
+        get, optional, strip, attrs = node.get, node.optional, node.strip, node.attrs
+        def emit(scope, order, ctx, parent):
+            if when is not None and not when(scope):
+                return
+            val = get(scope, order, ctx)
+            if strip and val:
+                val = val.strip()
+            if optional and not val:
+                return
+            el = etree.SubElement(parent, tag, attrs(scope, order, ctx) if attrs else {})
+            el.text = val
+        return emit
+
+    if isinstance(node, Group):
+        children = [_compile_tree(c) for c in node.children]
+        def emit(scope, order, ctx, parent):
+            if when is not None and not when(scope):
+                return
+            el = etree.SubElement(parent, tag) if parent is not None else etree.Element(tag)
+            for child in children:
+                child(scope, order, ctx, el)
+            return el
+        return emit
+
+    get, inner = node.get, _compile_tree(node.node)
+    def emit(scope, order, ctx, parent):
+        for item in get(scope, order, ctx) or ():
+            inner(item, order, ctx, parent)
+    return emit
+
+
+# ---------- Compiler: Import ----------
+def _compile_load(node):
+    """Return (tag, match, load(el, scope)) for one table node."""
+    if isinstance(node, Const):
+        return node.tag, None, node.load or (lambda el, scope: None)
+
+    if isinstance(node, Field):
+        if node.load:
+            return node.tag, None, node.load
+        put, raw = _setter(node.path), node.raw
+        return node.tag, None, lambda el, scope: put(scope, _text(el, raw))
+
+    if isinstance(node, Group):
+        dispatch = _dispatch(node.children)
+        pre = node.load
+        def load(el, scope):
+            if pre:
+                scope = pre(el, scope)
+            _load_children(el, scope, dispatch)
+        return node.tag, node.match, load
+
+    # Each: eigener Loader, neues Listenelement oder Text an Liste anhängen
+    if node.load:
+        return node.tag, node.match, node.load
+    if node.new:
+        _, _, inner = _compile_load(node.node)
+        new_item = node.new
+        return node.tag, node.match, lambda el, scope: inner(el, new_item(el, scope))
+    keys = node.path.split('.')
+    def load(el, scope):
+        target = scope
+        for k in keys[:-1]:
+            target = target.setdefault(k, {})
+        target.setdefault(keys[-1], []).append(_text(el))
+    return node.tag, node.match, load
+
+
+def _dispatch(children):
+    table = {}
+    for child in children:
+        tag, match, load = _compile_load(child)
+        table.setdefault(tag, []).append((match, load))
+    return table
+
+
+def _load_children(el, scope, dispatch):
+    for child in el:
+        for match, load in dispatch.get(child.tag, ()):
+            if match is None or match(child):
+                load(child, scope)
+                break
+
+
+_TEXT   = {mode: _compile_text(schema, 0) for mode, schema in SCHEMAS.items()}
+_TREE   = {mode: _compile_tree(schema) for mode, schema in SCHEMAS.items()}
+_LOADER = {mode: _compile_load(schema)[2] for mode, schema in SCHEMAS.items()}
+
+
+# ---------- API ----------
+def build_tree(order, wgs_codes):
+    """Build the <BoD> lxml tree of an order."""
+    return _TREE[order.get('MasteringType', 'Upload')](order, order, wgs_codes, None)
+
+
+def render_parts(order, wgs_codes):
+    """Serialized XML as list of str parts (without declaration)."""
+    out = []
+    _TEXT[order.get('MasteringType', 'Upload')](order, order, wgs_codes, out)
+    return out
+
+
+def render(order, wgs_codes):
+    """XML bytes of an order, identical to xml_bytes(build_tree(order, wgs_codes))."""
+    return (XML_DECLARATION + ''.join(render_parts(order, wgs_codes))).encode('utf-8')
+
+
+def write_xml(order, wgs_codes, write, chunk_size=64 * 1024):
+    """Stream the XML of an order to write(bytes) in chunks of about chunk_size."""
+    buf, size = [XML_DECLARATION], len(XML_DECLARATION)
+    for part in render_parts(order, wgs_codes):
+        buf.append(part)
+        size += len(part)
+        if size >= chunk_size:
+            write(''.join(buf).encode('utf-8'))
+            buf, size = [], 0
+    if buf:
+        write(''.join(buf).encode('utf-8'))
+
+
+def load_order(root, order, mode):
+    """Fill the order dict skeleton from a <BoD> tree following the mode's table."""
+    _LOADER[mode](root, order)
+    return order
@@ -0,0 +1,509 @@
+# packaging.py
+"""
+Packaging of MasteringOrder ZIP archives for GUI and batch runs.
+zip_layout decides member names and order, write_zip writes the archive with a
+fixed timestamp for the XML member so identical inputs give identical bytes.
+If only the metadata changed and the XML is the last member, update_zip_xml
+rewrites just the XML record and the central directory in place and keeps the
+PDF members' local headers and compressed bytes untouched; a marker file makes
+an interrupted update fall back to a full rebuild.
+Assets may be file paths or 'sha256:<hex>' refs into an AssetStore; a ref whose
+object no longer has that hash (hard-linked source edited) stops the ZIP.
+SHA-256/MD5 of every member are computed while it is streamed into the archive
+and written to a sidecar {EAN}_MasteringOrder.manifest.json, which is also
+recorded in the order history, so no second read of the PDFs is needed.
+Stored (uncompressed) members take a fast path: the CRC is computed over an mmap
+of the source and the payload is copied kernel-side (copy_file_range or
+sendfile) where available, with the hashes running alongside.
+stream_zip writes the same members to a non-seekable stream (local headers with
+data descriptors), e.g. directly into an upload connection.
+Place this file in the project root next to main.py.
+"""
+import os
+import mmap
+import json
+import time
+import zlib
+import hashlib
+import threading
+import zipfile
+from datetime import datetime
+from xml_export import ValidationError, order_ean
+from asset_store import is_ref, REF_PREFIX
+import order_index
+
+CHUNK_SIZE = 1024 * 1024
+
+# ab dieser Größe lohnt mmap + Kernel-Kopie für ungepackte Einträge
+FAST_COPY_MIN = 1024 * 1024
+
+
+def zip_layout(order):
+    """
+    Return the archive members of an order as (source, arcname) in archive order.
+    source is 'xml' for the generated XML or a key of order['Assets']
+    ('manuscript', 'cover', 'ebook', 'ebook_cover').
+    """
+    mode  = order.get('MasteringType', 'Upload')
+    ean   = order_ean(order)
+    eb    = order.get('EBook', {})
+    eb_isbn = eb.get('EAN', '').strip()
+    fmt   = eb.get('EBookFormat', 'ePub').lower()
+
+    if mode == 'AddEBook':
+        return [
+            ('xml',         f"{ean}_MasteringOrder.xml"),
+            ('ebook',       f"E-Book-{eb_isbn}.{fmt}"),
+            ('ebook_cover', f"E-Book-{eb_isbn}.jpg"),
+        ]
+
+    band   = order.get('Product', {}).get('PartNumber', '').strip()
+    suffix = f"_{band}" if band else ""
+    layout = [
+        ('manuscript', f"{ean}{suffix}_Bookblock.pdf"),
+        ('cover',      f"{ean}_Cover.pdf"),
+        ('xml',        f"{ean}_MasteringOrder.xml"),
+    ]
+    if eb.get('Enabled'):
+        ext = 'pdf' if fmt == 'epdf' else fmt
+        layout += [
+            ('ebook',       f"E-Book-{eb_isbn}.{ext}"),
+            ('ebook_cover', f"E-Book-{eb_isbn}.jpg"),
+        ]
+    return layout
+
+
+def asset_paths(order, store=None):
+    """
+    Return order['Assets'] with store refs resolved to readable file paths.
+    Raises ValidationError for a ref when no store is given.
+    """
+    paths = {}
+    for key, value in order.get('Assets', {}).items():
+        if is_ref(value):
+            if store is None:
+                raise ValidationError(
+                    'Fehler', f'{value} verweist auf den Asset-Store, aber es ist keiner angegeben (--store).'
+                )
+            value = store.resolve(value)
+        paths[key] = value
+    return paths
+
+
+def validate_assets(order, store=None):
+    """
+    Check that all files needed for the ZIP are given and the E-Book format matches.
+    Raises ValidationError with the same messages as the Upload tab.
+    """
+    mode   = order.get('MasteringType', 'Upload')
+    assets = order.get('Assets', {})
+    eb     = order.get('EBook', {})
+
+    if mode == 'Upload':
+        if not assets.get('manuscript') or not assets.get('cover'):
+            raise ValidationError('Fehler', 'Bitte Manuskript und Cover hochladen.')
+
+    if mode == 'AddEBook' or eb.get('Enabled'):
+        if not assets.get('ebook') or not assets.get('ebook_cover'):
+            raise ValidationError('Fehler', 'Bitte E-Book Datei und Cover hochladen.')
+
+    if mode == 'Upload' and eb.get('Enabled') and not is_ref(assets['ebook']):
+        # Format vs. Dateiendung (Store-Refs haben keine Endung mehr)
+        fmt = eb.get('EBookFormat', 'ePub').lower()
+        _, ext = os.path.splitext(assets['ebook'])
+        if fmt == 'epdf':
+            valid_ext   = '.pdf'
+            display_fmt = 'PDF'
+        else:
+            valid_ext   = f".{fmt}"
+            display_fmt = fmt.upper()
+        if ext.lower() != valid_ext:
+            raise ValidationError(
+                'Falsches Format',
+                f'Bitte eine {display_fmt}-Datei als E-Book hochladen.'
+            )
+
+    for key, _ in zip_layout(order):
+        if key == 'xml':
+            continue
+        try:
+            path = asset_paths({'Assets': {key: assets.get(key)}}, store)[key]
+        except FileNotFoundError:
+            path = ''
+        if not os.path.isfile(path or ''):
+            raise ValidationError('Fehler', f'Datei nicht gefunden: {assets.get(key)}')
+
+
+def xml_date_time(order):
+    """
+    ZIP timestamp for the XML member, taken from SentDate/SentTime of the header.
+    """
+    hdr = order.get('Header', {})
+    d, t = hdr.get('SentDate', ''), hdr.get('SentTime', '')
+    try:
+        return (int(d[:4]), int(d[4:6]), int(d[6:8]), int(t[:2]), int(t[3:5]), 0)
+    except ValueError:
+        return (1980, 1, 1, 0, 0, 0)
+
+
+def _xml_info(arcname, date_time):
+    info = zipfile.ZipInfo(arcname, date_time=date_time)
+    info.external_attr = 0o644 << 16
+    return info
+
+
+def _same_file(info, path):
+    # ZipInfo.from_file übernimmt Größe und mtime (2-Sekunden-Raster) der Quelldatei
+    try:
+        st = os.stat(path)
+    except OSError:
+        return False
+    mtime = time.localtime(st.st_mtime)[:6]
+    return (info.file_size == st.st_size
+            and info.date_time[:5] == mtime[:5]
+            and info.date_time[5] // 2 == mtime[5] // 2)
+
+
+def can_update(zip_path, order, store=None):
+    """
+    True if zip_path already holds the members of zip_layout(order) in the same
+    order and all asset members still match their source files (size and mtime).
+    """
+    if not os.path.isfile(zip_path) or os.path.exists(update_marker(zip_path)):
+        # abgebrochenes update_zip_xml: Datei kann halb geschrieben sein
+        return False
+    if not zipfile.is_zipfile(zip_path):
+        return False
+    try:
+        assets = asset_paths(order, store)
+    except FileNotFoundError:
+        return False
+    layout = zip_layout(order)
+    with zipfile.ZipFile(zip_path) as z:
+        infos = list(z.infolist())
+    if [i.filename for i in infos] != [arc for _, arc in layout]:
+        return False
+    return all(
+        key == 'xml' or _same_file(info, assets.get(key) or '')
+        for (key, _), info in zip(layout, infos)
+    )
+
+
+def update_marker(zip_path):
+    """Marker file that exists while update_zip_xml changes the ZIP in place."""
+    return zip_path + '.updating'
+
+
+def update_zip_xml(zip_path, arcname, xml_data, date_time):
+    """
+    Replace the MasteringOrder XML of an existing ZIP in place if it is the last
+    member: the asset members before it stay untouched on disk, only the XML
+    record and the central directory behind it are rewritten, so the result is
+    byte-identical to a full write_zip with the same inputs. Nothing is moved.
+    The update_marker file exists until the new central directory is on disk;
+    after a crash can_update sees it and write_zip rebuilds the ZIP completely.
+
+    Returns:
+        bool: False if the XML is not the last member (ZIP left unchanged).
+    """
+    with zipfile.ZipFile(zip_path) as z:
+        infos = z.infolist()
+    if not infos or infos[-1].filename != arcname:
+        return False
+    marker = update_marker(zip_path)
+    with open(marker, 'w', encoding='utf-8') as f:
+        f.write(arcname + '\n')
+        f.flush()
+        os.fsync(f.fileno())
+    with open(zip_path, 'r+b') as fp:
+        with zipfile.ZipFile(fp, 'a') as z:
+            # XML-Eintrag und Verzeichnis ab seinem Offset neu schreiben
+            info = z.filelist.pop()
+            del z.NameToInfo[info.filename]
+            z.start_dir = info.header_offset
+            z.writestr(_xml_info(arcname, date_time), xml_data)
+            # close() schreibt das Central Directory neu und kürzt die Datei
+        fp.flush()
+        os.fsync(fp.fileno())
+    os.remove(marker)
+    return True
+
+
+def manifest_path(zip_path):
+    """Path of the checksum manifest next to the ZIP."""
+    return os.path.splitext(zip_path)[0] + '.manifest.json'
+
+
+def load_manifest(zip_path):
+    """Return the manifest dict of a ZIP, None if there is none."""
+    try:
+        with open(manifest_path(zip_path), encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _member_entry(arcname, info, sha, md5):
+    return {
+        'name':   arcname,
+        'size':   info.file_size,
+        'crc32':  f'{info.CRC:08x}',
+        'sha256': sha.hexdigest(),
+        'md5':    md5.hexdigest(),
+    }
+
+
+def _kernel_copy(src_fd, dst_fd, offset, size):
+    """
+    Copy size bytes from src_fd to dst_fd at offset without passing them through
+    Python. Returns the number of bytes copied (less than size if the platform
+    or filesystem offers no kernel copy; the caller writes the rest).
+    """
+    done = 0
+    if hasattr(os, 'copy_file_range'):
+        try:
+            while done < size:
+                n = os.copy_file_range(src_fd, dst_fd, size - done,
+                                       offset_src=done, offset_dst=offset + done)
+                if n == 0:
+                    break
+                done += n
+        except OSError:
+            # z. B. EXDEV/ENOSYS auf älteren Kerneln → sendfile versuchen
+            pass
+    if done < size and hasattr(os, 'sendfile'):
+        try:
+            os.lseek(dst_fd, offset + done, os.SEEK_SET)
+            while done < size:
+                n = os.sendfile(dst_fd, src_fd, done, size - done)
+                if n == 0:
+                    break
+                done += n
+        except OSError:
+            pass
+    return done
+
+
+def _chunks(view, start=0):
+    for pos in range(start, len(view), CHUNK_SIZE):
+        with view[pos:pos + CHUNK_SIZE] as chunk:
+            yield chunk
+
+
+def _update_all(view, update):
+    for chunk in _chunks(view):
+        update(chunk)
+
+
+def _write_stored_member(z, path, arcname):
+    """
+    Fast path for ZIP_STORED: the CRC is computed from a memoryview over an mmap
+    of the source, so the local header can be written with final values, then
+    the payload is copied kernel-side. SHA-256/MD5 run in threads over the same
+    mapping meanwhile (hashlib and zlib release the GIL). Produces the same
+    bytes as ZipFile.write.
+    """
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    info.compress_type = zipfile.ZIP_STORED
+    sha, md5 = hashlib.sha256(), hashlib.md5(usedforsecurity=False)
+    with open(path, 'rb') as src, \
+         mmap.mmap(src.fileno(), 0, access=mmap.ACCESS_READ) as mm, \
+         memoryview(mm) as view:
+        size = len(view)
+        workers = [threading.Thread(target=_update_all, args=(view, h.update))
+                   for h in (sha, md5)]
+        for w in workers:
+            w.start()
+        try:
+            crc = 0
+            for chunk in _chunks(view):
+                crc = zlib.crc32(chunk, crc)
+
+            # Header mit endgültigen Werten, wie ZipFile._open_to_write/close
+            info.CRC = crc
+            info.file_size = info.compress_size = size
+            info.flag_bits = 0
+            zip64 = size * 1.05 > zipfile.ZIP64_LIMIT
+            if zip64 and not z._allowZip64:
+                raise zipfile.LargeZipFile('Filesize would require ZIP64 extensions')
+            z.fp.seek(z.start_dir)
+            info.header_offset = z.fp.tell()
+            z._writecheck(info)
+            z._didModify = True
+            z.fp.write(info.FileHeader(zip64))
+            z.fp.flush()
+
+            data_start = z.fp.tell()
+            done = _kernel_copy(src.fileno(), z.fp.fileno(), data_start, size)
+            z.fp.seek(data_start + done)
+            for chunk in _chunks(view, done):
+                z.fp.write(chunk)
+        finally:
+            for w in workers:
+                w.join()
+    z.start_dir = z.fp.tell()
+    z.filelist.append(info)
+    z.NameToInfo[info.filename] = info
+    return _member_entry(arcname, info, sha, md5)
+
+
+def _can_fast_copy(z, path):
+    if z.compression != zipfile.ZIP_STORED or not z._seekable:
+        return False
+    try:
+        z.fp.fileno()
+    except (AttributeError, OSError):
+        return False
+    return os.path.getsize(path) >= FAST_COPY_MIN
+
+
+def _write_member(z, path, arcname):
+    # wie ZipFile.write, aber SHA-256/MD5 im selben Durchlauf berechnen
+    if _can_fast_copy(z, path):
+        return _write_stored_member(z, path, arcname)
+    info = zipfile.ZipInfo.from_file(path, arcname)
+    info.compress_type = z.compression
+    sha, md5 = hashlib.sha256(), hashlib.md5(usedforsecurity=False)
+    with open(path, 'rb') as src, z.open(info, 'w') as dst:
+        for chunk in iter(lambda: src.read(CHUNK_SIZE), b''):
+            sha.update(chunk)
+            md5.update(chunk)
+            dst.write(chunk)
+    return _member_entry(arcname, info, sha, md5)
+
+
+def _write_xml_member(z, arcname, date_time, xml_data):
+    info = _xml_info(arcname, date_time)
+    z.writestr(info, xml_data)
+    return _member_entry(
+        arcname, info, hashlib.sha256(xml_data), hashlib.md5(xml_data, usedforsecurity=False)
+    )
+
+
+def save_manifest(zip_path, order, members, mode, log=print):
+    """
+    Write the checksum manifest next to zip_path and record it in the order history
+    (failures of the history are passed to log).
+    """
+    manifest = {
+        'ean':     order_ean(order),
+        'zip':     os.path.basename(zip_path),
+        'created': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'mode':    mode,
+        'members': members,
+    }
+    path = manifest_path(zip_path)
+    tmp  = path + '.tmp'
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    os.replace(tmp, path)
+    # Nachweis in der Order-Historie – darf das Packen nie verhindern
+    try:
+        order_index.record_history(manifest['ean'], 'zip', zip_path, manifest)
+    except Exception as e:
+        log(f'Historie nicht aktualisiert: {e}')
+    return manifest
+
+
+def write_members(z, order, xml_data, store=None):
+    """
+    Write all members of an order in zip_layout order into an open ZipFile
+    (file on disk, temp file or stream).
+
+    Returns:
+        list: Manifest entries (name, size, crc32, sha256, md5) per member.
+    """
+    refs    = order.get('Assets', {})
+    assets  = asset_paths(order, store)
+    members = []
+    for key, arcname in zip_layout(order):
+        if key == 'xml':
+            members.append(_write_xml_member(z, arcname, xml_date_time(order), xml_data))
+            continue
+        entry = _write_member(z, assets[key], arcname)
+        ref = refs.get(key)
+        if is_ref(ref) and entry['sha256'] != ref[len(REF_PREFIX):]:
+            raise ValidationError(
+                'Fehler', f'{arcname}: Inhalt passt nicht mehr zu {ref} (Quelldatei im Asset-Store '
+                          'nachträglich geändert) – bitte erneut mit --store hinzufügen.'
+            )
+        members.append(entry)
+    return members
+
+
+class _Stream:
+    # nicht seekbar: ZipFile schreibt dann Data Descriptors hinter jeden Eintrag
+    def __init__(self, write):
+        self.write = write
+
+    def flush(self):
+        pass
+
+
+def stream_zip(write, order, xml_data, store=None):
+    """
+    Generate the order's ZIP as a stream without a local archive file.
+
+    Args:
+        write (callable): Receives the archive bytes chunk by chunk (at most
+            CHUNK_SIZE plus headers at a time).
+        order, xml_data, store: as for write_zip.
+
+    Returns:
+        list: Manifest entries per member.
+    """
+    with zipfile.ZipFile(_Stream(write), 'w') as z:
+        members = write_members(z, order, xml_data, store)
+    return members
+
+
+def write_zip(zip_path, order, xml_data, update=False, store=None, log=print):
+    """
+    Write the MasteringOrder ZIP of an order.
+
+    Args:
+        zip_path (str): Target ZIP file.
+        order (Order): order_model.Order with 'Assets' paths or store refs.
+        xml_data (bytes): Serialized XML (xml_export.xml_bytes).
+        update (bool): If the existing ZIP still matches the assets and the XML
+            is its last member, only replace the XML member instead of copying
+            all files again.
+        store (AssetStore): Store for 'sha256:' refs (required if the order has any).
+        log (callable): Receives non-fatal problems (order history).
+
+    Returns:
+        dict: Checksum manifest (also written next to the ZIP), 'mode' is
+        'updated' or 'written'.
+    """
+    layout = zip_layout(order)
+    if update and can_update(zip_path, order, store):
+        # Prüfsummen der unveränderten Einträge aus dem bisherigen Manifest
+        old = load_manifest(zip_path)
+        if old and [m['name'] for m in old.get('members', [])] == [arc for _, arc in layout]:
+            xml_arc = next(arc for key, arc in layout if key == 'xml')
+            # XML nicht am Ende (E-Book, AddEBook): unten komplett neu schreiben
+            if update_zip_xml(zip_path, xml_arc, xml_data, xml_date_time(order)):
+                crc = zlib.crc32(xml_data)
+                members = [
+                    dict(m, size=len(xml_data), crc32=f'{crc:08x}',
+                         sha256=hashlib.sha256(xml_data).hexdigest(),
+                         md5=hashlib.md5(xml_data, usedforsecurity=False).hexdigest())
+                    if m['name'] == xml_arc else m
+                    for m in old['members']
+                ]
+                return save_manifest(zip_path, order, members, 'updated', log)
+
+    # erst vollständig schreiben, dann umbenennen: nie ein halbes ZIP am Ziel
+    tmp = zip_path + '.tmp'
+    try:
+        with zipfile.ZipFile(tmp, 'w') as z:
+            members = write_members(z, order, xml_data, store)
+        os.replace(tmp, zip_path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+    # Marker eines abgebrochenen Updates gilt für die ersetzte Datei
+    if os.path.exists(update_marker(zip_path)):
+        os.remove(update_marker(zip_path))
+    return save_manifest(zip_path, order, members, 'written', log)
@@ -0,0 +1,99 @@
+# partitions.py
+"""
+BoD customer accounts and imprints, and the partitioned batch output built on them.
+Each (customer number, imprint) pair is a partition with its own header defaults,
+output tree <outdir>/<number>_<country>/<imprint>/ (own state and journal) and
+optional upload account; batch runs route every order by the FromCompanyNumber and
+Imprint of its header and process the partitions in parallel, so a slow German
+batch does not hold up the Spanish one. Overrides per account or partition come
+from DATA_DIR/partitions.json, e.g.
+  {"11022642": {"header": {"FromEmail": "de@orbita-media.de"}, "upload": "bod-de"},
+   "40501700/Lucid Page Media": {"header": {"FromPerson": "Ana"}}}
+Place this file in the project root next to main.py.
+"""
+import os
+import json
+from utils import data_path
+from order_model import as_dict
+
+CUSTOMER_NUMBERS = {
+    '40501700': 'Spanien',
+    '11026617': 'Frankreich',
+    '11022642': 'Deutschland',
+}
+IMPRINTS = ['Lucid Page Media', 'Orbita Media GmbH']
+
+DEFAULT_HEADER = {
+    'FromCompany': 'Orbita Media GmbH',
+    'FromCompanyNumber': '40501700',
+    'FromEmail': 'kontakt@orbita-media.de'
+}
+DEFAULT_IMPRINT = 'Lucid Page Media'
+
+PARTITIONS_FILE = 'partitions.json'
+
+
+def _safe(name):
+    return ''.join(c if c.isalnum() or c in ' -_.' else '_' for c in name).strip()
+
+
+def _partition(number, imprint, overrides=None):
+    country = CUSTOMER_NUMBERS.get(number)
+    part = {
+        'header': {'FromCompanyNumber': number, 'Imprint': imprint},
+        'dir': os.path.join(f'{number}_{country}' if country else number, _safe(imprint)),
+        'upload': None,
+    }
+    for key in (number, f'{number}/{imprint}'):
+        extra = (overrides or {}).get(key) or {}
+        part['header'].update(extra.get('header', {}))
+        part['upload'] = extra.get('upload', part['upload'])
+    return part
+
+
+def load_partitions(path=None):
+    """
+    Return {(number, imprint): {'header', 'dir', 'upload'}} for all customer
+    numbers × imprints, including the overrides from partitions.json.
+    """
+    path = path or data_path(PARTITIONS_FILE)
+    overrides = {}
+    if os.path.exists(path):
+        with open(path, encoding='utf-8') as f:
+            overrides = json.load(f)
+    return {
+        (number, imprint): _partition(number, imprint, overrides)
+        for number in CUSTOMER_NUMBERS for imprint in IMPRINTS
+    }
+
+
+def partition_key(order, header_defaults=None):
+    """(FromCompanyNumber, Imprint) of an order, falling back to the defaults."""
+    hdr  = order.get('Header') or {}
+    dflt = header_defaults or {}
+    number  = hdr.get('FromCompanyNumber') or dflt.get('FromCompanyNumber') or DEFAULT_HEADER['FromCompanyNumber']
+    imprint = hdr.get('Imprint') or dflt.get('Imprint') or DEFAULT_IMPRINT
+    return number, imprint
+
+
+def split_orders(orders, header_defaults=None, partitions=None):
+    """
+    Route orders (loaded without header defaults) to their partitions.
+    Header precedence: order (non-empty fields) > partition (partitions.json)
+    > header_defaults > DEFAULT_HEADER.
+
+    Returns:
+        dict: {(number, imprint): (partition, [orders])}; unknown customer
+        numbers get a partition of their own without extra defaults.
+    """
+    partitions = partitions if partitions is not None else load_partitions()
+    groups = {}
+    for order in orders:
+        key = partition_key(order, header_defaults)
+        part = partitions.get(key) or _partition(*key)
+        own = {k: v for k, v in as_dict(order['Header']).items() if v}
+        order = order.replace(Header={
+            **DEFAULT_HEADER, **(header_defaults or {}), **part['header'], **own
+        })
+        groups.setdefault(key, (part, []))[1].append(order)
+    return groups
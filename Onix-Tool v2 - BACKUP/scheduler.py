@@ -0,0 +1,180 @@
+# scheduler.py
+"""
+Job scheduler for generation and upload jobs of the BoD MasteringOrder Generator.
+Jobs are queued per (FromCompanyNumber, imprint) and dispatched onto a thread pool:
+titles whose PublicationDate is close (urgent window) go first, earliest deadline
+first; otherwise imprints take turns (fair sharing), each imprint serving its own
+jobs by deadline. Per-account concurrency limits keep e.g. the German account from
+occupying all workers. metrics() reports queue depth, wait and run latencies.
+Place this file in the project root next to main.py.
+"""
+import time
+import heapq
+import itertools
+from datetime import date, datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+# ohne PublicationDate: hinter allen datierten Titeln
+NO_DEADLINE = date.max
+
+
+def publication_deadline(order):
+    """PublicationDate (YYYYMMDD) of an order as date, NO_DEADLINE if missing."""
+    value = (order.get('Product') or {}).get('PublicationDate', '')
+    try:
+        return datetime.strptime(value.strip(), '%Y%m%d').date()
+    except (ValueError, AttributeError):
+        return NO_DEADLINE
+
+
+def _percentiles(values):
+    if not values:
+        return {'p50': None, 'p95': None, 'max': None}
+    values = sorted(values)
+    pick = lambda q: round(values[min(len(values) - 1, int(q * len(values)))], 3)
+    return {'p50': pick(0.5), 'p95': pick(0.95), 'max': round(values[-1], 3)}
+
+
+class Job:
+    __slots__ = ('func', 'args', 'kind', 'account', 'imprint', 'deadline', 'label',
+                 'on_done', 'enqueued', 'started', 'finished', 'result', 'error')
+
+    def __init__(self, func, args, kind, account, imprint, deadline, label, on_done):
+        self.func = func
+        self.args = args
+        self.kind = kind
+        self.account  = account
+        self.imprint  = imprint
+        self.deadline = deadline
+        self.label    = label
+        self.on_done  = on_done
+        self.enqueued = time.monotonic()
+        self.started  = None
+        self.finished = None
+        self.result   = None
+        self.error    = None
+
+
+class Scheduler:
+    def __init__(self, workers=4, account_limits=None, default_limit=None,
+                 urgent_days=14, today=None):
+        """
+        workers: jobs running at the same time in total.
+        account_limits: {FromCompanyNumber: max running jobs}, e.g.
+            {'40501700': 2, '11026617': 2, '11022642': 2}.
+        default_limit: limit for accounts not listed, also for jobs without
+            FromCompanyNumber (None = only workers).
+        urgent_days: titles publishing within this many days are dispatched
+            strictly by deadline, ahead of fair sharing.
+        Raises ValueError for limits below 1 (their jobs would never start).
+        """
+        for account, limit in dict(account_limits or {}, **{'(Standard)': default_limit}).items():
+            if limit is not None and limit < 1:
+                raise ValueError(f'Limit für Konto {account} muss mindestens 1 sein, nicht {limit}')
+        self.workers = workers
+        self.account_limits = account_limits or {}
+        self.default_limit  = default_limit
+        self.urgent_until   = (today or date.today()) + timedelta(days=urgent_days)
+        self._queues  = {}              # (Konto, Imprint) → Heap
+        self._served  = {}              # Imprint → bisher gestartete Jobs
+        self._running = {}              # Konto → laufende Jobs
+        self._seq     = itertools.count()
+        self._done    = []
+
+    def submit(self, func, *args, order=None, kind='generate', label='', on_done=None):
+        """
+        Queue func(*args). Account, imprint and deadline are taken from the order.
+        on_done(job) runs in the scheduler thread after the job ended (it may
+        submit follow-up jobs, e.g. the upload of a generated ZIP).
+        """
+        order   = order or {}
+        header  = order.get('Header') or {}
+        account = header.get('FromCompanyNumber', '')
+        imprint = header.get('Imprint') or header.get('FromCompany', '')
+        job = Job(func, args, kind, account, imprint, publication_deadline(order), label, on_done)
+        if imprint not in self._served:
+            # neue Imprints starten beim aktuellen Stand, nicht bei 0
+            self._served[imprint] = min(self._served.values(), default=0)
+        heapq.heappush(self._queues.setdefault((account, imprint), []),
+                       (job.deadline, next(self._seq), job))
+        return job
+
+    def _limit(self, account):
+        return self.account_limits.get(account, self.default_limit)
+
+    def _next_job(self):
+        heads = []
+        for (account, imprint), heap in self._queues.items():
+            limit = self._limit(account)
+            if heap and (limit is None or self._running.get(account, 0) < limit):
+                heads.append(heap[0])
+        if not heads:
+            return None
+        urgent = [h for h in heads if h[0] <= self.urgent_until]
+        if urgent:
+            _, _, job = min(urgent)
+        else:
+            _, _, job = min(heads, key=lambda h: (self._served[h[2].imprint], h[0], h[1]))
+        heapq.heappop(self._queues[(job.account, job.imprint)])
+        return job
+
+    def _run_job(self, job):
+        job.started = time.monotonic()
+        try:
+            job.result = job.func(*job.args)
+        except Exception as e:
+            job.error = e
+        job.finished = time.monotonic()
+        return job
+
+    def run(self):
+        """
+        Dispatch until all queued jobs (including follow-ups) have finished.
+
+        Returns:
+            list: Finished Job objects in completion order.
+        """
+        running = set()
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            while True:
+                while len(running) < self.workers:
+                    job = self._next_job()
+                    if not job:
+                        break
+                    self._running[job.account] = self._running.get(job.account, 0) + 1
+                    self._served[job.imprint] += 1
+                    running.add(pool.submit(self._run_job, job))
+                if not running:
+                    break
+                finished, running = wait(running, return_when=FIRST_COMPLETED)
+                for fut in finished:
+                    job = fut.result()
+                    self._running[job.account] -= 1
+                    self._done.append(job)
+                    if job.on_done:
+                        job.on_done(job)
+        return self._done
+
+    def metrics(self):
+        """
+        Queue depth per account and imprint, wait (queued → started) and run
+        latencies in seconds, failures and jobs finished after their deadline.
+        """
+        depth_account, depth_imprint = {}, {}
+        for (account, imprint), heap in self._queues.items():
+            if heap:
+                depth_account[account] = depth_account.get(account, 0) + len(heap)
+                depth_imprint[imprint] = depth_imprint.get(imprint, 0) + len(heap)
+        today = date.today()
+        return {
+            'queued':  sum(depth_account.values()),
+            'running': sum(self._running.values()),
+            'done':    len(self._done),
+            'failed':  sum(1 for j in self._done if j.error),
+            'queue_depth': {'account': depth_account, 'imprint': depth_imprint},
+            'wait_s': _percentiles([j.started - j.enqueued for j in self._done]),
+            'run_s':  _percentiles([j.finished - j.started for j in self._done]),
+            'by_kind': {k: sum(1 for j in self._done if j.kind == k)
+                        for k in {j.kind for j in self._done}},
+            'past_deadline': sum(1 for j in self._done if j.deadline < today),
+        }
@@ -0,0 +1,290 @@
+# service.py
+"""
+Local HTTP service of the BoD MasteringOrder Generator for other systems
+(title management), without Tk window and without third-party packages.
+  GET  /health       status, running and waiting jobs, code-list version (JSON)
+  POST /orders/xml   order JSON → MasteringOrder XML
+  POST /orders/zip   order JSON with asset paths below --asset-root → ZIP
+Order JSON uses the batch format (see batch.normalize_order). Validation and XML
+building run in a process pool whose workers map the shared code-list store
+(codelists) instead of loading the JSON lists each; updated lists are picked up
+while running (codelists.Registry, each job names the current store), asset reads and ZIP packing in threads; the
+response is streamed in chunks with drain(). Backpressure: limited body size,
+a fixed number of concurrent jobs and a bounded wait queue (503 when full).
+Place this file in the project root next to main.py.
+"""
+import os
+import json
+import asyncio
+import tempfile
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from http import HTTPStatus
+from urllib.parse import urlsplit
+import codelists
+import batch
+import packaging
+import xml_export
+from xml_export import ValidationError
+
+MAX_HEADER   = 16 * 1024
+MAX_BODY     = 1024 * 1024
+CHUNK_SIZE   = 1024 * 1024
+READ_TIMEOUT = 30
+
+# je Worker-Prozess gemappt, neu bei geänderten Codelisten
+_store = None
+_wgs_codes = None
+
+
+class HttpError(Exception):
+    def __init__(self, status, message, headers=None):
+        super().__init__(message)
+        self.status = status
+        self.message = message
+        self.headers = headers or {}
+
+
+def _init_worker(store_path=None):
+    global _store, _wgs_codes
+    try:
+        store = codelists.open_store(store_path)
+    except OSError:
+        # Stand inzwischen ersetzt und aufgeräumt: aktuellen Stand übersetzen/mappen
+        store = codelists.open_store()
+    if _store:
+        _store.close()
+    _store, _wgs_codes = store, store.wgs
+
+
+def render_xml(order, store_path=None):
+    """
+    Validate an order and return its XML bytes (runs in a worker process).
+    store_path: code-list store of the job; the worker switches to it if needed.
+
+    Returns:
+        tuple: (xml bytes, None) or (None, (title, message)) on validation
+        errors, so nothing but plain data crosses the process boundary.
+    """
+    if _wgs_codes is None or (store_path and store_path != _store.path):
+        _init_worker(store_path)
+    try:
+        xml_export.validate_order(order, _wgs_codes)
+    except ValidationError as e:
+        return None, (e.title, e.message)
+    return xml_export.order_xml(order, _wgs_codes), None
+
+
+def _build_zip(order, xml_data):
+    # im Thread: Assets prüfen und in eine temporäre Datei packen
+    packaging.validate_assets(order)
+    tmp = tempfile.TemporaryFile()
+    try:
+        with zipfile.ZipFile(tmp, 'w') as z:
+            packaging.write_members(z, order, xml_data)
+        tmp.seek(0)
+    except BaseException:
+        tmp.close()
+        raise
+    return tmp
+
+
+class OrderService:
+    def __init__(self, asset_root=None, header_defaults=None, workers=None,
+                 max_jobs=4, max_waiting=32, log=print):
+        """
+        asset_root: folder the asset paths of /orders/zip are resolved against
+            (relative paths) and restricted to; None disables /orders/zip.
+        header_defaults: dict with FromCompany, FromCompanyNumber, ... defaults.
+        workers: size of the process pool (default: number of CPUs).
+        max_jobs: requests processed at the same time.
+        max_waiting: requests allowed to wait for a slot before 503 is returned.
+        log: callable receiving error messages of the service.
+        """
+        self.asset_root = os.path.abspath(asset_root) if asset_root else None
+        self.header_defaults = header_defaults or {}
+        self.workers = workers
+        self.max_jobs = max_jobs
+        self.max_waiting = max_waiting
+        self.active = 0
+        self.waiting = 0
+        self._pool = None
+        self._slots = None
+        self.codes = None
+        self.log = log
+
+    # ---------- HTTP ----------
+    async def _read_request(self, reader, writer):
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.LimitOverrunError:
+            raise HttpError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE, 'Header zu groß')
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Ungültige Anfragezeile')
+        headers = {}
+        for line in lines[1:]:
+            key, _, value = line.partition(':')
+            if key:
+                headers[key.strip().lower()] = value.strip()
+        body = b''
+        if method == 'POST':
+            if 'transfer-encoding' in headers:
+                raise HttpError(HTTPStatus.LENGTH_REQUIRED, 'Content-Length erforderlich')
+            try:
+                length = int(headers.get('content-length', '0'))
+            except ValueError:
+                raise HttpError(HTTPStatus.BAD_REQUEST, 'Ungültige Content-Length')
+            if length > MAX_BODY:
+                raise HttpError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE,
+                                f'Order-JSON größer als {MAX_BODY} Bytes')
+            if headers.get('expect', '').lower() == '100-continue':
+                writer.write(b'HTTP/1.1 100 Continue\r\n\r\n')
+                await writer.drain()
+            body = await reader.readexactly(length)
+        return method, urlsplit(target).path, body
+
+    async def _send_head(self, writer, status, content_type, length, headers=None):
+        status = HTTPStatus(status)
+        lines = [f'HTTP/1.1 {status.value} {status.phrase}',
+                 f'Content-Type: {content_type}',
+                 f'Content-Length: {length}',
+                 'Connection: close']
+        lines += [f'{k}: {v}' for k, v in (headers or {}).items()]
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        await writer.drain()
+
+    async def _send(self, writer, status, body, content_type, headers=None):
+        await self._send_head(writer, status, content_type, len(body), headers)
+        writer.write(body)
+        await writer.drain()
+
+    async def _send_json(self, writer, status, data, headers=None):
+        body = json.dumps(data, ensure_ascii=False).encode('utf-8')
+        await self._send(writer, status, body, 'application/json; charset=utf-8', headers)
+
+    async def handle(self, reader, writer):
+        try:
+            method, path, body = await asyncio.wait_for(
+                self._read_request(reader, writer), READ_TIMEOUT
+            )
+            if method == 'GET' and path == '/health':
+                await self._send_json(writer, HTTPStatus.OK, {
+                    'status': 'ok', 'active': self.active, 'waiting': self.waiting,
+                    'codelists': self.codes.version if self.codes else None
+                })
+            elif method == 'POST' and path in ('/orders/xml', '/orders/zip'):
+                await self._limited(self._order, writer, path, body)
+            else:
+                raise HttpError(HTTPStatus.NOT_FOUND, f'{method} {path} nicht unterstützt')
+        except HttpError as e:
+            await self._send_json(writer, e.status, {'error': e.message}, e.headers)
+        except ValidationError as e:
+            await self._send_json(writer, HTTPStatus.UNPROCESSABLE_ENTITY,
+                                  {'error': e.title, 'message': e.message})
+        except (asyncio.TimeoutError, asyncio.IncompleteReadError, ConnectionError):
+            pass
+        except Exception as e:
+            self.log(f'Service-Fehler: {e!r}')
+            try:
+                await self._send_json(writer, HTTPStatus.INTERNAL_SERVER_ERROR, {'error': str(e)})
+            except ConnectionError:
+                pass
+        finally:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except ConnectionError:
+                pass
+
+    async def _limited(self, func, *args):
+        # feste Zahl gleichzeitiger Jobs, begrenzte Warteschlange davor
+        if self.waiting >= self.max_waiting:
+            raise HttpError(HTTPStatus.SERVICE_UNAVAILABLE, 'Zu viele Anfragen',
+                            {'Retry-After': '5'})
+        self.waiting += 1
+        try:
+            await self._slots.acquire()
+        finally:
+            self.waiting -= 1
+        self.active += 1
+        try:
+            await func(*args)
+        finally:
+            self.active -= 1
+            self._slots.release()
+
+    # ---------- Orders ----------
+    def _parse_order(self, body, with_assets):
+        try:
+            data = json.loads(body.decode('utf-8'))
+        except (UnicodeDecodeError, ValueError) as e:
+            raise HttpError(HTTPStatus.BAD_REQUEST, f'Ungültiges JSON: {e}')
+        if not isinstance(data, dict):
+            raise HttpError(HTTPStatus.BAD_REQUEST, 'Erwartet wird genau eine Order (JSON-Objekt)')
+        if not with_assets:
+            data.pop('Assets', None)
+        elif not self.asset_root:
+            raise HttpError(HTTPStatus.FORBIDDEN, 'ZIP-Erzeugung nicht freigegeben (--asset-root fehlt)')
+        order = batch.normalize_order(data, self.asset_root or '', self.header_defaults)
+        for path in order['Assets'].values():
+            if os.path.commonpath([self.asset_root, os.path.abspath(path)]) != self.asset_root:
+                raise HttpError(HTTPStatus.FORBIDDEN, f'Pfad außerhalb des Asset-Ordners: {path}')
+        now = datetime.now()
+        hdr = order['Header']
+        return order.replace(Header=hdr.replace(
+            SentDate=hdr.SentDate or now.strftime('%Y%m%d'),
+            SentTime=hdr.SentTime or now.strftime('%H:%M'),
+        ))
+
+    async def _order(self, writer, path, body):
+        as_zip = path.endswith('/zip')
+        order  = self._parse_order(body, with_assets=as_zip)
+        loop   = asyncio.get_running_loop()
+        xml_data, error = await loop.run_in_executor(self._pool, render_xml, order,
+                                                     self.codes.store_path)
+        if error:
+            raise ValidationError(*error)
+        name = f'{xml_export.order_ean(order)}_MasteringOrder'
+        if not as_zip:
+            await self._send(writer, HTTPStatus.OK, xml_data, 'application/xml',
+                             {'Content-Disposition': f'attachment; filename="{name}.xml"'})
+            return
+
+        tmp = await loop.run_in_executor(None, _build_zip, order, xml_data)
+        try:
+            await self._send_head(writer, HTTPStatus.OK, 'application/zip',
+                                  os.fstat(tmp.fileno()).st_size,
+                                  {'Content-Disposition': f'attachment; filename="{name}.zip"'})
+            while True:
+                chunk = await loop.run_in_executor(None, tmp.read, CHUNK_SIZE)
+                if not chunk:
+                    break
+                writer.write(chunk)
+                await writer.drain()
+        finally:
+            tmp.close()
+
+    # ---------- Start ----------
+    async def serve(self, host='127.0.0.1', port=8765, ready=None):
+        """
+        Run the service until cancelled. ready: optional callback(port) once
+        the socket is listening (port 0 picks a free port).
+        """
+        self._slots = asyncio.Semaphore(self.max_jobs)
+        # Codelisten im Hauptprozess übersetzen (und bei Änderungen neu), Worker mappen nur die Datei
+        self.codes  = codelists.Registry(store=True, log=self.log).start()
+        self._pool  = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                          initargs=(self.codes.store_path,))
+        try:
+            server = await asyncio.start_server(self.handle, host, port, limit=MAX_HEADER)
+            async with server:
+                if ready:
+                    ready(server.sockets[0].getsockname()[1])
+                await server.serve_forever()
+        finally:
+            self._pool.shutdown(cancel_futures=True)
+            self.codes.stop()
@@ -0,0 +1,213 @@
+# subject_suggest.py
+"""
+WGS/BISAC suggestions of the BoD MasteringOrder Generator from the title and blurb
+of a product. All code descriptions form one sparse TF-IDF matrix (scipy CSR,
+L2-normalised rows); a title is vectorised with the same vocabulary and ranked by
+one sparse product, many titles are ranked block by block (suggest_many), so a
+batch of thousands of titles needs seconds, not minutes.
+The matrix is built once per content of the code lists and cached as
+suggest-<hash>.npz in DATA_DIR next to the code-list store (codelists.build_store);
+a changed list gives a new file. Needs numpy and scipy.
+Place this file in the project root next to main.py.
+"""
+import os
+import re
+import glob
+import json
+import math
+from collections import Counter
+from utils import data_path
+import codelists
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:
+    np = sparse = None
+
+CACHE_PREFIX = 'suggest-'
+# Version des Tokenizers/Dateiformats; neue Version → neue Cache-Datei
+FORMAT = 1
+TOP = 5
+# BoD-Paperbacks: Warengruppen 1xxx (Hardcover/Softcover)
+WGS_PREFIX = '1'
+# Titelwörter zählen mehr als der Klappentext
+TITLE_WEIGHT = 2
+# Wortstämme: Wörter werden auf diese Länge gekürzt (Kinder/Kinderbuch, Roman/Romane)
+STEM = 6
+BLOCK = 256
+
+_WORD = re.compile(r'[^\W\d_]{3,}')
+_STOP = frozenset('''
+    und oder der die das den dem des ein eine einer eines einem einen mit von für
+    auf aus bei nach über unter vor zum zur als auch sich nicht ist sind wird werden
+    wie was wer sie ihr ihre sein seine allgemein sonstiges sonstige übrige
+    the and for with from into about that this are was were his her their its
+    general other miscellaneous
+'''.split())
+
+_cache = {}
+
+
+class SuggestError(Exception):
+    pass
+
+
+def tokens(text):
+    """Word stems of a text (lower case, without stop words)."""
+    return [w[:STEM] for w in _WORD.findall((text or '').lower()) if w not in _STOP]
+
+
+def _require():
+    if np is None:
+        raise SuggestError('Vorschläge benötigen die Pakete numpy und scipy (pip install numpy scipy)')
+
+
+def _tfidf(counters, column, idf):
+    # (1 + log tf) * idf, je Zeile L2-normiert; unbekannte Wörter fallen weg
+    rows, cols, vals = [], [], []
+    for r, counts in enumerate(counters):
+        for w, tf in counts.items():
+            c = column.get(w)
+            if c is not None:
+                rows.append(r)
+                cols.append(c)
+                vals.append(1 + math.log(tf))
+    m = sparse.csr_matrix(
+        (np.array(vals, dtype=np.float32) * idf[cols], (rows, cols)),
+        shape=(len(counters), len(column)), dtype=np.float32
+    )
+    norms = np.sqrt(np.asarray(m.multiply(m).sum(axis=1)).ravel())
+    norms[norms == 0] = 1
+    return sparse.diags(1 / norms).dot(m).tocsr()
+
+
+class Suggester:
+    def __init__(self, codes, n_wgs, vocab, idf, matrix):
+        """
+        codes: WGS codes followed by BISAC codes (rows of matrix).
+        n_wgs: number of WGS rows. vocab: stems in column order, idf per column.
+        """
+        self.codes = codes
+        self.n_wgs = n_wgs
+        self.vocab = vocab
+        self.column = {w: i for i, w in enumerate(vocab)}
+        self.idf = idf
+        self.matrix = matrix
+        # Transponierte für das Produkt Titel × Codes (CSC von matrix = CSR der Transponierten)
+        self._t = matrix.T.tocsr()
+        self._masks = {}
+
+    @classmethod
+    def build(cls, wgs_codes, bisac_codes):
+        """TF-IDF matrix of all code descriptions (one row per code)."""
+        _require()
+        codes = list(wgs_codes) + list(bisac_codes)
+        docs = [Counter(tokens(wgs_codes[c])) for c in wgs_codes] + \
+               [Counter(tokens(bisac_codes[c])) for c in bisac_codes]
+        df = Counter(w for doc in docs for w in doc)
+        vocab = sorted(df)
+        n = len(docs)
+        idf = np.array([math.log((1 + n) / (1 + df[w])) + 1 for w in vocab], dtype=np.float32)
+        matrix = _tfidf(docs, {w: i for i, w in enumerate(vocab)}, idf)
+        return cls(np.array(codes), len(wgs_codes), np.array(vocab), idf, matrix)
+
+    def vectors(self, texts):
+        """TF-IDF rows (CSR, L2-normalised) of texts in the vocabulary of the matrix."""
+        return _tfidf([Counter(tokens(t)) for t in texts], self.column, self.idf)
+
+    def _query(self, title, blurb):
+        counts = Counter(tokens(blurb))
+        for w in tokens(title):
+            counts[w] += TITLE_WEIGHT
+        return counts
+
+    def _mask(self, wgs_prefix):
+        # Zeilen, die vorgeschlagen werden dürfen (WGS nur mit wgs_prefix)
+        mask = self._masks.get(wgs_prefix)
+        if mask is None:
+            mask = np.ones(len(self.codes), dtype=bool)
+            if wgs_prefix:
+                mask[:self.n_wgs] = np.char.startswith(self.codes[:self.n_wgs], wgs_prefix)
+            self._masks[wgs_prefix] = mask
+        return mask
+
+    def _top(self, scores, n):
+        # beste n je Liste, absteigend, nur Treffer > 0
+        result = {}
+        for label, part, offset in (('WGS', scores[:self.n_wgs], 0),
+                                    ('BISAC', scores[self.n_wgs:], self.n_wgs)):
+            k = min(n, len(part))
+            best = np.argpartition(-part, k - 1)[:k] if k else []
+            best = sorted(best, key=lambda i: -part[i])
+            result[label] = [(str(self.codes[offset + i]), round(float(part[i]), 4))
+                             for i in best if part[i] > 0]
+        return result
+
+    def suggest(self, title, blurb='', n=TOP, wgs_prefix=WGS_PREFIX):
+        """
+        Best matching codes for one product.
+
+        Returns:
+            dict: {'WGS': [(code, score)], 'BISAC': [(code, score)]}, best first.
+        """
+        return self.suggest_many([(title, blurb)], n, wgs_prefix)[0]
+
+    def suggest_many(self, items, n=TOP, wgs_prefix=WGS_PREFIX):
+        """suggest() for many (title, blurb) pairs, ranked in blocks of BLOCK titles."""
+        items = list(items)
+        mask = self._mask(wgs_prefix)
+        results = []
+        for start in range(0, len(items), BLOCK):
+            q = _tfidf([self._query(t, b) for t, b in items[start:start + BLOCK]], self.column, self.idf)
+            scores = (q @ self._t).toarray()
+            scores[:, ~mask] = 0
+            results += [self._top(row, n) for row in scores]
+        return results
+
+    def save(self, path):
+        tmp = f'{path}.{os.getpid()}.tmp'
+        m = self.matrix
+        with open(tmp, 'wb') as f:
+            np.savez(f, codes=self.codes, n_wgs=self.n_wgs, vocab=self.vocab, idf=self.idf,
+                     data=m.data, indices=m.indices, indptr=m.indptr, shape=m.shape)
+        os.replace(tmp, path)
+
+    @classmethod
+    def open(cls, path):
+        with np.load(path, allow_pickle=False) as f:
+            matrix = sparse.csr_matrix((f['data'], f['indices'], f['indptr']), shape=tuple(f['shape']))
+            return cls(f['codes'], int(f['n_wgs']), f['vocab'], f['idf'], matrix)
+
+
+def load(paths=None):
+    """
+    Suggester for the current code lists (codelists.source_paths()): from this
+    process, from the cache file, or built and cached.
+    """
+    _require()
+    paths = paths or codelists.source_paths()
+    sources = {name: paths[name] for name in ('wgs', 'bisac')}
+    key = f'{CACHE_PREFIX}{FORMAT}-{codelists.fingerprint(sources)}'
+    suggester = _cache.get(key)
+    if suggester:
+        return suggester
+    path = data_path(f'{key}.npz')
+    try:
+        suggester = Suggester.open(path)
+    except (OSError, ValueError, KeyError):
+        tables = {}
+        for name, source in sources.items():
+            with open(source, encoding='utf-8') as f:
+                tables[name] = json.load(f)
+        suggester = Suggester.build(tables['wgs'], tables['bisac'])
+        suggester.save(path)
+        for old in glob.glob(data_path(f'{CACHE_PREFIX}*.npz')):
+            if old != path:
+                try:
+                    os.remove(old)
+                except OSError:
+                    pass
+    _cache.clear()
+    _cache[key] = suggester
+    return suggester
@@ -1,22 +1,41 @@
 # tabs/classification_tab.py
 """
 Module for the Classification tab of BoD MasteringOrder Generator.
+Code lists can be swapped at runtime (set_codes, fed by codelists.Registry).
+WGS and BISAC are browsed as trees of their description paths (codelists.CodeTree);
+child nodes are inserted only when a node is opened, a search term shows the hits flat.
+'Vorschläge' lists the codes subject_suggest ranks best for title and blurb. Codes
+added to one list while the other is empty bring up its crosswalk codes.
 Place this file in the folder `tabs/`.
 """
 import tkinter as tk
-from tkinter import ttk
+from tkinter import ttk, messagebox
+import codelists
+import subject_suggest
+import crosswalk
 
 class ClassificationTab:
-    def __init__(self, parent, wgs_codes, bisac_codes):
+    def __init__(self, parent, wgs_codes, bisac_codes, index=None, trees=None, text_source=None):
         """
         parent: ttk.Frame from the Notebook where this tab lives.
         wgs_codes: dict from JSON warengruppe_codes.json
         bisac_codes: dict from JSON bisac_codes.json
+        index, trees: prebuilt search entries / CodeTrees of codelists.CodeSet (optional)
+        text_source: callable returning (title, blurb) for the suggestions
         After initialization, selections are in self.selected_wgs, self.selected_bisac,
         """
         self.frame = parent
         self.wgs = wgs_codes
         self.bisac = bisac_codes
+        index = index or {}
+        trees = trees or codelists.code_trees({'wgs': wgs_codes, 'bisac': bisac_codes})
+        # vorberechnete Suchzeilen und Bäume je Liste (codelists.search_index, CodeTree)
+        self._index = {
+            'WGS': index.get('wgs') or codelists.search_index(wgs_codes),
+            'BISAC': index.get('bisac') or codelists.search_index(bisac_codes)
+        }
+        self._trees = {'WGS': trees['wgs'], 'BISAC': trees['bisac']}
+        self.text_source = text_source
         self.selected_wgs = []
         self.selected_bisac = []
         # Maps for age codes and languages
@@ -44,16 +63,22 @@ class ClassificationTab:
         wgs_frame = ttk.Frame(f)
         wgs_frame.grid(row=2, column=0, sticky='nsew', padx=5, pady=(0,4))
         wgs_frame.columnconfigure(0, weight=1)
-        self.wgs_listbox = tk.Listbox(wgs_frame, height=6)
-        self.wgs_listbox.grid(row=0, column=0, sticky='nsew')
-        wgs_scroll = ttk.Scrollbar(wgs_frame, orient='vertical', command=self.wgs_listbox.yview)
+        self.wgs_browser = ttk.Treeview(wgs_frame, columns=['Code'], height=6)
+        self.wgs_browser.heading('#0', text='Description')
+        self.wgs_browser.heading('Code', text='Code')
+        self.wgs_browser.column('Code', width=100, stretch=False)
+        self.wgs_browser.grid(row=0, column=0, sticky='nsew')
+        wgs_scroll = ttk.Scrollbar(wgs_frame, orient='vertical', command=self.wgs_browser.yview)
         wgs_scroll.grid(row=0, column=1, sticky='ns')
-        self.wgs_listbox.config(yscrollcommand=wgs_scroll.set)
-        for code, desc in self.wgs.items():
-            self.wgs_listbox.insert('end', f"{code} | {desc}")
+        self.wgs_browser.config(yscrollcommand=wgs_scroll.set)
+        self.wgs_browser.bind('<<TreeviewOpen>>', lambda e: self._expand('WGS'))
+        self._filter('WGS')
 
-        ttk.Button(f, text='Übernehmen', command=lambda: self._add('WGS'))\
-            .grid(row=3, column=0, padx=5, pady=(4,4))
+        wgs_buttons = ttk.Frame(f)
+        wgs_buttons.grid(row=3, column=0, padx=5, pady=(4,4))
+        ttk.Button(wgs_buttons, text='Übernehmen', command=lambda: self._add('WGS')).pack(side='left')
+        ttk.Button(wgs_buttons, text='Vorschläge', command=lambda: self._suggest('WGS'))\
+            .pack(side='left', padx=(5,0))
         self.wgs_tree = ttk.Treeview(f, columns=['Code','Description'], show='headings', height=4)
         for col,width in [('Code',100),('Description',200)]:
             self.wgs_tree.heading(col, text=col)
@@ -84,16 +109,22 @@ class ClassificationTab:
         bisac_frame = ttk.Frame(f)
         bisac_frame.grid(row=2, column=1, sticky='nsew', padx=5, pady=(0,4))
         bisac_frame.columnconfigure(0, weight=1)
-        self.bisac_listbox = tk.Listbox(bisac_frame, height=6)
-        self.bisac_listbox.grid(row=0, column=0, sticky='nsew')
-        bisac_scroll = ttk.Scrollbar(bisac_frame, orient='vertical', command=self.bisac_listbox.yview)
+        self.bisac_browser = ttk.Treeview(bisac_frame, columns=['Code'], height=6)
+        self.bisac_browser.heading('#0', text='Description')
+        self.bisac_browser.heading('Code', text='Code')
+        self.bisac_browser.column('Code', width=100, stretch=False)
+        self.bisac_browser.grid(row=0, column=0, sticky='nsew')
+        bisac_scroll = ttk.Scrollbar(bisac_frame, orient='vertical', command=self.bisac_browser.yview)
         bisac_scroll.grid(row=0, column=1, sticky='ns')
-        self.bisac_listbox.config(yscrollcommand=bisac_scroll.set)
-        for code, desc in self.bisac.items():
-            self.bisac_listbox.insert('end', f"{code} | {desc}")
+        self.bisac_browser.config(yscrollcommand=bisac_scroll.set)
+        self.bisac_browser.bind('<<TreeviewOpen>>', lambda e: self._expand('BISAC'))
+        self._filter('BISAC')
 
-        ttk.Button(f, text='Übernehmen', command=lambda: self._add('BISAC'))\
-            .grid(row=3, column=1, padx=5, pady=(4,4))
+        bisac_buttons = ttk.Frame(f)
+        bisac_buttons.grid(row=3, column=1, padx=5, pady=(4,4))
+        ttk.Button(bisac_buttons, text='Übernehmen', command=lambda: self._add('BISAC')).pack(side='left')
+        ttk.Button(bisac_buttons, text='Vorschläge', command=lambda: self._suggest('BISAC'))\
+            .pack(side='left', padx=(5,0))
         self.bisac_tree = ttk.Treeview(f, columns=['Code','Description'], show='headings', height=4)
         for col,width in [('Code',100),('Description',200)]:
             self.bisac_tree.heading(col, text=col)
@@ -130,25 +161,107 @@ class ClassificationTab:
         return _handler
 
     def _filter(self, label):
-        term = getattr(self, f"{label.lower()}_search_var").get().lower()
-        lb = getattr(self, f"{label.lower()}_listbox")
-        data = self.wgs if label=='WGS' else self.bisac
-        lb.delete(0, 'end')
-        for c, d in data.items():
-            if term in c.lower() or term in d.lower():
-                lb.insert('end', f"{c} | {d}")
+        term = getattr(self, f"{label.lower()}_search_var").get()
+        browser = getattr(self, f"{label.lower()}_browser")
+        browser.delete(*browser.get_children())
+        if not term:
+            # nur die oberste Ebene, der Rest beim Aufklappen
+            self._insert_nodes(label, '', self._trees[label].children[0])
+            return
+        for line in codelists.search(self._index[label], term):
+            code, desc = line.split(' | ', 1)
+            browser.insert('', 'end', text=desc, values=(code,))
+
+    def _insert_nodes(self, label, parent, nodes):
+        tree = self._trees[label]
+        browser = getattr(self, f"{label.lower()}_browser")
+        for n in nodes:
+            iid = browser.insert(parent, 'end', iid=f'n{n}', text=tree.label[n], values=(tree.code[n] or '',))
+            if tree.children[n]:
+                # Platzhalter, damit der Knoten aufklappbar ist
+                browser.insert(iid, 'end', iid=f'{iid}~')
+
+    def _expand(self, label):
+        browser = getattr(self, f"{label.lower()}_browser")
+        iid = browser.focus()
+        if browser.exists(f'{iid}~'):
+            browser.delete(f'{iid}~')
+            self._insert_nodes(label, iid, self._trees[label].children[int(iid[1:])])
+
+    def _suggest(self, label):
+        if not self.text_source:
+            return
+        title, blurb = self.text_source()
+        try:
+            hits = subject_suggest.load().suggest(title, blurb)[label]
+        except subject_suggest.SuggestError as e:
+            messagebox.showerror('Vorschläge', str(e))
+            return
+        if not hits:
+            messagebox.showinfo('Vorschläge', 'Keine passenden Codes – Titel oder Klappentext ergänzen.')
+            return
+        self._show_codes(label, [code for code, _ in hits])
+
+    def set_codes(self, wgs_codes, bisac_codes, index=None, trees=None):
+        """
+        Swap in new code lists (e.g. after a reload): the lists are filtered again
+        with the current search terms, selected codes get their new texts.
+        index, trees: prebuilt {'wgs', 'bisac': search entries / CodeTree} of codelists.CodeSet.
+        """
+        self.wgs, self.bisac = wgs_codes, bisac_codes
+        index = index or {}
+        trees = trees or codelists.code_trees({'wgs': wgs_codes, 'bisac': bisac_codes})
+        for label, codes, tree, sel_list in (
+            ('WGS', wgs_codes, self.wgs_tree, self.selected_wgs),
+            ('BISAC', bisac_codes, self.bisac_tree, self.selected_bisac)
+        ):
+            self._index[label] = index.get(label.lower()) or \
+                codelists.search_index(codes, self._index[label])
+            self._trees[label] = trees[label.lower()]
+            self._filter(label)
+            # gestrichene Codes bleiben mit bisherigem Text ausgewählt
+            sel_list[:] = [(code, codes.get(code, desc)) for code, desc in sel_list]
+            for iid, (code, desc) in zip(tree.get_children(), sel_list):
+                tree.item(iid, values=(code, desc))
+        self._update_age_state()
 
     def _add(self, label):
-        lb = getattr(self, f"{label.lower()}_listbox")
-        sel = lb.curselection()
-        if not sel: return
-        code, desc = lb.get(sel[0]).split(' | ',1)
+        browser = getattr(self, f"{label.lower()}_browser")
+        codes = self.wgs if label=='WGS' else self.bisac
         tree = getattr(self, f"{label.lower()}_tree")
         sel_list = self.selected_wgs if label=='WGS' else self.selected_bisac
-        if (code, desc) not in sel_list:
-            tree.insert('', 'end', values=(code, desc))
-            sel_list.append((code, desc))
+        for iid in browser.selection():
+            code = browser.set(iid, 'Code')
+            # Gruppenknoten ohne eigenen Code
+            if not code:
+                continue
+            desc = codes.get(code, '')
+            if (code, desc) not in sel_list:
+                tree.insert('', 'end', values=(code, desc))
+                sel_list.append((code, desc))
         self._update_age_state()
+        self._propose(label)
+
+    def _propose(self, label):
+        # andere Liste noch leer: passende Codes laut Zuordnung anbieten
+        other = 'BISAC' if label=='WGS' else 'WGS'
+        sel_list = self.selected_wgs if label=='WGS' else self.selected_bisac
+        if not sel_list or (self.selected_bisac if label=='WGS' else self.selected_wgs):
+            return
+        try:
+            hits = crosswalk.load().propose(label, [code for code, _ in sel_list])
+        except subject_suggest.SuggestError:
+            return
+        if hits:
+            self._show_codes(other, [code for code, _ in hits])
+
+    def _show_codes(self, label, codes_shown):
+        # Vorschläge flach in der Liste zeigen (wie Suchtreffer)
+        codes = self.wgs if label=='WGS' else self.bisac
+        browser = getattr(self, f"{label.lower()}_browser")
+        browser.delete(*browser.get_children())
+        for code in codes_shown:
+            browser.insert('', 'end', text=codes.get(code, ''), values=(code,))
 
     def _remove(self, label):
         tree = getattr(self, f"{label.lower()}_tree")
@@ -161,10 +274,13 @@ class ClassificationTab:
         self._update_age_state()
 
     def _update_age_state(self):
-        need_w = any('Kinder' in desc for _, desc in self.selected_wgs)
-        need_b = any(code.startswith(('JUV','YAF')) for code, _ in self.selected_bisac)
+        audience = codelists.audience(self.wgs, self.bisac)
+        need_w = any(audience.needs_age('WGS', code) for code, _ in self.selected_wgs)
+        need_b = any(audience.needs_age('BISAC', code) for code, _ in self.selected_bisac)
         if need_w:
             self.age_wgs.config(state='readonly')
+            if not self.age_wgs_code.get():
+                self._set_age('WGS', self._default_age(audience, 'WGS', self.selected_wgs))
         else:
             # **Erst wenn wirklich keine Kinder-Kategorien mehr da sind, leeren und deaktivieren**
             self.age_wgs.set('')
@@ -175,6 +291,8 @@ class ClassificationTab:
 
         if need_b:
             self.age_bisac.config(state='readonly')
+            if not self.age_bisac_code.get():
+                self._set_age('BISAC', self._default_age(audience, 'BISAC', self.selected_bisac))
         else:
             self.age_bisac.set('')
             self.age_bisac.config(state='disabled')
@@ -182,6 +300,11 @@ class ClassificationTab:
             self.age_bisac_code.delete(0, 'end')
             self.age_bisac_code.config(state='disabled')
 
+    def _default_age(self, audience, label, sel_list):
+        # Vorgabealter des ersten Codes, der eines vorgibt
+        return next((audience.default_age(label, code) for code, _ in sel_list
+                     if audience.default_age(label, code)), '')
+
     def _update_age_code(self, label):
         if label == 'WGS':
             sel = self.age_wgs.get()
@@ -198,6 +321,36 @@ class ClassificationTab:
             self.age_bisac_code.insert(0, code)
             self.age_bisac_code.config(state='disabled')
 
+    def _set_age(self, label, code):
+        combo, entry = (self.age_wgs, self.age_wgs_code) if label == 'WGS' \
+            else (self.age_bisac, self.age_bisac_code)
+        if not code or str(combo.cget('state')) == 'disabled':
+            return
+        combo.set(next((k for k, v in self.age_map.items() if v == code), ''))
+        entry.config(state='normal')
+        entry.delete(0, 'end')
+        entry.insert(0, code)
+        entry.config(state='disabled')
+
+    def set_selected(self, sel):
+        """Replace the selection with the codes, age codes and language of sel."""
+        for label, data, tree, sel_list in (
+            ('WGS', self.wgs, self.wgs_tree, self.selected_wgs),
+            ('BISAC', self.bisac, self.bisac_tree, self.selected_bisac)
+        ):
+            tree.delete(*tree.get_children())
+            sel_list.clear()
+            for code in sel.get(label, []):
+                desc = data.get(code, '')
+                tree.insert('', 'end', values=(code, desc))
+                sel_list.append((code, desc))
+        self._update_age_state()
+        self._set_age('WGS', sel.get('AgeWGS', ''))
+        self._set_age('BISAC', sel.get('AgeBISAC', ''))
+        lang = next((k for k, v in self.lang_map.items() if v == sel.get('Language')), None)
+        if lang:
+            self.lang_cb.set(lang)
+
     def get_selected(self):
         """
         Returns selected codes and age codes and language.
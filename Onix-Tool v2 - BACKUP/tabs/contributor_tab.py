@@ -2,10 +2,17 @@
 """
 Module for the Contributor tab of BoD MasteringOrder Generator.
 Provides inline entry for contributors and a Treeview.
+LastName offers known contributors of the authority (typeahead, fuzzy if no
+name starts with the input); picking one fills the other fields.
 Place this file in the folder `tabs/`.
 """
 import tkinter as tk
-from tkinter import ttk, messagebox
+from tkinter import ttk, messagebox, filedialog
+from order_schema import CONTRIBUTOR_ROLES
+import authority
+
+# Verzögerung der Suche nach der letzten Taste (ms)
+TYPEAHEAD_DELAY = 150
 
 class ContributorTab:
     def __init__(self, parent):
@@ -14,6 +21,9 @@ class ContributorTab:
         After initialization, the Treeview and input widgets are available in self.
         """
         self.frame = parent
+        self._conn = None
+        self._hits = []
+        self._pending = None
         self._build_ui()
 
     def _build_ui(self):
@@ -26,12 +36,7 @@ class ContributorTab:
         for i, lab in enumerate(labels):
             ttk.Label(entry_frame, text=lab+':').grid(row=i, column=0, sticky='e', padx=5, pady=2)
             if lab == 'Role':
-                cb = ttk.Combobox(entry_frame, values=[
-                    'Author','Editor','Illustrator','Photographer','Drawer','VolumeEditor',
-                    'SeriesEditor','FoundedBy','PrefaceBy','ForewordBy','IntroductionBy',
-                    'AfterwordBy','NotesBy','CommentariesBy','ContributionsBy','RevisedBy',
-                    'AdaptedBy','TranslatedBy','CompiledBy','SelectedBy'
-                ], state='readonly', width=20)
+                cb = ttk.Combobox(entry_frame, values=CONTRIBUTOR_ROLES, state='readonly', width=20)
                 cb.set('Author')
                 cb.grid(row=i, column=1, sticky='w', padx=5, pady=2)
                 self.entries['Role'] = cb
@@ -43,6 +48,12 @@ class ContributorTab:
                 txt.grid(row=i, column=1, sticky='ew', padx=5, pady=2)
                 sb.grid(row=i, column=2, sticky='ns', padx=(0,5), pady=2)
                 self.entries['ShortBio'] = txt
+            elif lab == 'LastName':
+                cb = ttk.Combobox(entry_frame, width=25)
+                cb.grid(row=i, column=1, sticky='w', padx=5, pady=2)
+                cb.bind('<KeyRelease>', self._on_name_key)
+                cb.bind('<<ComboboxSelected>>', self._on_name_pick)
+                self.entries['LastName'] = cb
             elif lab in ['ISNI','ORCID']:
                 vcmd = (f.register(self._validate_code), '%P')
                 ent = ttk.Entry(entry_frame, validate='key', validatecommand=vcmd, width=25)
@@ -53,8 +64,10 @@ class ContributorTab:
                 ent.grid(row=i, column=1, sticky='w', padx=5, pady=2)
                 self.entries[lab] = ent
         # Add button
-        ttk.Button(entry_frame, text='Hinzufügen', command=self._add_contributor).grid(
-            row=len(labels), column=0, columnspan=3, pady=5)
+        buttons = ttk.Frame(entry_frame)
+        buttons.grid(row=len(labels), column=0, columnspan=3, pady=5)
+        ttk.Button(buttons, text='Hinzufügen', command=self._add_contributor).pack(side='left', padx=5)
+        ttk.Button(buttons, text='Contributors importieren (CSV)…', command=self._import_csv).pack(side='left', padx=5)
 
         # Treeview for added contributors
         cols = ['Role','LastName','FirstName','ISNI','ORCID','ShortBio']
@@ -74,7 +87,62 @@ class ContributorTab:
         self.tree.bind('<Button-1>', self._on_tree_click)
 
     def _validate_code(self, P):
-        return P.isdigit() or P == ''
+        # Ziffern, Prüfzeichen X, Gruppierung mit Leerzeichen oder Bindestrich
+        return all(ch.isdigit() or ch in 'xX -' for ch in P)
+
+    def _authority(self):
+        if self._conn is None:
+            self._conn = authority.connect()
+        return self._conn
+
+    def _on_name_key(self, event):
+        if event.keysym in ('Up', 'Down', 'Return', 'Escape', 'Tab'):
+            return
+        if self._pending:
+            self.frame.after_cancel(self._pending)
+        self._pending = self.frame.after(TYPEAHEAD_DELAY, self._lookup)
+
+    def _lookup(self):
+        self._pending = None
+        text = self.entries['LastName'].get()
+        try:
+            self._hits = authority.search(text, conn=self._authority()) if len(text.strip()) >= 2 else []
+        except Exception:
+            # Bestand nicht lesbar: Eingabe funktioniert weiter wie bisher
+            self._hits = []
+        self.entries['LastName']['values'] = [
+            f"{c['LastName']}, {c['FirstName']}" + (f"  (ISNI {c['ISNI']})" if c['ISNI'] else '')
+            for c in self._hits
+        ]
+
+    def _on_name_pick(self, event):
+        i = self.entries['LastName'].current()
+        if i < 0 or i >= len(self._hits):
+            return
+        c = self._hits[i]
+        for key in authority.FIELDS:
+            widget = self.entries[key]
+            if isinstance(widget, tk.Text):
+                widget.delete('1.0', 'end')
+                widget.insert('1.0', c[key])
+            else:
+                widget.delete(0, 'end')
+                widget.insert(0, c[key])
+
+    def _import_csv(self):
+        path = filedialog.askopenfilename(filetypes=[('CSV', '*.csv'), ('Alle Dateien', '*.*')])
+        if not path:
+            return
+        try:
+            result = authority.import_csv(path, conn=self._authority())
+        except (OSError, ValueError) as e:
+            messagebox.showerror('Import fehlgeschlagen', str(e))
+            return
+        msg = f"{result['added']} neu, {result['updated']} aktualisiert"
+        if result['errors']:
+            lines = '\n'.join(f'Zeile {line}: {err}' for line, err in result['errors'][:10])
+            msg += f", {len(result['errors'])} übersprungen:\n{lines}"
+        messagebox.showinfo('Contributors importiert', msg)
 
     def _add_contributor(self):
         vals = {}
@@ -86,6 +154,13 @@ class ContributorTab:
         if not vals['LastName'] or not vals['FirstName']:
             messagebox.showerror('Fehler', 'Vor- und Nachname sind erforderlich.')
             return
+        problems = authority.id_problems(vals)
+        if problems:
+            messagebox.showerror('Ungültige Kennung', '\n'.join(problems))
+            return
+        for key in ('ISNI', 'ORCID'):
+            if vals[key]:
+                vals[key] = authority.format_id(key, vals[key])
         self.tree.insert('', 'end', values=(
             vals['Role'], vals['LastName'], vals['FirstName'],
             vals['ISNI'], vals['ORCID'], vals['ShortBio']
@@ -106,6 +181,15 @@ class ContributorTab:
         if iid in self.tree.selection():
             self.tree.selection_remove(iid)
 
+    def set_data(self, contributors):
+        """Replace the list with the given contributor dicts."""
+        self.tree.delete(*self.tree.get_children())
+        for c in contributors:
+            self.tree.insert('', 'end', values=(
+                c.get('Role', 'Author'), c.get('LastName', ''), c.get('FirstName', ''),
+                c.get('ISNI', ''), c.get('ORCID', ''), c.get('ShortBio', '')
+            ))
+
     def get_data(self):
         data = []
         for iid in self.tree.get_children():
@@ -138,6 +138,20 @@ class EBookTab:
         """Return True if E-Book creation is activated."""
         return bool(self.eb.get())
 
+    def set_data(self, data):
+        """Fill the E-Book fields from an order's EBook dict."""
+        if str(self.chk.cget('state')) != 'disabled':
+            self.eb.set(bool(data.get('Enabled')))
+            self._toggle_fields()
+        self.printed_ean_entry.delete(0, tk.END)
+        self.printed_ean_entry.insert(0, data.get('PrintedEAN', ''))
+        self.eb_ean.delete(0, tk.END)
+        self.eb_ean.insert(0, data.get('EAN', ''))
+        fmt = data.get('EBookFileType') or data.get('EBookFormat') or 'ePub'
+        self.eb_format.set(fmt)
+        self.eb_filetype.set(fmt)
+        self.eb_price.set(data.get('Price', ''))
+
     def get_data(self):
         """Collect E-Book field values as dict for XML export."""
         return {
@@ -6,6 +6,7 @@ Place this file in the folder `tabs/`.
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
+from partitions import CUSTOMER_NUMBERS, IMPRINTS, DEFAULT_HEADER, DEFAULT_IMPRINT
 
 class HeaderTab:
     def __init__(self, parent):
@@ -15,11 +16,7 @@ class HeaderTab:
         """
         self.frame = parent
         self.hdr = {}
-        self.defaults = {
-            'FromCompany': 'Orbita Media GmbH',
-            'FromCompanyNumber': '40501700',
-            'FromEmail': 'kontakt@orbita-media.de'
-        }
+        self.defaults = dict(DEFAULT_HEADER)
         self._build_ui()
 
     def _build_ui(self):
@@ -46,13 +43,14 @@ class HeaderTab:
         ent_num = ttk.Entry(cf, width=20)
         ent_num.insert(0, self.defaults['FromCompanyNumber'])
         ent_num.grid(row=1, column=1, sticky='w', padx=5, pady=2)
-        cb_vals = ['40501700 (Spanien)', '11026617 (Frankreich)', '11022642 (Deutschland)']
+        cb_vals = [f'{num} ({country})' for num, country in CUSTOMER_NUMBERS.items()]
         cb_num = ttk.Combobox(cf, values=cb_vals, state='readonly', width=25)
         sel = next((v for v in cb_vals if v.startswith(self.defaults['FromCompanyNumber'])), cb_vals[0])
         cb_num.set(sel)
         cb_num.grid(row=1, column=2, padx=5, pady=2)
         cb_num.bind('<<ComboboxSelected>>', lambda e: self._on_number_select(cb_num, ent_num))
         self.hdr['FromCompanyNumber'] = ent_num
+        self.number_cb = cb_num
 
         # FromPerson
         ttk.Label(cf, text='Ansprechpartner:').grid(row=2, column=0, sticky='e', padx=5, pady=2)
@@ -97,10 +95,10 @@ class HeaderTab:
         self.imprint_label.grid(row=2, column=0, sticky='e', padx=5, pady=2)
         self.imprint_cb = ttk.Combobox(
             f,
-            values=['Lucid Page Media', 'Orbita Media GmbH'],
+            values=IMPRINTS,
             state='readonly', width=30
         )
-        self.imprint_cb.set('Lucid Page Media')
+        self.imprint_cb.set(DEFAULT_IMPRINT)
         self.imprint_cb.grid(row=2, column=1, sticky='w', padx=5, pady=2)
         self.hdr['Imprint'] = self.imprint_cb
 
@@ -137,6 +135,20 @@ class HeaderTab:
             e.delete(0, tk.END)
             e.insert(0, t)
 
+    def set_data(self, data):
+        """Fill the fields from a header dict (e.g. an imported order)."""
+        for lab, w in self.hdr.items():
+            if lab not in data:
+                continue
+            if lab == 'Imprint':
+                w.set(data[lab])
+            else:
+                self._reset_field(w, data[lab])
+        num = data.get('FromCompanyNumber', '')
+        sel = next((v for v in self.number_cb.cget('values') if v.split()[0] == num), None)
+        if sel:
+            self.number_cb.set(sel)
+
     def get_data(self):
         data = {}
         for lab, w in self.hdr.items():
@@ -166,6 +166,19 @@ class InternationalTab:
     def get_prices(self) -> dict:
         return {cur: self.entries[cur].get().strip() for cur in self.entries}
 
+    def set_data(self, data):
+        """Fill checkbox, EAN and prices from an order's International dict."""
+        if str(self.chk.cget('state')) != 'disabled':
+            self.intl_var.set(bool(data.get('Enabled')))
+        self._toggle_enabled()
+        if self.intl_var.get():
+            self.ean_entry.delete(0, tk.END)
+            self.ean_entry.insert(0, data.get('EAN', ''))
+            for cur, val in data.get('Prices', {}).items():
+                if cur in self.entries:
+                    self.entries[cur].delete(0, tk.END)
+                    self.entries[cur].insert(0, val)
+
     def get_data(self):
         """
         Return the entered EAN and previous EUR price.
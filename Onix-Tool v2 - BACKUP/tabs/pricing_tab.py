@@ -71,6 +71,11 @@ class PricingTab:
         if self.on_price_update:
             self.on_price_update(eur)
 
+    def set_price_eur(self, value):
+        """Set the EUR price (e.g. from an imported order), without callback."""
+        self.eur_entry.delete(0, tk.END)
+        self.eur_entry.insert(0, value or '')
+
     def get_price_eur(self) -> str:
         """
         Gibt den eingegebenen EUR-Preis als String zurück
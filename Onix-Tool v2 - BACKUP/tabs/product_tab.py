@@ -7,6 +7,7 @@ import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
 from tkcalendar import DateEntry
+import xhtml_blurb
 
 class ProductTab:
     def __init__(self, parent):
@@ -17,6 +18,8 @@ class ProductTab:
         """
         self.frame = parent
         self.widgets = {}
+        # Zeichen in der Beschreibung, mitgezählt bei jedem insert/delete
+        self._blurb_len = 0
         self._build_ui()
 
     def _validate_ean(self, P):
@@ -42,11 +45,73 @@ class ProductTab:
                 ent.config(background='pink')
                 messagebox.showerror('Formatfehler', 'PublicationDate muss im Format YYYYMMDD sein.')
 
-    def _limit_blurb(self, widget):
+    def _track_blurb(self, widget):
+        """
+        Route the Text widget's Tcl command through _blurb_command, so the
+        length is counted per insert/delete instead of copying the whole text.
+        """
+        orig = widget._w + '_orig'
+        widget.tk.call('rename', widget._w, orig)
+        widget.tk.createcommand(widget._w, lambda *args: self._blurb_command(widget, orig, *args))
+
+    def _range_length(self, widget, orig, first, last=None):
+        # Zeichen zwischen first und last, wie delete sie entfernt (nie das letzte \n)
+        call = widget.tk.call
+        first = call(orig, 'index', first)
+        last = call(orig, 'index', last if last else f'{first}+1c')
+        end = call(orig, 'index', 'end-1c')
+        if call(orig, 'compare', last, '>', end):
+            last = end
+        if call(orig, 'compare', first, '>=', last):
+            return 0
+        return int(call(orig, 'count', '-chars', first, last) or 0)
+
+    def _blurb_command(self, widget, orig, *args):
+        op = args[0] if args else ''
+        if op not in ('insert', 'delete', 'replace'):
+            return widget.tk.call((orig,) + args)
+        args = list(args)
+        if op == 'delete' and len(args) > 3:
+            # mehrere Bereiche auf einmal: danach neu zählen
+            result = widget.tk.call(tuple([orig] + args))
+            self._blurb_len = int(widget.tk.call(orig, 'count', '-chars', '1.0', 'end-1c') or 0)
+            self._show_blurb_len()
+            return result
+        removed = self._range_length(widget, orig, *args[1:3]) if op in ('delete', 'replace') else 0
+        added = 0
+        if op != 'delete':
+            room = xhtml_blurb.MAX_LENGTH - self._blurb_len + removed
+            # insert index text ?tags text tags …? / replace i1 i2 text ?tags …?
+            for i in range(3 if op == 'replace' else 2, len(args), 2):
+                text = str(args[i])
+                if len(text) > room:
+                    args[i] = text = text[:max(room, 0)]
+                    widget.bell()
+                room -= len(text)
+                added += len(text)
+        result = widget.tk.call(tuple([orig] + args))
+        self._blurb_len += added - removed
+        self._show_blurb_len()
+        return result
+
+    def _show_blurb_len(self):
+        self.blurb_count.config(text=f'{self._blurb_len} / {xhtml_blurb.MAX_LENGTH} Zeichen')
+
+    def _check_blurb(self):
+        """Reduce pasted HTML to the ONIX XHTML subset and report what is still wrong."""
+        widget = self.widgets['Blurb']
         text = widget.get('1.0', 'end-1c')
-        if len(text) > 4000:
+        clean = xhtml_blurb.sanitize(text)
+        if clean != text:
             widget.delete('1.0', 'end')
-            widget.insert('1.0', text[:4000])
+            widget.insert('1.0', clean)
+        problem = xhtml_blurb.problem(clean.strip())
+        if problem:
+            messagebox.showerror('Beschreibung', problem)
+        elif xhtml_blurb.is_markup(clean):
+            messagebox.showinfo('Beschreibung', 'Die Beschreibung ist gültiges ONIX-XHTML.')
+        else:
+            messagebox.showinfo('Beschreibung', 'Die Beschreibung ist reiner Text.')
 
     def _apply_size(self):
         mapping = {
@@ -84,7 +149,7 @@ class ProductTab:
             ('EAN', 'EAN:*', self._validate_ean, self._on_ean_focusout),
             ('Title', 'Titel:*', None, None),
             ('SubTitle', 'Untertitel', None, None),
-            ('Serie', 'Buchreihe (optional)', None, None),
+            ('Series', 'Buchreihe (optional)', None, None),
             ('PartNumber', 'Band (optional)', None, None),
             ('EditionNumber', 'Editionnummer', None, None)
         ]
@@ -104,12 +169,18 @@ class ProductTab:
         # Beschreibung
         bb = ttk.LabelFrame(f, text='Beschreibung')
         bb.pack(fill='both', padx=5, pady=5)
+        bar = ttk.Frame(bb)
+        bar.pack(side='bottom', fill='x')
+        self.blurb_count = ttk.Label(bar)
+        self.blurb_count.pack(side='left', padx=5)
+        ttk.Button(bar, text='XHTML prüfen', command=self._check_blurb).pack(side='right', padx=5, pady=2)
         ent_bl = tk.Text(bb, width=120, height=15)
         sb = ttk.Scrollbar(bb, command=ent_bl.yview)
         ent_bl.configure(yscrollcommand=sb.set)
         ent_bl.pack(side='left', fill='both', expand=True)
         sb.pack(side='right', fill='y')
-        ent_bl.bind('<KeyRelease>', lambda e, widget=ent_bl: self._limit_blurb(widget))
+        self._track_blurb(ent_bl)
+        self._show_blurb_len()
         w['Blurb'] = ent_bl
 
         # Maße & Seiten
@@ -168,15 +239,28 @@ class ProductTab:
             cbx.set(defv); cbx.grid(row=i, column=1, sticky='w', padx=5, pady=2)
             w[label.rstrip(':*')] = cbx
 
+    def set_data(self, data):
+        """Fill the fields from a product dict (e.g. an imported order)."""
+        w = self.widgets
+        for key, val in data.items():
+            widget = w.get(key)
+            if widget is None:
+                continue
+            if isinstance(widget, tk.Text):
+                widget.delete('1.0', 'end')
+                widget.insert('1.0', val)
+            elif isinstance(widget, ttk.Combobox):
+                widget.set(val)
+            else:
+                widget.delete(0, tk.END)
+                widget.insert(0, val)
+
     def get_ordered_data(self):
         data = {}
         w = self.widgets
         data['Title'] = w['Title'].get().strip()
         data['SubTitle'] = w['SubTitle'].get().strip()
-        # bisheriges Feld
-        data['Serie'] = w['Serie'].get().strip()
-        # zusätzlich key 'Series' für den XML-Export
-        data['Series'] = data['Serie']
+        data['Series'] = w['Series'].get().strip()
         data['PartNumber'] = w['PartNumber'].get().strip()
         data['EditionNumber'] = w['EditionNumber'].get().strip()
         data['PublicationDate'] = w['PublicationDate'].get().strip()
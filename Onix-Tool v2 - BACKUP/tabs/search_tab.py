@@ -0,0 +1,89 @@
+# tabs/search_tab.py
+"""
+Module for the Suche tab of BoD MasteringOrder Generator.
+Free-text search over titles, subtitles, blurbs and contributors of exported orders.
+Place this file in the folder `tabs/`.
+"""
+import tkinter as tk
+from tkinter import ttk, filedialog, messagebox
+import order_index
+
+class SearchTab:
+    def __init__(self, parent):
+        """
+        parent: ttk.Frame from the Notebook where this tab lives.
+        Results of the last search are shown in self.tree.
+        """
+        self.frame = parent
+        self.field_map = {
+            'Alle Felder': None, 'Titel': 'title', 'Untertitel': 'subtitle',
+            'Contributor': 'contributors', 'Beschreibung': 'blurb'
+        }
+        self._after_id = None
+        self._build_ui()
+
+    def _build_ui(self):
+        f = self.frame
+        f.columnconfigure(1, weight=1)
+        f.rowconfigure(1, weight=1)
+
+        # Suchzeile
+        ttk.Label(f, text='Suche:').grid(row=0, column=0, sticky='e', padx=5, pady=5)
+        self.search_var = tk.StringVar()
+        ent = ttk.Entry(f, textvariable=self.search_var)
+        ent.grid(row=0, column=1, sticky='ew', padx=5, pady=5)
+        self.search_var.trace_add('write', lambda *a: self._schedule())
+        self.field_cb = ttk.Combobox(f, values=list(self.field_map.keys()), state='readonly', width=15)
+        self.field_cb.set('Alle Felder')
+        self.field_cb.grid(row=0, column=2, padx=5, pady=5)
+        self.field_cb.bind('<<ComboboxSelected>>', lambda e: self._search())
+        ttk.Button(f, text='Ordner indizieren', command=self._reindex).grid(row=0, column=3, padx=5)
+
+        # Ergebnisliste
+        cols = ['EAN','Title','Contributors','Imprint','Path']
+        self.tree = ttk.Treeview(f, columns=cols, show='headings')
+        for c, width in zip(cols, [110, 250, 180, 120, 250]):
+            self.tree.heading(c, text=c)
+            self.tree.column(c, width=width)
+        self.tree.grid(row=1, column=0, columnspan=4, sticky='nsew', padx=5, pady=5)
+        sb = ttk.Scrollbar(f, orient='vertical', command=self.tree.yview)
+        sb.grid(row=1, column=4, sticky='ns')
+        self.tree.config(yscrollcommand=sb.set)
+
+        self.status = ttk.Label(f, text='')
+        self.status.grid(row=2, column=0, columnspan=4, sticky='w', padx=5)
+
+    def _schedule(self):
+        # erst suchen, wenn kurz nicht mehr getippt wird
+        if self._after_id:
+            self.frame.after_cancel(self._after_id)
+        self._after_id = self.frame.after(200, self._search)
+
+    def _search(self):
+        self._after_id = None
+        self.tree.delete(*self.tree.get_children())
+        term = self.search_var.get().strip()
+        if not term:
+            self.status.config(text='')
+            return
+        try:
+            hits = order_index.search(
+                term, field=self.field_map.get(self.field_cb.get()), prefix=True
+            )
+        except Exception as e:
+            self.status.config(text=f'Suche fehlgeschlagen: {e}')
+            return
+        for h in hits:
+            title = h['title'] + (f" – {h['subtitle']}" if h['subtitle'] else '')
+            self.tree.insert('', 'end', values=(
+                h['ean'], title, h['contributors'], h['imprint'], h['path'] or ''
+            ))
+        self.status.config(text=f'{len(hits)} Treffer')
+
+    def _reindex(self):
+        folder = filedialog.askdirectory(title='Ordner mit MasteringOrder-XMLs wählen')
+        if not folder:
+            return
+        count = order_index.index_files([folder])
+        messagebox.showinfo('Index aktualisiert', f'{count} Titel indiziert.')
+        self._search()
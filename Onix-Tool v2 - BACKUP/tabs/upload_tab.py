@@ -5,6 +5,8 @@ import os
 import tempfile
 from zipfile import ZipFile
 import xml_export
+import order_index
+import packaging
 
 class UploadTab:
     def __init__(self, parent,
@@ -122,6 +124,19 @@ class UploadTab:
             self.paths['ebook_cover'] = p
             self.lbl_ebook_cov.config(text=os.path.basename(p))
 
+    def _write_zip(self, zipfn, mode, xml_path):
+        # gleiche Archiv-Struktur wie im Batch-Lauf (packaging.zip_layout)
+        order = xml_export.collect_order(
+            self.header, self.prod, self.contrib,
+            self.classif, self.price, self.intl, self.eb,
+            mode=mode
+        )
+        order = order.replace(Assets=self.paths)
+        with open(xml_path, 'rb') as f:
+            # bestehendes ZIP mit unveränderten PDFs: nur die XML ersetzen
+            packaging.write_zip(zipfn, order, f.read(), update=True,
+                                log=lambda msg: messagebox.showwarning('Hinweis', msg))
+
     def make_full_zip(self, mode):
         # --- AddEBook-Fall: nur eBook + Cover, kein Manuskript/Cover-Upload ---
         if mode == 'AddEBook':
@@ -164,12 +179,7 @@ class UploadTab:
                 return
 
             # 5) packen & umbenennen
-            with ZipFile(zipfn, 'w') as z:
-                z.write(xml_path, arcname=f"{printed_ean}_MasteringOrder.xml")
-                eb_isbn = self.eb.eb_ean.get().strip()
-                ext     = self.eb.eb_format.get().lower()
-                z.write(self.paths['ebook'],       arcname=f"E-Book-{eb_isbn}.{ext}")
-                z.write(self.paths['ebook_cover'], arcname=f"E-Book-{eb_isbn}.jpg")
+            self._write_zip(zipfn, mode, xml_path)
 
             messagebox.showinfo('ZIP erstellt', f'ZIP gespeichert als:\n{zipfn}')
             return
@@ -232,18 +242,13 @@ class UploadTab:
             return
 
         # 5) Packen & umbenennen
-        with ZipFile(zipfn, 'w') as z:
-            band   = self.prod.widgets.get('PartNumber').get().strip()
-            suffix = f"_{band}" if band else ""
-            z.write(self.paths['manuscript'], arcname=f"{isbn}{suffix}_Bookblock.pdf")
-            z.write(self.paths['cover'],      arcname=f"{isbn}_Cover.pdf")
-            z.write(xml_path,                 arcname=f"{isbn}_MasteringOrder.xml")
-            if self.eb.is_enabled():
-                eb_isbn = self.eb.eb_ean.get().strip()
-                fmt     = self.eb.eb_format.get().lower()
-                ext     = 'pdf' if fmt == 'epdf' else fmt
-                z.write(self.paths['ebook'],       arcname=f"E-Book-{eb_isbn}.{ext}")
-                z.write(self.paths['ebook_cover'], arcname=f"E-Book-{eb_isbn}.jpg")
+        self._write_zip(zipfn, mode, xml_path)
+
+        # im Suchindex auf das ZIP statt auf die temporäre XML verweisen
+        try:
+            order_index.set_path(isbn, zipfn)
+        except Exception as e:
+            messagebox.showwarning('Hinweis', f'Suchindex nicht aktualisiert: {e}')
 
         messagebox.showinfo('ZIP erstellt', f'ZIP gespeichert als:\n{zipfn}')
         return
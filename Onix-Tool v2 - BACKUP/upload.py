@@ -0,0 +1,630 @@
+# upload.py
+"""
+Upload of finished MasteringOrder ZIPs to BoD's ingestion endpoint.
+Targets are URLs: ftp://, ftps:// (ftplib), sftp:// (needs paramiko) or file://
+(network share, also handy as a local stand-in). Several files are uploaded in
+parallel over a pool of persistent connections per account; each file goes to
+<name>.part first, interrupted transfers resume at the size already on the
+server, and the finished file is renamed, so BoD never picks up partial ZIPs.
+A transfer only resumes a .part whose <name>.part.id holds the identifier of the
+same source (SHA-256 of the file, stream_id of a streamed order); any
+other .part is started afresh. upload_file keeps that identifier as <name>.id next
+to the finished file and skips a file only if the content matches.
+Per-account bandwidth caps and retries with exponential backoff make unattended
+nightly runs possible. push_orders streams each order's ZIP straight into the
+connection (packaging.stream_zip) instead of writing and re-reading a local
+archive; a local copy can be teed off the same stream. Accounts live in DATA_DIR/upload_accounts.json:
+  {"bod": {"url": "ftp://user@host/in", "password": "...", "connections": 4,
+           "limit_kbps": 0, "retries": 5}}
+Place this file in the project root next to main.py.
+"""
+import io
+import os
+import re
+import json
+import time
+import hashlib
+import queue
+import random
+import ftplib
+import threading
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from urllib.parse import urlsplit, unquote
+from utils import data_path, load_json
+import order_index
+import packaging
+import xml_export
+from xml_export import ValidationError
+from asset_store import is_ref
+
+ACCOUNTS_FILE = 'upload_accounts.json'
+BLOCK_SIZE    = 256 * 1024
+PART_SUFFIX   = '.part'
+# Kennung der Quelle eines Teilstands, liegt neben <name>.part
+ID_SUFFIX     = '.id'
+BACKOFF_BASE  = 2.0
+BACKOFF_MAX   = 120.0
+# FTP-Verbindungen nach so vielen Sekunden Leerlauf vor Wiederverwendung prüfen
+IDLE_CHECK    = 60.0
+
+EAN_PREFIX = re.compile(r'^(\d{13})')
+
+
+class UploadError(Exception):
+    pass
+
+
+def stream_id(order, xml_data):
+    """
+    Identifier of the ZIP stream of an order: SHA-256 over the XML (with its
+    SentDate/SentTime) and the assets in archive order (store refs as they are,
+    files by path, size and mtime). Equal ids give the same bytes.
+    """
+    h = hashlib.sha256(xml_data)
+    assets = order.get('Assets', {})
+    for key, arcname in packaging.zip_layout(order):
+        value = '' if key == 'xml' else assets.get(key) or ''
+        if value and not is_ref(value):
+            st = os.stat(value)
+            value = f'{os.path.abspath(value)}:{st.st_size}:{st.st_mtime_ns}'
+        h.update(f'\0{arcname}\0{value}'.encode())
+    return h.hexdigest().encode()
+
+
+def file_id(path):
+    """Identifier of a local file for upload_file: SHA-256 of its content."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(packaging.CHUNK_SIZE), b''):
+            h.update(block)
+    return f'sha256:{h.hexdigest()}'.encode()
+
+
+def load_account(name, path=None):
+    """
+    Return the settings dict of an account from upload_accounts.json.
+    """
+    path = path or data_path(ACCOUNTS_FILE)
+    try:
+        with open(path, encoding='utf-8') as f:
+            accounts = json.load(f)
+    except FileNotFoundError:
+        raise UploadError(f'Keine Upload-Konten definiert ({path})')
+    if name not in accounts:
+        raise UploadError(f'Upload-Konto "{name}" nicht in {path}')
+    return accounts[name]
+
+
+class RateLimit:
+    """Shared bandwidth cap (bytes/s) for all connections of one account."""
+
+    def __init__(self, rate):
+        self.rate  = rate
+        self._next = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            # bis zu 0,5 s Vorlauf erlauben, sonst bremsen
+            self._next = max(self._next, now - 0.5) + n / self.rate
+            wait = self._next - now
+        if wait > 0:
+            time.sleep(wait)
+
+
+# ---------- Verbindungen ----------
+class _FTPConnection:
+    def __init__(self, target, tls=False):
+        cls = ftplib.FTP_TLS if tls else ftplib.FTP
+        self.ftp = cls()
+        self.ftp.connect(target.hostname, target.port or 21, timeout=60)
+        self.ftp.login(unquote(target.username or 'anonymous'), target.password_value or '')
+        if tls:
+            self.ftp.prot_p()
+        self.ftp.voidcmd('TYPE I')
+        if target.path.strip('/'):
+            self.ftp.cwd(target.path)
+        self.last_used = time.monotonic()
+
+    def size(self, name):
+        try:
+            return self.ftp.size(name)
+        except ftplib.error_perm:
+            return None
+
+    def put_stream(self, name, offset, produce):
+        # wie storbinary, aber die Daten liefert produce(write)
+        with self.ftp.transfercmd(f'STOR {name}', offset or None) as sock:
+            produce(sock.sendall)
+            if hasattr(sock, 'unwrap'):
+                sock.unwrap()
+        self.ftp.voidresp()
+
+    def read(self, name):
+        buf = io.BytesIO()
+        try:
+            self.ftp.retrbinary(f'RETR {name}', buf.write)
+        except ftplib.error_perm:
+            return None
+        return buf.getvalue()
+
+    def delete(self, name):
+        try:
+            self.ftp.delete(name)
+        except ftplib.error_perm:
+            pass
+
+    def rename(self, src, dst):
+        self.delete(dst)
+        self.ftp.rename(src, dst)
+
+    def alive(self):
+        if time.monotonic() - self.last_used < IDLE_CHECK:
+            return True
+        try:
+            self.ftp.voidcmd('NOOP')
+            return True
+        except (OSError, EOFError, ftplib.Error):
+            return False
+
+    def close(self):
+        try:
+            self.ftp.quit()
+        except (OSError, EOFError, ftplib.Error):
+            self.ftp.close()
+
+
+class _SFTPConnection:
+    def __init__(self, target):
+        try:
+            import paramiko
+        except ImportError:
+            raise UploadError('SFTP-Upload benötigt das Paket paramiko (pip install paramiko)')
+        try:
+            self.transport = paramiko.Transport((target.hostname, target.port or 22))
+            pkey = None
+            if target.key:
+                pkey = paramiko.RSAKey.from_private_key_file(target.key)
+            self.transport.connect(username=unquote(target.username or ''),
+                                   password=target.password_value, pkey=pkey)
+            self.sftp = paramiko.SFTPClient.from_transport(self.transport)
+        except paramiko.SSHException as e:
+            raise UploadError(f'SFTP-Verbindung fehlgeschlagen: {e}')
+        if target.path.strip('/'):
+            self.sftp.chdir(target.path)
+        self.last_used = time.monotonic()
+
+    def size(self, name):
+        try:
+            return self.sftp.stat(name).st_size
+        except IOError:
+            return None
+
+    def put_stream(self, name, offset, produce):
+        with self.sftp.open(name, 'ab' if offset else 'wb') as f:
+            f.set_pipelined(True)
+            produce(f.write)
+
+    def read(self, name):
+        try:
+            with self.sftp.open(name, 'rb') as f:
+                return f.read()
+        except IOError:
+            return None
+
+    def delete(self, name):
+        try:
+            self.sftp.remove(name)
+        except IOError:
+            pass
+
+    def rename(self, src, dst):
+        self.sftp.posix_rename(src, dst)
+
+    def alive(self):
+        return self.transport.is_active()
+
+    def close(self):
+        self.sftp.close()
+        self.transport.close()
+
+
+class _FileConnection:
+    def __init__(self, target):
+        self.root = unquote(target.path)
+        if target.hostname:
+            # file://server/share/… → UNC-Pfad
+            self.root = f'//{target.hostname}{self.root}'
+        os.makedirs(self.root, exist_ok=True)
+
+    def size(self, name):
+        try:
+            return os.path.getsize(os.path.join(self.root, name))
+        except OSError:
+            return None
+
+    def put_stream(self, name, offset, produce):
+        with open(os.path.join(self.root, name), 'r+b' if offset else 'wb') as f:
+            f.seek(offset)
+            f.truncate()
+            produce(f.write)
+
+    def read(self, name):
+        try:
+            with open(os.path.join(self.root, name), 'rb') as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def delete(self, name):
+        try:
+            os.remove(os.path.join(self.root, name))
+        except FileNotFoundError:
+            pass
+
+    def rename(self, src, dst):
+        os.replace(os.path.join(self.root, src), os.path.join(self.root, dst))
+
+    def alive(self):
+        return True
+
+    def close(self):
+        pass
+
+
+class Target:
+    """Parsed upload URL plus credentials."""
+
+    def __init__(self, url, password=None, key=None):
+        parts = urlsplit(url)
+        if parts.scheme not in ('ftp', 'ftps', 'sftp', 'file'):
+            raise UploadError(f'Nicht unterstütztes Upload-Ziel: {url}')
+        self.url      = url
+        self.scheme   = parts.scheme
+        self.hostname = parts.hostname
+        self.port     = parts.port
+        self.username = parts.username
+        self.password_value = password or (unquote(parts.password) if parts.password else None) \
+            or os.environ.get('ONIX_UPLOAD_PASSWORD')
+        self.path = parts.path or '/'
+        self.key  = key
+
+    def connect(self):
+        if self.scheme == 'ftp':
+            return _FTPConnection(self)
+        if self.scheme == 'ftps':
+            return _FTPConnection(self, tls=True)
+        if self.scheme == 'sftp':
+            return _SFTPConnection(self)
+        return _FileConnection(self)
+
+    def __str__(self):
+        # ohne Passwort für Log und Historie
+        host = f'{self.hostname}:{self.port}' if self.port else (self.hostname or '')
+        user = f'{self.username}@' if self.username else ''
+        return f'{self.scheme}://{user}{host}{self.path}'
+
+
+class ConnectionPool:
+    """At most `size` persistent connections to one target, reused across files."""
+
+    def __init__(self, target, size=4):
+        self.target = target
+        self.size   = size
+        self._idle  = queue.LifoQueue()
+        self._count = 0
+        self._lock  = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        conn = self._get()
+        try:
+            yield conn
+        except BaseException:
+            # kaputte Verbindung verwerfen, der nächste Versuch baut neu auf
+            self._discard(conn)
+            raise
+        conn.last_used = time.monotonic()
+        self._idle.put(conn)
+
+    def _get(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                with self._lock:
+                    create = self._count < self.size
+                    if create:
+                        self._count += 1
+                if create:
+                    try:
+                        return self.target.connect()
+                    except BaseException:
+                        with self._lock:
+                            self._count -= 1
+                        raise
+                conn = self._idle.get()
+            if conn.alive():
+                return conn
+            self._discard(conn)
+
+    def _discard(self, conn):
+        with self._lock:
+            self._count -= 1
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            self._discard(conn)
+
+
+RETRY_ERRORS = (OSError, EOFError, ftplib.Error, UploadError)
+
+
+class _StreamSink:
+    """
+    write() target for packaging.stream_zip. The archive is deterministic, so a
+    resumed attempt regenerates the same stream and only skips the bytes that
+    are already on the server; every byte also goes to the optional local copy.
+    Once the connection failed, nothing more is sent: ZipFile would still write
+    the data descriptor and directory of the aborted archive while unwinding.
+    """
+
+    def __init__(self, skip=0, tee=None, limit=None):
+        self.target = None
+        self.skip   = skip
+        self.tee    = tee
+        self.limit  = limit
+        self.total  = 0
+        self.broken = False
+
+    def write(self, data):
+        n = len(data)
+        if self.broken:
+            return n
+        self.total += n
+        if self.tee:
+            self.tee.write(data)
+        if self.skip:
+            cut = min(self.skip, n)
+            self.skip -= cut
+            data = memoryview(data)[cut:]
+        if len(data):
+            try:
+                self.target(data)
+            except BaseException:
+                self.broken = True
+                raise
+            if self.limit:
+                self.limit.consume(len(data))
+        return n
+
+
+class Uploader:
+    def __init__(self, target, connections=4, limit_kbps=0, retries=5, log=print):
+        """
+        target: Target or URL.
+        connections: parallel uploads / pooled connections for this account.
+        limit_kbps: bandwidth cap in KB/s for all connections together (0 = none).
+        retries: attempts per file after the first failure.
+        """
+        self.target  = target if isinstance(target, Target) else Target(target)
+        self.pool    = ConnectionPool(self.target, connections)
+        self.limit   = RateLimit(limit_kbps * 1024)
+        self.retries = retries
+        self.log     = log
+
+    @classmethod
+    def for_account(cls, name, path=None, log=print):
+        acc = load_account(name, path)
+        target = Target(acc['url'], password=acc.get('password'), key=acc.get('key'))
+        return cls(target, connections=acc.get('connections', 4),
+                   limit_kbps=acc.get('limit_kbps', 0), retries=acc.get('retries', 5), log=log)
+
+    def _file_producer(self, fp):
+        def produce(write):
+            for block in iter(lambda: fp.read(BLOCK_SIZE), b''):
+                write(block)
+                self.limit.consume(len(block))
+        return produce
+
+    def _retry(self, name, attempt, error):
+        if attempt == self.retries:
+            raise error
+        delay = min(BACKOFF_MAX, BACKOFF_BASE * 2 ** attempt) * random.uniform(0.5, 1.0)
+        self.log(f'{name}: {error} – neuer Versuch in {delay:.0f}s')
+        time.sleep(delay)
+
+    def _resume_offset(self, conn, part, ident, keep=True):
+        """
+        Bytes of part on the server that belong to the source ident and may be
+        kept. Any other part (earlier build, other file) is deleted and the
+        new ident written before the first byte, so the next attempt can resume.
+        """
+        offset = conn.size(part) or 0
+        if keep and offset and conn.read(part + ID_SUFFIX) == ident:
+            return offset
+        conn.delete(part)
+        conn.put_stream(part + ID_SUFFIX, 0, lambda write: write(ident))
+        return 0
+
+    def upload_file(self, path):
+        """
+        Upload one file with resume and retries.
+
+        Returns:
+            str: 'uploaded', 'resumed' or 'present' (same content already on the
+            server, by the <name>.id of an earlier upload_file).
+        Raises:
+            the last error once all retries failed.
+        """
+        name = os.path.basename(path)
+        part = name + PART_SUFFIX
+        size = os.path.getsize(path)
+        # Teilstand fortsetzen bzw. Upload überspringen nur bei genau diesem Inhalt
+        ident = file_id(path)
+        for attempt in range(self.retries + 1):
+            try:
+                with self.pool.connection() as conn:
+                    if conn.size(name) == size and conn.read(name + ID_SUFFIX) == ident:
+                        return 'present'
+                    offset = self._resume_offset(conn, part, ident)
+                    if offset > size:
+                        offset = self._resume_offset(conn, part, ident, keep=False)
+                    with open(path, 'rb') as f:
+                        f.seek(offset)
+                        conn.put_stream(part, offset, self._file_producer(f))
+                    remote = conn.size(part)
+                    if remote != size:
+                        # Teilstand unbrauchbar: nächster Versuch beginnt von vorn
+                        conn.delete(part)
+                        raise UploadError(f'{part}: {remote} statt {size} Bytes auf dem Server')
+                    # alte Kennung zuerst weg: ein Abbruch dazwischen heißt nur erneut hochladen
+                    conn.delete(name + ID_SUFFIX)
+                    conn.rename(part, name)
+                    conn.rename(part + ID_SUFFIX, name + ID_SUFFIX)
+                return 'resumed' if offset else 'uploaded'
+            except RETRY_ERRORS as e:
+                self._retry(name, attempt, e)
+
+    def push_order(self, order, xml_data, local_dir=None, store=None):
+        """
+        Stream the ZIP of a validated order into the upload connection, with
+        resume and retries like upload_file; no local archive is written.
+
+        Args:
+            local_dir (str): Optional folder for a local copy of the same stream.
+
+        Returns:
+            list: Manifest entries (name, size, crc32, sha256, md5) per member.
+        """
+        name  = f'{xml_export.order_ean(order)}_MasteringOrder.zip'
+        part  = name + PART_SUFFIX
+        local = os.path.join(local_dir, name) if local_dir else None
+        # nur ein Teilstand aus genau diesem Stream darf fortgesetzt werden
+        ident = stream_id(order, xml_data)
+        restart = False
+        for attempt in range(self.retries + 1):
+            tee = sink = None
+            try:
+                with self.pool.connection() as conn:
+                    offset = self._resume_offset(conn, part, ident, keep=not restart)
+                    tee = open(local + PART_SUFFIX, 'wb') if local else None
+                    sink = _StreamSink(offset, tee, self.limit)
+                    members = []
+
+                    def produce(write):
+                        sink.target = write
+                        members.extend(packaging.stream_zip(sink.write, order, xml_data, store))
+
+                    conn.put_stream(part, offset, produce)
+                    remote = conn.size(part)
+                    if remote != sink.total:
+                        # alter Teilstand passt nicht zum neuen Stream → neu beginnen
+                        restart = True
+                        raise UploadError(f'{part}: {remote} statt {sink.total} Bytes auf dem Server')
+                    # Kennung eines früheren upload_file gilt nicht für den neuen Inhalt
+                    conn.delete(name + ID_SUFFIX)
+                    conn.rename(part, name)
+                    conn.delete(part + ID_SUFFIX)
+            except RETRY_ERRORS as e:
+                if tee:
+                    tee.close()
+                if sink is not None and not sink.broken:
+                    # Fehler beim Erzeugen (z.B. Asset nicht lesbar): der Teilstand kann
+                    # Abschlussdaten des abgebrochenen Archivs enthalten → neu beginnen
+                    restart = True
+                self._retry(name, attempt, e)
+                continue
+            if tee:
+                tee.close()
+                os.replace(local + PART_SUFFIX, local)
+                packaging.save_manifest(local, order, members, 'streamed', self.log)
+            try:
+                order_index.record_history(xml_export.order_ean(order), 'upload',
+                                           f'{self.target}/{name}', {'members': members})
+            except Exception as e:
+                self.log(f'Historie nicht aktualisiert: {e}')
+            return members
+
+    def push_orders(self, orders, wgs_codes=None, local_dir=None, store=None):
+        """
+        Validate, build and stream-upload orders in parallel.
+
+        Returns:
+            dict: {EAN: 'uploaded' or 'FEHLER: ...'}.
+        """
+        wgs_codes = wgs_codes if wgs_codes is not None else load_json('warengruppe_codes.json')
+        if local_dir:
+            os.makedirs(local_dir, exist_ok=True)
+
+        def push(order):
+            now = datetime.now()
+            hdr = order['Header']
+            order = order.replace(Header=hdr.replace(
+                SentDate=hdr.SentDate or now.strftime('%Y%m%d'),
+                SentTime=hdr.SentTime or now.strftime('%H:%M'),
+            ))
+            xml_export.validate_order(order, wgs_codes)
+            packaging.validate_assets(order, store)
+            xml_data = xml_export.order_xml(order, wgs_codes)
+            self.push_order(order, xml_data, local_dir, store)
+            return 'uploaded'
+
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.pool.size) as ex:
+            futures = [(ex.submit(push, o), xml_export.order_ean(o) or '?') for o in orders]
+            for fut, ean in futures:
+                try:
+                    results[ean] = fut.result()
+                except ValidationError as e:
+                    results[ean] = f'FEHLER: {e.message}'
+                except Exception as e:
+                    results[ean] = f'FEHLER: {e}'
+                self.log(f'{ean}: {results[ean]}')
+        return results
+
+    def _record(self, path, result):
+        m = EAN_PREFIX.match(os.path.basename(path))
+        if not m:
+            return
+        try:
+            order_index.record_history(m.group(1), 'upload', f'{self.target}/{os.path.basename(path)}',
+                                       {'result': result, 'source': path})
+        except Exception as e:
+            self.log(f'Historie nicht aktualisiert: {e}')
+
+    def upload(self, paths):
+        """
+        Upload files in parallel (one pooled connection each).
+
+        Returns:
+            dict: {path: result or 'FEHLER: ...'}.
+        """
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.pool.size) as ex:
+            futures = {ex.submit(self.upload_file, p): p for p in paths}
+            for fut, path in futures.items():
+                try:
+                    results[path] = fut.result()
+                    self._record(path, results[path])
+                    self.log(f'{os.path.basename(path)}: {results[path]}')
+                except Exception as e:
+                    results[path] = f'FEHLER: {e}'
+                    self.log(f'{os.path.basename(path)}: {results[path]}')
+        return results
+
+    def close(self):
+        self.pool.close()
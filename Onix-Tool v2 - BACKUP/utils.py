@@ -15,6 +15,14 @@ else:
     # läuft als normales Script
     BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 
+# DATA_DIR für persistente Daten (Suchindex, Caches). Beim EXE neben der .exe,
+# weil _MEIPASS nach dem Beenden gelöscht wird; per ONIX_TOOL_DATA überschreibbar
+if getattr(sys, 'frozen', False):
+    DATA_DIR = os.path.dirname(sys.executable)
+else:
+    DATA_DIR = BASE_DIR
+DATA_DIR = os.environ.get('ONIX_TOOL_DATA', DATA_DIR)
+
 
 def load_json(filename):
     """
@@ -29,3 +37,17 @@ def load_json(filename):
     path = os.path.join(BASE_DIR, filename)
     with open(path, encoding='utf-8') as f:
         return json.load(f)
+
+
+def data_path(filename):
+    """
+    Return the path of a persistent data file (index, cache) in DATA_DIR.
+
+    Args:
+        filename (str): Name of the data file (e.g., 'order_index.db').
+
+    Returns:
+        str: Absolute path inside DATA_DIR.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
@@ -0,0 +1,165 @@
+# xhtml_blurb.py
+"""
+Rich-text blurbs of the BoD MasteringOrder Generator. A blurb without markup is
+plain text as before; a blurb with tags is XHTML restricted to the EDItEUR
+subset of ONIX_XHTML_Subset.xsd.
+
+sanitize() turns pasted HTML (shop exports, word processors) into that subset:
+the fragment is read with the lenient lxml HTML parser, elements outside the
+subset are unwrapped (script/style dropped with their content), attributes are
+kept only where the XSD allows them (without event handlers, style and id), and
+the result is written back as XML. problem() checks length and, for markup,
+validates the fragment against the XSD. The allowed elements/attributes and
+the compiled schema are read once per process and kept, so a batch checks
+thousands of blurbs per minute. The XHTML travels as the text of <Blurb>.
+Place this file in the project root next to main.py.
+"""
+import os
+import re
+from lxml import etree, html
+from utils import BASE_DIR
+
+XSD_FILE = 'ONIX_XHTML_Subset.xsd'
+# Höchstlänge der Beschreibung in Zeichen (bei XHTML samt Markup)
+MAX_LENGTH = 4000
+
+_XS = '{http://www.w3.org/2001/XMLSchema}'
+_TAG = re.compile(r'<!--|</?([A-Za-z][A-Za-z0-9]*)[\s/>:]')
+# Inhalt wird mit entfernt, nicht nur das Element
+_DROP_CONTENT = {'script', 'style', 'head', 'title', 'object', 'iframe', 'noscript', 'template'}
+# übliche HTML-Elemente außerhalb der Teilmenge, die ausgepackt werden
+_HTML = {'html', 'body', 'font', 'u', 's', 'strike', 'center', 'section', 'article', 'header',
+         'footer', 'main', 'nav', 'aside', 'figure', 'figcaption', 'mark', 'meta', 'link', 'o'}
+# laut XSD erlaubt, aber für Beschreibungen unerwünscht (Verhalten, Layout, eindeutige IDs)
+_DROP_ATTRS = {'style', 'id'}
+# Elemente, zwischen deren Text im Klartext ein Leerzeichen steht
+_BREAKS = {'p', 'div', 'br', 'li', 'dt', 'dd', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'blockquote',
+           'pre', 'address', 'hr', 'tr', 'td', 'th', 'caption'}
+
+_subset = None
+_schema = None
+
+
+def is_markup(text):
+    """
+    True if the blurb contains HTML tags (is treated as XHTML); "<Titel folgt>"
+    and other angle brackets in plain text do not count.
+    """
+    for m in _TAG.finditer(text or ''):
+        name = (m.group(1) or '').lower()
+        if not name or name in _HTML or name in _DROP_CONTENT or name in subset():
+            return True
+    return False
+
+
+def _attr_names(node, groups, seen=()):
+    names = set()
+    for el in node.iter(_XS + 'attribute', _XS + 'attributeGroup'):
+        if el.tag == _XS + 'attribute':
+            names.add(el.get('name') or el.get('ref'))
+        elif el.get('ref') and el.get('ref') not in seen:
+            group = groups.get(el.get('ref'))
+            if group is not None:
+                names |= _attr_names(group, groups, seen + (el.get('ref'),))
+    return names
+
+
+def subset():
+    """
+    {element: allowed attributes} of the XHTML subset, read from the XSD once.
+    Abstract substitution heads (block, inline, …) are left out.
+    """
+    global _subset
+    if _subset is None:
+        root = etree.parse(os.path.join(BASE_DIR, XSD_FILE)).getroot()
+        groups = {g.get('name'): g for g in root.findall(_XS + 'attributeGroup')}
+        _subset = {
+            el.get('name'): frozenset(n for n in _attr_names(el, groups)
+                                      if n not in _DROP_ATTRS and not n.startswith('on'))
+            for el in root.findall(_XS + 'element') if el.get('abstract') != 'true'
+        }
+    return _subset
+
+
+def schema():
+    """Compiled XMLSchema with a <Blurb> root of the XSD's Flow content (compiled once)."""
+    global _schema
+    if _schema is None:
+        location = 'file:' + os.path.join(BASE_DIR, XSD_FILE).replace(os.sep, '/')
+        doc = etree.fromstring(
+            '<xs:schema xmlns:xs="http://www.w3.org/2001/XMLSchema" elementFormDefault="qualified">'
+            f'<xs:include schemaLocation="{location}"/>'
+            '<xs:element name="Blurb" type="Flow"/></xs:schema>'
+        )
+        _schema = etree.XMLSchema(doc)
+    return _schema
+
+
+def _clean(parent, allowed):
+    for el in list(parent):
+        if not isinstance(el.tag, str):
+            # Kommentare, Verarbeitungsanweisungen
+            el.drop_tree()
+            continue
+        tag = el.tag.lower()
+        if tag in _DROP_CONTENT:
+            el.drop_tree()
+            continue
+        _clean(el, allowed)
+        if tag not in allowed:
+            # Element entfernen, Text behalten (font, u, center, …)
+            el.drop_tag()
+            continue
+        el.tag = tag
+        for name in list(el.attrib):
+            value = el.attrib[name]
+            if name not in allowed[tag] or value.strip().lower().startswith(('javascript:', 'data:')):
+                del el.attrib[name]
+
+
+def sanitize(text):
+    """
+    The blurb reduced to the XHTML subset; plain text is returned unchanged.
+    """
+    text = text or ''
+    if not is_markup(text):
+        return text
+    wrapper = html.fragment_fromstring(text.strip(), create_parent='div')
+    _clean(wrapper, subset())
+    out = etree.tostring(wrapper, encoding='unicode', method='xml', with_tail=False)
+    # <div>…</div> des Parsers wieder abnehmen
+    return out[out.index('>') + 1:out.rindex('<')].strip() if out.endswith('</div>') else ''
+
+
+def plain_text(text):
+    """The words of the blurb without markup (for the search index); plain text unchanged."""
+    text = text or ''
+    if not is_markup(text):
+        return text
+    wrapper = html.fragment_fromstring(text.strip(), create_parent='div')
+    for el in wrapper.iter():
+        if isinstance(el.tag, str) and el.tag.lower() in _BREAKS:
+            el.text = ' ' + (el.text or '')
+            el.tail = ' ' + (el.tail or '')
+    return ' '.join(wrapper.text_content().split())
+
+
+def problem(text):
+    """
+    Message for a blurb that is too long or not valid XHTML of the subset,
+    None if it is fine.
+    """
+    text = text or ''
+    if len(text) > MAX_LENGTH:
+        return f'Die Beschreibung ist {len(text)} Zeichen lang (höchstens {MAX_LENGTH}).'
+    if not is_markup(text):
+        return None
+    try:
+        doc = etree.fromstring(f'<Blurb>{text}</Blurb>')
+    except etree.XMLSyntaxError as e:
+        return f'Die Beschreibung ist kein gültiges XHTML: {e}'
+    xsd = schema()
+    if not xsd.validate(doc):
+        err = xsd.error_log.last_error
+        return f'Die Beschreibung entspricht nicht dem ONIX-XHTML: {err.message}'
+    return None
@@ -1,12 +1,23 @@
 """
 Module to export the BoD MasteringOrder data to XML and (optionally) ZIP archive.
+The GUI path collects the tab values into an immutable order (collect_order,
+see order_model); validate_order and order_xml/build_tree work on that order only,
+so batch runs share them; the element order comes from the tables in order_schema.
 Place this file in the project root next to main.py.
 """
+import os
 import zipfile
-import math
 from datetime import datetime
-from tkinter import filedialog, messagebox, Text
+from tkinter import filedialog, messagebox
 from lxml import etree
+import codelists
+import authority
+import order_index
+import xhtml_blurb
+import order_schema
+import order_model
+# Feldtabellen liegen in order_schema (gemeinsam mit Import und Text-Emitter)
+from order_schema import HEADER_TAGS
 
 # Pflichtfelder für Product-Tab (ohne EAN)
 REQUIRED_PRODUCT = [
@@ -19,232 +30,218 @@ REQUIRED_HEADER = [
     'FromCompany','FromCompanyNumber','SentDate','SentTime','FromEmail'
 ]
 
+class ValidationError(Exception):
+    """
+    Raised by validate_order; title/message are shown as-is in the error dialog.
+    """
+    def __init__(self, title, message):
+        super().__init__(message)
+        self.title = title
+        self.message = message
 
-def export_xml(header_tab, product_tab, contributor_tab, classification_tab,
-               pricing_tab, international_tab, ebook_tab,
-               filename=None, mode='Upload'):
+
+def collect_order(header_tab, product_tab, contributor_tab, classification_tab,
+                  pricing_tab, international_tab, ebook_tab, mode='Upload'):
     """
-    Collect all data from the tab instances and write a BoD XML file.
-    Performs validation of required fields per tab.
-    mode: 'Upload' (vollständig) oder 'AddIntlDistribution' (nur International).
+    Collect all tab values into one order_model.Order.
+    """
+    product = product_tab.get_ordered_data()
+    product['EAN'] = product_tab.widgets['EAN'].get().strip()
+    international = international_tab.get_data()
+    international['Enabled'] = international_tab.is_enabled()
+    international['Prices'] = international_tab.get_prices()
+    ebook = ebook_tab.get_data()
+    ebook['Enabled'] = ebook_tab.is_enabled()
+    return order_model.from_dict({
+        'MasteringType':  mode,
+        'Header':         header_tab.get_data(),
+        'Product':        product,
+        'Contributors':   contributor_tab.get_data(),
+        'Classification': classification_tab.get_selected(),
+        'Price':          pricing_tab.get_price_eur(),
+        'International':  international,
+        'EBook':          ebook,
+    })
+
+
+def order_ean(order):
+    """
+    Return the EAN that names the order files ({EAN}_MasteringOrder.xml/.zip).
+    """
+    mode = order.get('MasteringType', 'Upload')
+    if mode == 'AddEBook':
+        return order.get('EBook', {}).get('PrintedEAN', '').strip()
+    if mode == 'AddIntlDistribution':
+        return order.get('International', {}).get('EAN', '').strip()
+    return order.get('Product', {}).get('EAN', '').strip()
+
+
+def _is_ean(val):
+    return val.isdigit() and len(val) == 13
+
+
+def _control_char_field(value, path=''):
+    # erstes Feld mit einem in XML verbotenen Steuerzeichen (z. B. \x0b aus Excel)
+    if isinstance(value, str):
+        return path if order_schema._INVALID.search(value) else None
+    if isinstance(value, order_model._Record):
+        items = ((name, getattr(value, name)) for name in value._NAMES)
+    elif hasattr(value, 'items'):
+        items = value.items()
+    elif isinstance(value, (list, tuple)):
+        items = ((f'[{i}]', v) for i, v in enumerate(value, 1))
+    else:
+        return None
+    for key, v in items:
+        found = _control_char_field(v, key if not path else
+                                    f'{path}{key}' if key.startswith('[') else f'{path}.{key}')
+        if found:
+            return found
+    return None
+
+
+def validate_order(order, wgs_codes):
     """
+    Check required fields and formats of an order (order_model.Order).
+    wgs_codes: dict from warengruppe_codes.json (needed for the age group rule).
+    Raises ValidationError with the message for the first problem found.
+    """
+    mode     = order.get('MasteringType', 'Upload')
+    hdr_data = order.get('Header', {})
+
+    # Steuerzeichen würden erst beim Schreiben des XML scheitern
+    field = _control_char_field(order)
+    if field:
+        raise ValidationError(
+            'Ungültiges Zeichen',
+            f'{field} enthält ein Steuerzeichen (z. B. Zeilenumbruch aus Excel), '
+            'das im XML nicht erlaubt ist.'
+        )
+
     # -- HEADER VALIDATION --
-    hdr_data = header_tab.get_data()
     missing_hdr = [k for k in REQUIRED_HEADER if not hdr_data.get(k)]
     if missing_hdr:
-        messagebox.showerror(
+        raise ValidationError(
             'Pflichtfeld fehlt',
             f'Bitte im Header-Tab ausfüllen: {", ".join(missing_hdr)}'
         )
-        return
     # Format-Validation SentDate YYYYMMDD
     try:
         datetime.strptime(hdr_data.get('SentDate',''), '%Y%m%d')
     except Exception:
-        messagebox.showerror(
+        raise ValidationError(
             'Ungültiges Format',
             'SentDate muss im Format YYYYMMDD vorliegen.'
         )
-        return
     # Format-Validation SentTime HH:MM
     try:
         datetime.strptime(hdr_data.get('SentTime',''), '%H:%M')
     except Exception:
-        messagebox.showerror(
+        raise ValidationError(
             'Ungültiges Format',
             'SentTime muss im Format HH:MM vorliegen.'
         )
-        return
 
-    # --- neuer AddEBook-Branch ---
+    # --- AddEBook ---
     if mode == 'AddEBook':
+        data = order.get('EBook', {})
         # Printed Book EAN prüfen
-        data = ebook_tab.get_data()
-        printed_ean = data.get('PrintedEAN','')
-        if not (printed_ean.isdigit() and len(printed_ean)==13):
-            messagebox.showerror(
+        if not _is_ean(data.get('PrintedEAN','')):
+            raise ValidationError(
                 'Ungültige EAN',
                 'Bitte eine gültige 13-stellige EAN des gedruckten Buchs eingeben.'
             )
-            return
-
         # E-Book EAN prüfen
-        ebook_ean = data.get('EAN','')
-        if not (ebook_ean.isdigit() and len(ebook_ean)==13):
-            messagebox.showerror(
+        if not _is_ean(data.get('EAN','')):
+            raise ValidationError(
                 'Ungültige EAN',
                 'Bitte eine gültige 13-stellige EAN für das E-Book eingeben.'
             )
-            return
-
         # E-Book-Preis prüfen
-        price = data.get('Price','')
-        if not price:
-            messagebox.showerror(
+        if not data.get('Price',''):
+            raise ValidationError(
                 'Pflichtfeld fehlt',
                 'Bitte einen Preis im E-Book-Tab auswählen.'
             )
-            return
-
-        # XML bauen
-        root    = etree.Element('BoD')
-        hdr_el  = etree.SubElement(root, 'Header')
-        for tag in ['FromCompany','FromCompanyNumber','SentDate','SentTime','FromPerson','FromEmail']:
-            val = hdr_data.get(tag)
-            if val:
-                el = etree.SubElement(hdr_el, tag)
-                el.text = val
-
-        mo      = etree.SubElement(root, 'MasteringOrder')
-        prod_el = etree.SubElement(mo, 'Product')
-        etree.SubElement(prod_el, 'MasteringType').text = 'AddEBook'
-        etree.SubElement(prod_el, 'EAN').text          = printed_ean
-
-        eb      = etree.SubElement(prod_el, 'EBook')
-        # EBook-EAN mit Attribut
-        etree.SubElement(eb, 'EAN', EBookFileType=data['EBookFileType']).text = ebook_ean
-        etree.SubElement(eb, 'Conversion').text    = data['Conversion']
-        etree.SubElement(eb, 'EBookFileType').text = data['EBookFileType']
-        ebp = etree.SubElement(eb, 'Price')
-        etree.SubElement(ebp, 'PriceValue').text    = price
-        etree.SubElement(ebp, 'PriceCurrency').text = 'EUR'
-
-        # XML speichern unter PrintedEAN_MasteringOrder.xml
-        if filename:
-            fn = filename
-        else:
-            fn = filedialog.asksaveasfilename(
-                defaultextension='.xml',
-                filetypes=[('XML','*.xml')],
-                initialfile=f"{printed_ean}_MasteringOrder.xml"
-            )
-        if not fn:
-            return
-        etree.ElementTree(root).write(fn, xml_declaration=True,
-                                     encoding='UTF-8', pretty_print=True)
-        return fn
-
-    # -------------------------------------------------------------------
-    # AddIntlDistribution-Modus: nur International
+        return
+
+    # --- AddIntlDistribution: nur International ---
     if mode == 'AddIntlDistribution':
+        intl = order.get('International', {})
         # EAN im International-Tab prüfen
-        intl_data = international_tab.get_data()
-        intl_ean  = intl_data.get('EAN','').strip()
-        if not (intl_ean.isdigit() and len(intl_ean)==13):
-            messagebox.showerror(
+        if not _is_ean(intl.get('EAN','').strip()):
+            raise ValidationError(
                 'Ungültige EAN',
                 'Bitte eine gültige 13-stellige EAN im International-Tab eingeben.'
             )
-            return
-
         # Preise prüfen
-        prices = international_tab.get_prices()
+        prices = intl.get('Prices', {})
         missing_intl = [c for c in ['USD','GBP','AUD'] if not prices.get(c)]
         if missing_intl:
-            messagebox.showerror(
+            raise ValidationError(
                 'Pflichtfeld fehlt',
                 f'Bitte Preise eingeben: {", ".join(missing_intl)}'
             )
-            return
-
-        # XML bauen
-        root    = etree.Element('BoD')
-        hdr_el  = etree.SubElement(root, 'Header')
-        for tag in ['FromCompany','FromCompanyNumber','SentDate','SentTime','FromPerson','FromEmail']:
-            val = hdr_data.get(tag)
-            if val:
-                el = etree.SubElement(hdr_el, tag)
-                el.text = val
-
-        mo      = etree.SubElement(root, 'MasteringOrder')
-        prod_el = etree.SubElement(mo, 'Product')
-        etree.SubElement(prod_el, 'MasteringType').text = 'AddIntlDistribution'
-        etree.SubElement(prod_el, 'EAN').text          = intl_ean
-
-        # Price-Blöcke
-        for cur in ['USD','GBP','AUD']:
-            p = etree.SubElement(prod_el, 'Price')
-            etree.SubElement(p, 'PriceValue').text    = prices[cur]
-            etree.SubElement(p, 'PriceCurrency').text = cur
-
-        # XML speichern
-        if filename:
-            fn = filename
-        else:
-            fn = filedialog.asksaveasfilename(
-                defaultextension='.xml', filetypes=[('XML','*.xml')],
-                initialfile=f"{intl_ean}_MasteringOrder.xml"
-            )
-        if not fn:
-            return
-        etree.ElementTree(root).write(
-            fn, xml_declaration=True,
-            encoding='UTF-8', pretty_print=True
-        )
-        return fn
+        return
 
-    # -------------------------------------------------------------------
-    # Upload-Modus: bestehender, kompletter Ablauf
+    # --- Upload ---
+    prod_data = order.get('Product', {})
 
     # -- PRODUCT-EAN VALIDATION --
-    prod_ean = product_tab.widgets['EAN'].get().strip()
-    if not (prod_ean.isdigit() and len(prod_ean) == 13):
-        messagebox.showerror(
+    prod_ean = prod_data.get('EAN','').strip()
+    if not _is_ean(prod_ean):
+        raise ValidationError(
             'Ungültige EAN',
             'Bitte geben Sie eine gültige 13-stellige Produkt-EAN im Product-Tab ein.'
         )
-        return
 
     # -- CONTRIBUTOR VALIDATION --
-    contribs = contributor_tab.get_data()
-    if not contribs:
-        messagebox.showerror(
+    if not order.get('Contributors'):
+        raise ValidationError(
             'Pflichtfeld fehlt',
             'Bitte mindestens einen Contributor im Contributor-Tab hinzufügen.'
         )
-        return
+    for c in order.get('Contributors'):
+        problems = authority.id_problems(c)
+        if problems:
+            raise ValidationError(
+                'Ungültige Kennung',
+                f"{c.get('LastName')}, {c.get('FirstName')}: {'; '.join(problems)}"
+            )
 
     # -- CLASSIFICATION VALIDATION --
-    sel        = classification_tab.get_selected()
-    sel_wgs    = sel['WGS']
-    sel_bisac  = sel['BISAC']
+    sel       = order.get('Classification', {})
+    sel_wgs   = sel.get('WGS', [])
+    sel_bisac = sel.get('BISAC', [])
     if not sel_wgs and not sel_bisac:
-        messagebox.showerror(
+        raise ValidationError(
             'Pflichtfeld fehlt',
             'Bitte mindestens eine Kategorie im Classification-Tab auswählen.'
         )
-        return
-    need_age_wgs   = any('Kinder' in classification_tab.wgs.get(code, '') for code in sel_wgs)
-    need_age_bisac = any(code.startswith(('JUV','YAF')) for code in sel_bisac)
+    audience       = codelists.audience(wgs_codes)
+    need_age_wgs   = any(audience.needs_age('WGS', code) for code in sel_wgs)
+    need_age_bisac = any(audience.needs_age('BISAC', code) for code in sel_bisac)
     if (need_age_wgs   and not sel.get('AgeWGS')) \
     or (need_age_bisac and not sel.get('AgeBISAC')):
-        messagebox.showerror(
+        raise ValidationError(
             'Pflichtfeld fehlt',
             'Bitte eine Altersgruppe im Classification-Tab wählen.'
         )
-        return
 
     # -- PRODUCT FIELDS VALIDATION --
-    errors = []
-    for key in REQUIRED_PRODUCT:
-        w = product_tab.widgets.get(key)
-        if isinstance(w, Text):
-            val = w.get('1.0', 'end-1c').strip()
-        else:
-            val = w.get().strip()
-        if not val:
-            errors.append(key)
+    errors = [key for key in REQUIRED_PRODUCT if not prod_data.get(key, '').strip()]
     if errors:
         # 'Blurb' als 'Beschreibung' ausgeben
         display = ['Beschreibung' if k == 'Blurb' else k for k in errors]
-        messagebox.showerror(
+        raise ValidationError(
             'Pflichtfeld fehlt',
             f'Bitte füllen Sie alle Pflichtfelder im Product-Tab: {", ".join(display)}'
         )
-        return
+    problem = xhtml_blurb.problem(prod_data['Blurb'].strip())
+    if problem:
+        raise ValidationError('Ungültige Beschreibung', problem)
 
-    # >>>>> NEUER BLOCK: ColouredPagesPosition Validierung <<<<<
-    prod_data = product_tab.get_ordered_data()
+    # -- ColouredPagesPosition --
     try:
         cp_count = int(prod_data.get('ColouredPages', '0'))
     except ValueError:
@@ -252,261 +249,172 @@ def export_xml(header_tab, product_tab, contributor_tab, classification_tab,
     if cp_count > 0:
         cpp = prod_data.get('ColouredPagesPosition', '').strip()
         if not cpp:
-            messagebox.showerror(
+            raise ValidationError(
                 'Pflichtfeld fehlt',
                 'Bitte ColouredPagesPosition angeben (kommagetrennt, ohne Leerzeichen).'
             )
-            return
         if ' ' in cpp:
-            messagebox.showerror(
+            raise ValidationError(
                 'Formatfehler',
                 'ColouredPagesPosition darf keine Leerzeichen enthalten.'
             )
-            return
         parts = cpp.split(',')
         if len(parts) != cp_count:
-            messagebox.showerror(
+            raise ValidationError(
                 'Pflichtfeld fehlt',
                 f'Bitte {cp_count} Seitenzahlen angeben, kommagetrennt ohne Leerzeichen.'
             )
-            return
         # nur Ziffern, keine 0, keine +/-
         for p in parts:
             if not p.isdigit():
-                messagebox.showerror(
+                raise ValidationError(
                     'Formatfehler',
                     'ColouredPagesPosition darf nur Ziffern enthalten (keine +, –, Buchstaben, Sonderzeichen).'
                 )
-                return
             if p == '0':
-                messagebox.showerror(
+                raise ValidationError(
                     'Formatfehler',
                     'ColouredPagesPosition darf keine 0 enthalten.'
                 )
-                return
         nums = [int(x) for x in parts]
         if nums != sorted(nums):
-            messagebox.showerror(
+            raise ValidationError(
                 'Formatfehler',
                 'ColouredPagesPosition muss in aufsteigender Reihenfolge sein.'
             )
-            return
         # höchste Zahl ≤ Pages
         try:
             total = int(prod_data.get('Pages', '0'))
         except ValueError:
             total = 0
         if nums[-1] > total:
-            messagebox.showerror(
+            raise ValidationError(
                 'Formatfehler',
                 'ColouredPagesPosition darf nicht größer als Anzahl Pages sein.'
             )
-            return
-    # <<<<< ENDE BLOCK <<<<<
 
     # -- PRICING VALIDATION --
-    eur = pricing_tab.get_price_eur()
-    if not eur:
-        messagebox.showerror(
+    if not order.get('Price'):
+        raise ValidationError(
             'Pflichtfeld fehlt',
             'Bitte geben Sie einen Preis in EUR im Pricing-Tab ein.'
         )
-        return
 
     # -- INTERNATIONAL VALIDATION --
-    if international_tab.is_enabled():
-        intl_prices = international_tab.get_prices()
+    intl = order.get('International', {})
+    if intl.get('Enabled'):
+        intl_prices = intl.get('Prices', {})
         missing_intl = [cur for cur in ['USD','GBP','AUD'] if not intl_prices.get(cur)]
         if missing_intl:
-            messagebox.showerror(
+            raise ValidationError(
                 'Pflichtfeld fehlt',
                 f'Bitte internationale Preise eingeben: {", ".join(missing_intl)}'
             )
-            return
 
     # -- EBOOK VALIDATION --
-    if ebook_tab.is_enabled():
-        eb_data  = ebook_tab.get_data()
+    eb_data = order.get('EBook', {})
+    if eb_data.get('Enabled'):
         eb_ean   = eb_data.get('EAN','').strip()
         eb_price = eb_data.get('Price','').strip()
-        if not (eb_ean.isdigit() and len(eb_ean) == 13):
-            messagebox.showerror(
+        if not _is_ean(eb_ean):
+            raise ValidationError(
                 'Pflichtfeld fehlt',
                 'Bitte eine gültige 13-stellige EAN im EBook-Tab eingeben.'
             )
-            return
         if eb_ean == prod_ean:
-            messagebox.showerror(
+            raise ValidationError(
                 'Ungültige EAN',
                 'EBook-EAN darf nicht mit der Produkt-EAN übereinstimmen.'
             )
-            return
         if not eb_price:
-            messagebox.showerror(
+            raise ValidationError(
                 'Pflichtfeld fehlt',
                 'Bitte einen Preis im EBook-Tab auswählen.'
             )
-            return
-
-    # -- XML-Baum aufbauen im Upload-Modus --
-    root    = etree.Element('BoD')
-    hdr_el  = etree.SubElement(root, 'Header')
-    for tag in ['FromCompany','FromCompanyNumber','SentDate','SentTime','FromPerson','FromEmail']:
-        val = hdr_data.get(tag)
-        if val:
-            el = etree.SubElement(hdr_el, tag)
-            el.text = val
-
-    mo      = etree.SubElement(root, 'MasteringOrder')
-    prod_el = etree.SubElement(mo, 'Product')
-    etree.SubElement(prod_el, 'MasteringType').text = 'Upload'
-    etree.SubElement(prod_el, 'EAN').text          = prod_ean
-
-    # Contributors
-    for contrib in contribs:
-        c_el = etree.SubElement(prod_el, 'Contributor')
-        etree.SubElement(c_el, 'ContributorRole').text      = contrib['Role'].lower()
-        etree.SubElement(c_el, 'ContributorName').text      = f"{contrib['LastName']}, {contrib['FirstName']}"
-        if contrib.get('ShortBio'):
-            etree.SubElement(c_el, 'ContributorShortBio').text = contrib['ShortBio']
-
-    # Produktspezifische Tags in korrekter Reihenfolge
-    prod_data = product_tab.get_ordered_data()
-
-    # Title, SubTitle
-    for tag in ['Title','SubTitle']:
-        val = prod_data.get(tag,'')
-        if val:
-            el = etree.SubElement(prod_el, tag)
-            el.text = val
-
-    # Series (nur wenn eingetragen)
-    series = prod_data.get('Series','')
-    if series:
-        el = etree.SubElement(prod_el, 'Series')
-        el.text = series
-
-    # PartNumber
-    part = prod_data.get('PartNumber','')
-    if part:
-        el = etree.SubElement(prod_el, 'PartNumber')
-        el.text = part
-
-    # Imprint (immer aus Header-Tab)
-    imprint = hdr_data.get('Imprint','')
-    el      = etree.SubElement(prod_el, 'Imprint')
-    el.text = imprint
-
-    # EditionNumber, PublicationDate
-    for tag in ['EditionNumber','PublicationDate']:
-        val = prod_data.get(tag,'')
-        if val:
-            el = etree.SubElement(prod_el, tag)
-            el.text = val
-
-    # Blurb
-    blurb = prod_data.get('Blurb','')
-    if blurb:
-        el = etree.SubElement(prod_el, 'Blurb')
-        el.text = blurb
-
-    # Height, Width
-    for tag in ['Height','Width']:
-        val = prod_data.get(tag,'')
-        if val:
-            el = etree.SubElement(prod_el, tag)
-            el.text = val
-
-    # Pages
-    pages = prod_data.get('Pages','')
-    if pages:
-        el = etree.SubElement(prod_el, 'Pages')
-        el.text = pages
-
-    # ColouredPages & ColouredPagesPosition
-    cp = prod_data.get('ColouredPages','')
-    if cp:
-        el = etree.SubElement(prod_el, 'ColouredPages')
-        el.text = cp
-    cpp = prod_data.get('ColouredPagesPosition','')
-    if cpp:
-        el = etree.SubElement(prod_el, 'ColouredPagesPosition')
-        el.text = cpp
-
-    # Quality, Paper, Binding, CoverDuplex, Finish
-    for tag in ['Quality','Paper','Binding','CoverDuplex','Finish']:
-        val = prod_data.get(tag,'')
-        if val:
-            el = etree.SubElement(prod_el, tag)
-            el.text = val
-
-    # Language (immer aus Classification-Tab)
-    lang = sel.get('Language','')
-    el   = etree.SubElement(prod_el, 'Language')
-    el.text = lang
-
-    # Classification Subjects
-    for code in sel['WGS']:
-        attrs = {'Scheme': 'WGS'}
-        desc = classification_tab.wgs.get(code, '')
-        if 'Kinder' in desc:
-            age_code = sel.get('AgeWGS','')
-            if age_code:
-                attrs['AudienceRangeFrom'] = age_code
-        subj = etree.SubElement(prod_el, 'Subject', **attrs)
-        subj.text = code
-
-    for code in sel['BISAC']:
-        attrs = {'Scheme': 'BISAC'}
-        if code.startswith(('JUV','YAF')):
-            age_code = sel.get('AgeBISAC','')
-            if age_code:
-                attrs['AudienceRangeFrom'] = age_code
-        subj = etree.SubElement(prod_el, 'Subject', **attrs)
-        subj.text = code
-
-    # Prices EUR & International
-    p = etree.SubElement(prod_el, 'Price')
-    etree.SubElement(p, 'PriceValue').text    = eur
-    etree.SubElement(p, 'PriceCurrency').text = 'EUR'
-    if international_tab.is_enabled():
-        etree.SubElement(prod_el, 'InternationalDistribution').text = 'Yes'
-        intl_prices = international_tab.get_prices()
-        for cur in ['USD','GBP','AUD']:
-            val = intl_prices.get(cur)
-            if val:
-                p2 = etree.SubElement(prod_el, 'Price')
-                etree.SubElement(p2, 'PriceValue').text    = val
-                etree.SubElement(p2, 'PriceCurrency').text = cur
-
-    # EBook Block
-    if ebook_tab.is_enabled():
-        eb_data  = ebook_tab.get_data()
-        eb_ean   = eb_data.get('EAN','').strip()
-        eb       = etree.SubElement(prod_el, 'EBook')
-        attrs    = {'EBookFileType': eb_data.get('EBookFileType','')}
-        etree.SubElement(eb, 'EAN', **attrs).text         = eb_ean
-        etree.SubElement(eb, 'Conversion').text          = eb_data.get('Conversion','')
-        etree.SubElement(eb, 'EBookFileType').text       = eb_data.get('EBookFileType','')
-        ebp      = etree.SubElement(eb, 'Price')
-        etree.SubElement(ebp, 'PriceValue').text         = eb_data.get('Price','').strip()
-        etree.SubElement(ebp, 'PriceCurrency').text      = 'EUR'
-
-    # XML speichern
+
+
+def build_tree(order, wgs_codes):
+    """
+    Build the <BoD> XML tree of a validated order (element order from
+    the tables in order_schema).
+    wgs_codes: dict from warengruppe_codes.json (age attribute on children's subjects).
+    """
+    return order_schema.build_tree(order, wgs_codes)
+
+
+def order_xml(order, wgs_codes):
+    """
+    Serialized XML of a validated order, written directly from the order
+    (same bytes as xml_bytes(build_tree(order, wgs_codes)), without the tree).
+    """
+    return order_schema.render(order, wgs_codes)
+
+
+def export_xml(header_tab, product_tab, contributor_tab, classification_tab,
+               pricing_tab, international_tab, ebook_tab,
+               filename=None, mode='Upload'):
+    """
+    Collect all data from the tab instances and write a BoD XML file.
+    Performs validation of required fields per tab.
+    mode: 'Upload' (vollständig), 'AddIntlDistribution' (nur International)
+    oder 'AddEBook' (nur E-Book).
+    """
+    order = collect_order(
+        header_tab, product_tab, contributor_tab, classification_tab,
+        pricing_tab, international_tab, ebook_tab, mode=mode
+    )
+    try:
+        validate_order(order, classification_tab.wgs)
+    except ValidationError as e:
+        messagebox.showerror(e.title, e.message)
+        return
+    xml_data = order_xml(order, classification_tab.wgs)
+
+    # XML speichern unter EAN_MasteringOrder.xml
     if filename:
         fn = filename
     else:
         fn = filedialog.asksaveasfilename(
             defaultextension='.xml', filetypes=[('XML','*.xml')],
-            initialfile=f"{prod_ean}_MasteringOrder.xml"
+            initialfile=f"{order_ean(order)}_MasteringOrder.xml"
         )
     if not fn:
         return
-    etree.ElementTree(root).write(
-        fn, xml_declaration=True,
+    # im Fenster-Build gibt es keine Konsole: Hinweise als Dialog
+    _write_xml(xml_data, fn, order, log=lambda msg: messagebox.showwarning('Hinweis', msg))
+    return fn
+
+
+def xml_bytes(root):
+    """
+    Serialize the XML tree exactly as written to the .xml file.
+    """
+    return etree.tostring(
+        root, xml_declaration=True,
         encoding='UTF-8', pretty_print=True
     )
-    return fn
+
+
+def _write_xml(xml_data, fn, order, log=print):
+    """
+    Write the serialized XML to fn (temp file + rename, never half-written)
+    and update the full-text order index and the contributor authority;
+    failures of the latter two are passed to log.
+    """
+    tmp = fn + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(xml_data)
+    os.replace(tmp, fn)
+    # Suchindex aktualisieren – darf den Export nie verhindern
+    try:
+        order_index.index_order(order, fn)
+    except Exception as e:
+        log(f'Suchindex nicht aktualisiert: {e}')
+    # Contributors für die nächsten Titel merken
+    try:
+        authority.remember(order.get('Contributors') or ())
+    except Exception as e:
+        log(f'Contributor-Bestand nicht aktualisiert: {e}')
 
 
 def make_zip(product_tab, manuscript=None, cover=None, xml_path=None):